@@ -0,0 +1,57 @@
+import glob
+import os
+import time
+
+AUDIO_EXTENSIONS = (".wav", ".mp3", ".ogg", ".flac", ".m4a")
+
+def load_fixtures(fixture_dir):
+    """Find audio fixtures in a directory, with the reference transcript from a matching .txt if present"""
+    fixtures = []
+    for path in sorted(glob.glob(os.path.join(fixture_dir, "*"))):
+        base, ext = os.path.splitext(path)
+        if ext.lower() not in AUDIO_EXTENSIONS:
+            continue
+        reference = None
+        if os.path.exists(base + ".txt"):
+            with open(base + ".txt") as f:
+                reference = f.read().strip()
+        fixtures.append({"path": path, "name": os.path.basename(path), "reference": reference})
+    return fixtures
+
+def normalize_words(text):
+    """Lowercase and strip punctuation so transcripts can be compared word by word"""
+    cleaned = "".join(ch if ch.isalnum() or ch.isspace() or ch == "'" else " " for ch in text.lower())
+    return cleaned.split()
+
+def word_error_rate(reference, hypothesis):
+    """Word-level edit distance divided by reference length"""
+    ref = normalize_words(reference)
+    hyp = normalize_words(hypothesis)
+    if not ref:
+        return 0.0 if not hyp else 1.0
+
+    previous = list(range(len(hyp) + 1))
+    for i, ref_word in enumerate(ref, 1):
+        current = [i] + [0] * len(hyp)
+        for j, hyp_word in enumerate(hyp, 1):
+            current[j] = min(
+                previous[j] + 1,
+                current[j - 1] + 1,
+                previous[j - 1] + (ref_word != hyp_word)
+            )
+        previous = current
+    return previous[-1] / len(ref)
+
+def timed(fn, *args, **kwargs):
+    """Call fn and return (result, seconds taken)"""
+    start = time.perf_counter()
+    result = fn(*args, **kwargs)
+    return result, time.perf_counter() - start
+
+def percentile(values, pct):
+    """Nearest-rank percentile of a list of numbers"""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, int(round(pct / 100 * len(ordered))) - 1))
+    return ordered[index]
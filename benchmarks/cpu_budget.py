@@ -0,0 +1,77 @@
+"""Aggregate voice throughput as concurrent guilds grow, with and without the CPU budget
+
+Usage: python -m benchmarks.cpu_budget [--fixture clip.wav] [--guilds 1,2,4,8,16,32] [--clips 4]
+
+Each guild gets its own thread, like process_audio_thread, and transcribes and
+scores --clips clips. Without the budget every thread runs torch with all cores.
+"""
+import argparse
+import os
+import tempfile
+import threading
+import time
+import wave
+import numpy as np
+from benchmarks.common import timed, percentile
+from utils.resources import ThreadBudget, set_cpu_budget
+import utils.speech as speech
+
+def write_synthetic_clip(seconds=4.0):
+    samples = speech.synthetic_speech(seconds)
+    path = tempfile.NamedTemporaryFile(suffix=".wav", delete=False).name
+    with wave.open(path, "wb") as f:
+        f.setnchannels(1)
+        f.setsampwidth(2)
+        f.setframerate(16000)
+        f.writeframes((np.clip(samples, -1, 1) * 32767).astype(np.int16).tobytes())
+    return path
+
+def score_clip(path):
+    _, text = speech.transcribe_audio(path)
+    return speech.analyze_text_for_tilt(text.lower() or "gg")
+
+def run_guilds(path, guilds, clips):
+    """Run `guilds` threads of `clips` clips each; return (clips per second, per-clip latencies)"""
+    latencies = []
+    lock = threading.Lock()
+
+    def guild_thread():
+        for _ in range(clips):
+            _, seconds = timed(score_clip, path)
+            with lock:
+                latencies.append(seconds)
+
+    threads = [threading.Thread(target=guild_thread) for _ in range(guilds)]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return guilds * clips / (time.perf_counter() - start), latencies
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--fixture", help="Audio clip to transcribe (defaults to synthetic speech)")
+    parser.add_argument("--guilds", default="1,2,4,8,16,32", help="Concurrent guild counts to measure")
+    parser.add_argument("--clips", type=int, default=4, help="Clips per guild at each level")
+    args = parser.parse_args()
+
+    speech.load_models(preload_in_background=False)
+    path = args.fixture or write_synthetic_clip()
+    budgets = {"unbudgeted": ThreadBudget(enabled=False), "budgeted": ThreadBudget()}
+
+    try:
+        print(f"{'guilds':>6} {'budget':>11} {'clips/s':>8} {'p50':>7} {'p95':>7}")
+        for guilds in [int(count) for count in args.guilds.split(",")]:
+            for name, budget in budgets.items():
+                set_cpu_budget(budget)
+                throughput, latencies = run_guilds(path, guilds, args.clips)
+                print(f"{guilds:6} {name:>11} {throughput:8.2f} {percentile(latencies, 50):6.2f}s "
+                      f"{percentile(latencies, 95):6.2f}s")
+        print(f"\nSlot waits: {budgets['budgeted'].stats()}")
+    finally:
+        if not args.fixture:
+            os.unlink(path)
+
+if __name__ == "__main__":
+    main()
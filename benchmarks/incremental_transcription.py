@@ -0,0 +1,73 @@
+"""Compare incremental (overlapping window) transcription against independent clips
+
+Usage: python -m benchmarks.incremental_transcription --fixtures path/to/recordings [--chunk 4] [--clip-chunk 10]
+
+Each recording is cut into fixed chunks the way the recording loop cuts a
+speaker's audio. Independent clips (at --clip-chunk and at --chunk seconds)
+and the incremental transcriber (at --chunk seconds) are scored against the
+reference .txt, or against one pass over the whole recording if there isn't
+one. Words lost or split at the cuts, and overlap words sent twice, show up
+as word errors.
+"""
+import argparse
+import whisper
+from benchmarks.common import load_fixtures, word_error_rate, timed
+from config import INCREMENTAL_CHUNK_SECONDS, RECORDING_CHUNK_SECONDS
+from utils.streaming import IncrementalTranscriber
+import utils.speech as speech
+
+def chunks(audio, seconds):
+    size = int(seconds * whisper.audio.SAMPLE_RATE)
+    return [audio[start:start + size] for start in range(0, len(audio), size)]
+
+def clip_by_clip(audio, seconds):
+    texts, times = [], []
+    for chunk in chunks(audio, seconds):
+        text, elapsed = timed(speech.run_whisper, chunk)
+        texts.append(text.strip())
+        times.append(elapsed)
+    return " ".join(texts), times
+
+def incremental(audio, seconds):
+    streams = IncrementalTranscriber()
+    transcribe = speech.window_transcriber()
+    texts, times = [], []
+    for chunk in chunks(audio, seconds):
+        text, elapsed = timed(streams.feed, "benchmark", chunk, transcribe)
+        texts.append(text)
+        times.append(elapsed)
+    texts.append(streams.flush("benchmark", transcribe))
+    return " ".join(text for text in texts if text), times
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--fixtures", required=True, help="Directory of recordings, longer than a chunk")
+    parser.add_argument("--chunk", type=float, default=INCREMENTAL_CHUNK_SECONDS, help="Incremental chunk seconds")
+    parser.add_argument("--clip-chunk", type=float, default=RECORDING_CHUNK_SECONDS, help="Independent clip seconds")
+    args = parser.parse_args()
+
+    speech.load_models()
+    fixtures = load_fixtures(args.fixtures)
+    if not fixtures:
+        raise SystemExit(f"No audio fixtures found in {args.fixtures}")
+
+    modes = [(f"clips {args.clip_chunk:g}s", lambda audio: clip_by_clip(audio, args.clip_chunk)),
+             (f"clips {args.chunk:g}s", lambda audio: clip_by_clip(audio, args.chunk)),
+             (f"incremental {args.chunk:g}s", lambda audio: incremental(audio, args.chunk))]
+    totals = {name: [] for name, _ in modes}
+    print(f"{'recording':30} {'mode':18} {'wer':>6} {'per chunk':>10} {'worst':>8}")
+    for fixture in fixtures:
+        audio = whisper.load_audio(fixture["path"])
+        reference = fixture["reference"] or speech.run_whisper(audio, fast_path=False)
+        for name, run in modes:
+            text, times = run(audio)
+            wer = word_error_rate(reference, text)
+            totals[name].append(wer)
+            print(f"{fixture['name']:30} {name:18} {wer:6.2f} {sum(times) / len(times):9.3f}s {max(times):7.3f}s")
+
+    print()
+    for name, wers in totals.items():
+        print(f"{name:18} mean WER {sum(wers) / len(wers):.3f}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,65 @@
+"""Compare first-request and steady-state latency with and without model warmup
+
+Usage: python -m benchmarks.model_warmup [--fixture clip.wav] [--requests 10] [--optimization compile]
+
+Each configuration runs in a fresh interpreter, since the first-request cost
+is paid once per process. Reports load time, the first voice clip and chat
+message latency, and the median of the requests after it.
+"""
+import argparse
+import json
+import subprocess
+import sys
+import time
+from benchmarks.common import timed, percentile
+
+TEXT = "why does nobody ever rotate when I ping"
+
+def measure(args):
+    """Runs in the child interpreter: load, then time the requests in order"""
+    import whisper
+    import utils.speech as speech
+    speech.MODEL_OPTIMIZATION = args.optimization
+
+    start = time.perf_counter()
+    speech.load_models(preload_in_background=False, warmup=args.warmup)
+    load_seconds = time.perf_counter() - start
+
+    audio = whisper.load_audio(args.fixture) if args.fixture else speech.synthetic_speech(3.0)
+    voice = [timed(speech.run_whisper, audio)[1] for _ in range(args.requests)]
+    text = [timed(speech.analyze_text_for_tilt, TEXT)[1] for _ in range(args.requests)]
+    print(json.dumps({"load": load_seconds, "voice": voice, "text": text}))
+
+def run_child(args, warmup):
+    command = [sys.executable, "-m", "benchmarks.model_warmup", "--child", "--requests", str(args.requests)]
+    if warmup:
+        command.append("--warmup")
+    if args.fixture:
+        command += ["--fixture", args.fixture]
+    if args.optimization:
+        command += ["--optimization", args.optimization]
+    output = subprocess.run(command, check=True, capture_output=True, text=True).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--fixture", help="Audio clip to transcribe (defaults to synthetic speech)")
+    parser.add_argument("--requests", type=int, default=10, help="Requests timed per configuration")
+    parser.add_argument("--optimization", choices=["compile", "torchscript"], help="Also apply this to the encoder")
+    parser.add_argument("--warmup", action="store_true", help=argparse.SUPPRESS)
+    parser.add_argument("--child", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        measure(args)
+        return
+
+    print(f"{'config':10} {'load':>7} {'voice 1st':>10} {'voice p50':>10} {'text 1st':>9} {'text p50':>9}")
+    for name, warmup in (("cold", False), ("warmup", True)):
+        result = run_child(args, warmup)
+        voice, text = result["voice"], result["text"]
+        print(f"{name:10} {result['load']:6.1f}s {voice[0]:9.3f}s {percentile(voice[1:], 50):9.3f}s "
+              f"{text[0]:8.3f}s {percentile(text[1:], 50):8.3f}s")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,231 @@
+"""Soak test: simulate N guilds with M speakers each against the real processing path
+
+Usage: python -m benchmarks.soak --guilds 4 --speakers 5 --duration 600 [--fixtures path/to/clips] [--acoustic-only]
+
+Voice segments go through finished_callback into processing_queues and the
+per-guild process_audio_thread, and chat messages through on_message, exactly
+as in standalone mode. Only the Discord side is faked: guilds, members,
+channels and recording sinks. Audio comes from recorded clips in --fixtures,
+or synthetic voiced tones when none are given.
+
+Every --report seconds it prints the backlog, throughput, latency and memory,
+then a summary of sustained throughput, queue growth and tail latency.
+"""
+import argparse
+import asyncio
+import io
+import queue
+import random
+import threading
+import time
+import wave
+from types import SimpleNamespace
+import numpy as np
+from benchmarks.common import load_fixtures, percentile
+from config import PROSODY_SAMPLE_RATE, processing_queues
+
+CHAT_LINES = [
+    "gg",
+    "nice shot",
+    "why does nobody ever rotate when I ping",
+    "this jungler is actually useless",
+    "ok we can still win this, group mid",
+    "I literally can't hit anything tonight",
+    "that was so unlucky",
+    "report our top laner",
+]
+
+class FakeChannel:
+    """Text channel that records what the bot sends instead of calling Discord"""
+    def __init__(self, channel_id, guild):
+        self.id = channel_id
+        self.guild = guild
+        self.sent = 0
+
+    async def send(self, content=None, **kwargs):
+        self.sent += 1
+
+def fake_guild(guild_id, speakers):
+    guild = SimpleNamespace(id=guild_id, members=[])
+    for index in range(speakers):
+        name = f"speaker{guild_id}_{index}"
+        guild.members.append(SimpleNamespace(
+            id=guild_id * 1000 + index, name=name, display_name=name, nick=None, guild=guild,
+            voice=SimpleNamespace(channel=None),
+            bot=True,  # Makes process_commands return early - these never send commands
+            mention=f"@{name}"
+        ))
+    guild.get_member = lambda user_id: next((m for m in guild.members if m.id == user_id), None)
+    return guild
+
+def synthetic_clip(rng, seconds):
+    """WAV bytes of a voiced tone with random pitch, loudness and syllable rate"""
+    t = np.arange(int(seconds * PROSODY_SAMPLE_RATE)) / PROSODY_SAMPLE_RATE
+    pitch = rng.uniform(90, 260) * (1 + 0.1 * np.sin(2 * np.pi * rng.uniform(0.3, 1.0) * t))
+    phase = 2 * np.pi * np.cumsum(pitch) / PROSODY_SAMPLE_RATE
+    voiced = sum(np.sin(harmonic * phase) / harmonic for harmonic in range(1, 6))
+    envelope = np.clip(np.sin(2 * np.pi * rng.uniform(2, 7) * t), 0, None)
+    samples = rng.uniform(0.05, 0.5) * voiced * envelope + 0.003 * rng.standard_normal(len(t))
+
+    buffer = io.BytesIO()
+    with wave.open(buffer, "wb") as f:
+        f.setnchannels(1)
+        f.setsampwidth(2)
+        f.setframerate(PROSODY_SAMPLE_RATE)
+        f.writeframes((np.clip(samples, -1, 1) * 32767).astype(np.int16).tobytes())
+    return buffer.getvalue()
+
+class SoakStats:
+    """Latencies and counters collected from the processing threads"""
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.voice_latencies = []
+        self.text_latencies = []
+        self.segments_in = 0
+        self.messages_in = 0
+
+    def record(self, kind, seconds):
+        with self.lock:
+            (self.voice_latencies if kind == "voice" else self.text_latencies).append(seconds)
+
+def instrument_process_audio(stats):
+    """Time each segment from the end of its recording window to its tilt update"""
+    import bot.voice as voice
+    original = voice.process_audio
+
+    def timed_process_audio(guild_id, channel_id, user_id, audio_path, recorded_at=None):
+        original(guild_id, channel_id, user_id, audio_path, recorded_at)
+        stats.record("voice", time.time() - recorded_at)
+
+    voice.process_audio = timed_process_audio
+
+async def drive_guild(bot, guild, channel, clips, stats, args, stop_at, rng):
+    """Inject recording windows and chat messages for one guild until the deadline"""
+    from bot.voice import finished_callback
+
+    on_message = bot.on_message
+    audio_rng = np.random.default_rng(rng.getrandbits(32))
+    next_window = time.monotonic() + args.window
+    while time.monotonic() < stop_at:
+        await asyncio.sleep(1)
+
+        # Chat: each speaker sends messages at roughly --messages-per-minute
+        for member in guild.members:
+            if rng.random() < args.messages_per_minute / 60:
+                message = SimpleNamespace(author=member, channel=channel, guild=guild,
+                                          content=rng.choice(CHAT_LINES))
+                start = time.perf_counter()
+                await on_message(message)
+                stats.record("text", time.perf_counter() - start)
+                stats.messages_in += 1
+
+        # Voice: at the end of each recording window, hand the sink to finished_callback
+        if time.monotonic() >= next_window:
+            next_window += args.window
+            audio_data = {}
+            for member in guild.members:
+                if rng.random() < args.talk_ratio:
+                    clip = rng.choice(clips) if clips else synthetic_clip(audio_rng, args.window * rng.uniform(0.3, 0.9))
+                    audio_data[member.id] = SimpleNamespace(file=io.BytesIO(clip))
+            stats.segments_in += len(audio_data)
+            await finished_callback(SimpleNamespace(audio_data=audio_data), channel)
+
+async def report_progress(stats, args, stop_at):
+    """Print backlog, throughput, latency and memory every --report seconds"""
+    from utils.worker import process_memory
+
+    samples = []
+    start = time.monotonic()
+    last_voice = last_text = 0
+    print(f"{'time':>6} {'backlog':>8} {'seg/s':>6} {'msg/s':>6} {'voice p95':>10} {'text p95':>9} {'rss':>8}")
+    while time.monotonic() < stop_at:
+        await asyncio.sleep(args.report)
+        with stats.lock:
+            voice = stats.voice_latencies[last_voice:]
+            text = stats.text_latencies[last_text:]
+            last_voice, last_text = len(stats.voice_latencies), len(stats.text_latencies)
+        backlog = sum(q.qsize() for q in list(processing_queues.values()))
+        rss = process_memory()["rss"]
+        elapsed = time.monotonic() - start
+        samples.append((elapsed, backlog, rss))
+        print(f"{elapsed:5.0f}s {backlog:8} {len(voice) / args.report:6.2f} {len(text) / args.report:6.2f} "
+              f"{percentile(voice, 95):9.2f}s {percentile(text, 95):8.3f}s {rss:6.0f}MB")
+    return samples
+
+def queue_growth(samples):
+    """Least-squares slope of the backlog in segments per minute"""
+    if len(samples) < 2:
+        return 0.0
+    times = np.array([sample[0] for sample in samples])
+    backlog = np.array([sample[1] for sample in samples])
+    return float(np.polyfit(times, backlog, 1)[0] * 60)
+
+async def run_soak(args):
+    from bot.client import setup_bot
+    from bot.voice import process_audio_thread
+    from utils.scheduler import degraded_mode, tier_scheduler
+
+    bot = setup_bot()
+    stats = SoakStats()
+    instrument_process_audio(stats)
+    clips = []
+    if args.fixtures:
+        for fixture in load_fixtures(args.fixtures):
+            with open(fixture["path"], "rb") as f:
+                clips.append(f.read())
+
+    guilds = []
+    for guild_id in range(1, args.guilds + 1):
+        guild = fake_guild(guild_id, args.speakers)
+        channel = FakeChannel(guild_id * 10, guild)
+        processing_queues[guild_id] = queue.Queue()
+        threading.Thread(target=process_audio_thread, args=(guild_id, channel.id), daemon=True).start()
+        guilds.append((guild, channel))
+
+    rng = random.Random(args.seed)
+    stop_at = time.monotonic() + args.duration
+    drivers = [drive_guild(bot, guild, channel, clips, stats, args, stop_at, random.Random(rng.getrandbits(32)))
+               for guild, channel in guilds]
+    results = await asyncio.gather(report_progress(stats, args, stop_at), *drivers)
+    samples = results[0]
+
+    backlog = sum(q.qsize() for q in list(processing_queues.values()))
+    for guild, _ in guilds:
+        processing_queues[guild.id].put(None)
+
+    voice, text = stats.voice_latencies, stats.text_latencies
+    rss = [sample[2] for sample in samples] or [0]
+    print(f"\n{args.guilds} guilds x {args.speakers} speakers for {args.duration}s")
+    print(f"Voice: {stats.segments_in} segments in, {len(voice)} processed "
+          f"({len(voice) / args.duration:.2f}/s), {backlog} still queued")
+    print(f"Voice latency: p50 {percentile(voice, 50):.2f}s, p95 {percentile(voice, 95):.2f}s, "
+          f"p99 {percentile(voice, 99):.2f}s")
+    print(f"Text: {stats.messages_in} messages ({stats.messages_in / args.duration:.2f}/s), "
+          f"p50 {percentile(text, 50) * 1000:.1f}ms, p99 {percentile(text, 99) * 1000:.1f}ms")
+    print(f"Queue growth: {queue_growth(samples):+.1f} segments/min")
+    print(f"Memory: start {rss[0]:.0f}MB, end {rss[-1]:.0f}MB, peak {max(rss):.0f}MB")
+    print(f"Degraded mode: {degraded_mode.stats()}")
+    print(f"Tiers: {tier_scheduler.stats()['time_in_tier']}")
+    print("Keeping up" if queue_growth(samples) <= 1 and backlog <= args.guilds * args.speakers else "Falling behind")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--guilds", type=int, default=4, help="Simulated guilds")
+    parser.add_argument("--speakers", type=int, default=5, help="Speakers per guild")
+    parser.add_argument("--duration", type=int, default=300, help="Seconds to run")
+    parser.add_argument("--fixtures", help="Directory of recorded clips to inject (defaults to synthetic audio)")
+    parser.add_argument("--window", type=float, default=10, help="Recording window in seconds, as in process_recordings_regularly")
+    parser.add_argument("--talk-ratio", type=float, default=0.5, help="Chance each speaker talks in a window")
+    parser.add_argument("--messages-per-minute", type=float, default=2, help="Chat messages per speaker per minute")
+    parser.add_argument("--report", type=float, default=10, help="Seconds between progress lines")
+    parser.add_argument("--acoustic-only", action="store_true", help="Don't load the models (degraded mode throughout)")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    if not args.acoustic_only:
+        from utils.speech import load_models
+        load_models(preload_in_background=False)
+    asyncio.run(run_soak(args))
+
+if __name__ == "__main__":
+    main()
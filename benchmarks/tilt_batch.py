@@ -0,0 +1,145 @@
+"""Measure update_tilt_scores throughput against per-event updates
+
+Usage: python -m benchmarks.tilt_batch [--events 2000000] [--users 100,10000] [--sequential-events 200000]
+       python -m benchmarks.tilt_batch --replay EXPORT_DIR
+
+Randomized batches - boundary score changes, tied and out-of-order
+timestamps, new and existing users - are timed on both paths. --replay times
+the logged transcripts of an export (python -m utils.export export
+--transcripts) instead of synthetic events. tests/test_tilt_batch.py checks
+that both paths give the same records.
+
+Per-event logging is silenced while timing, though update_tilt_score still
+formats its log lines.
+"""
+import argparse
+import copy
+import logging
+import random
+import sys
+import time
+from config import logger, new_tilt_entry
+from utils.tilt import apply_tilt_update, apply_tilt_updates
+from utils.tilt_state import InMemoryTiltState
+
+GUILD_ID = 1
+CHANGES = [-20, -10, -5, -1, 0, 1, 3, 5, 7, 10, 12, 15, 20, 40, 4.99, 5.01, 10.5, -2.5]
+START_SCORES = [0, 30, 50, 59.99, 60, 65, 70, 75, 80, 95, 100]
+TRIGGERS = [None, "", "why does nobody rotate", "gg ez", "x" * 80]
+
+def random_entries(rng, users, base_time):
+    """Existing tilt records for some of the users; the rest get created by the batch"""
+    entries = {}
+    for user_id in range(users):
+        if rng.random() < 0.7:
+            entry = new_tilt_entry(rng.choice(START_SCORES))
+            entry["last_updated"] = base_time - rng.choice([0, 1, 30, 600, 7200])
+            if rng.random() < 0.5:
+                entry["triggers"] = [f"old {i}" for i in range(rng.randint(0, 10))]
+            if rng.random() < 0.5:
+                # Existing history, sometimes newer than the batch's first events
+                for _ in range(rng.randint(1, 5)):
+                    apply_tilt_update(entry, rng.choice(CHANGES), None, entry["last_updated"] + rng.uniform(-120, 300))
+            entries[user_id] = entry
+    return entries
+
+def random_events(rng, count, users, base_time, span):
+    events = []
+    for _ in range(count):
+        # Some timestamps repeat and some land before the record's last update
+        timestamp = base_time + rng.choice([0, 0.5, rng.uniform(-60, span), round(rng.uniform(0, span))])
+        change = rng.choice(CHANGES) if rng.random() < 0.7 else rng.uniform(-30, 30)
+        events.append((rng.randrange(users), change, rng.choice(TRIGGERS), timestamp))
+    return events
+
+def seeded_state(entries, users, base_time):
+    state = InMemoryTiltState()
+    for user_id in range(users):
+        # Users without a record get one at base_time on both paths, so creation time can't differ
+        entry = copy.deepcopy(entries[user_id]) if user_id in entries else new_tilt_entry()
+        if user_id not in entries:
+            entry["last_updated"] = base_time
+        state.guilds[GUILD_ID][user_id] = entry
+    return state
+
+def apply_sequentially(state, events):
+    """update_tilt_score for each event in timestamp order, ties in list order"""
+    for user_id, change, trigger, timestamp in sorted(events, key=lambda event: event[3]):
+        state.modify(GUILD_ID, user_id, apply_tilt_update, change, trigger, timestamp)
+
+def apply_batch(state, events):
+    user_ids = list(dict.fromkeys(event[0] for event in events))
+    return state.modify_users(GUILD_ID, user_ids, apply_tilt_updates, events)
+
+def throughput(events_count, users, sequential_count, seed):
+    rng = random.Random(seed)
+    base_time = 1_700_000_000
+    entries = random_entries(rng, users, base_time)
+    events = random_events(rng, events_count, users, base_time, 3600)
+
+    state = seeded_state(entries, users, base_time)
+    start = time.perf_counter()
+    apply_batch(state, events)
+    batch_rate = events_count / (time.perf_counter() - start)
+
+    sample = events[:sequential_count]
+    state = seeded_state(entries, users, base_time)
+    start = time.perf_counter()
+    apply_sequentially(state, sample)
+    sequential_rate = len(sample) / (time.perf_counter() - start)
+
+    print(f"{events_count:>10} events {users:>7} users  batch {batch_rate:>12,.0f}/s  "
+          f"per-event {sequential_rate:>10,.0f}/s  {batch_rate / sequential_rate:5.1f}x")
+
+def replay(directory):
+    """Time an export's recorded score changes, per guild, on both paths"""
+    from utils.export import iter_replay_events
+
+    events_by_guild = {}
+    for guild_id, events in iter_replay_events(directory):
+        events_by_guild.setdefault(guild_id, []).extend(events)
+    if not events_by_guild:
+        print(f"No transcripts in {directory}")
+        return False
+
+    batch_time = sequential_time = 0.0
+    total = 0
+    for events in events_by_guild.values():
+        base_time = min(event[3] for event in events)
+        users = list(dict.fromkeys(event[0] for event in events))
+        sequential, batch = InMemoryTiltState(), InMemoryTiltState()
+        for state in (sequential, batch):
+            for user_id in users:
+                entry = new_tilt_entry()
+                entry["last_updated"] = base_time
+                state.guilds[GUILD_ID][user_id] = entry
+
+        start = time.perf_counter()
+        apply_sequentially(sequential, events)
+        sequential_time += time.perf_counter() - start
+        start = time.perf_counter()
+        apply_batch(batch, events)
+        batch_time += time.perf_counter() - start
+        total += len(events)
+
+    print(f"Replayed {total} events from {len(events_by_guild)} guilds: "
+          f"batch {total / batch_time:,.0f}/s, per-event {total / sequential_time:,.0f}/s")
+    return True
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--events", type=int, default=2_000_000, help="Events per throughput batch")
+    parser.add_argument("--users", default="100,10000", help="Comma-separated user counts to time")
+    parser.add_argument("--sequential-events", type=int, default=200_000, help="Events timed on the per-event path")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--replay", help="Export directory whose transcripts to replay instead")
+    args = parser.parse_args()
+
+    logger.setLevel(logging.WARNING)
+    if args.replay:
+        sys.exit(0 if replay(args.replay) else 1)
+    for users in (int(value) for value in args.users.split(",")):
+        throughput(args.events, users, args.sequential_events, args.seed)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,75 @@
+"""Compare real-time factor and gaming keyword recall of the Whisper latency profiles
+
+Usage: python -m benchmarks.whisper_profiles --fixtures path/to/clips [--names "Alice,Bob"]
+
+Clips need a matching .txt reference transcript for recall to be measured.
+Recall is reported on the raw Whisper output (how much correct_transcript
+has to fix) and after the correction pass.
+"""
+import argparse
+import re
+from types import SimpleNamespace
+import whisper
+from benchmarks.common import load_fixtures, normalize_words, word_error_rate, timed
+from config import WHISPER_PROFILES
+from utils.text_analysis import ALL_TERMS, build_vocabulary_prompt, correct_transcript
+import utils.speech as speech
+
+def reference_keywords(reference, names):
+    """Gaming terms and member names that appear in the reference transcript"""
+    text = " ".join(normalize_words(reference))
+    vocabulary = list(ALL_TERMS) + [name.lower() for name in names]
+    return [term for term in vocabulary if re.search(r'\b' + re.escape(term) + r'\b', text)]
+
+def keyword_recall(keywords, hypothesis):
+    if not keywords:
+        return None
+    text = " ".join(normalize_words(hypothesis))
+    found = sum(1 for term in keywords if re.search(r'\b' + re.escape(term) + r'\b', text))
+    return found / len(keywords)
+
+def fake_guild(names):
+    members = [SimpleNamespace(name=name, display_name=name, nick=None, bot=False) for name in names]
+    return SimpleNamespace(members=members)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--fixtures", required=True, help="Directory of audio clips with .txt references")
+    parser.add_argument("--names", default="", help="Comma separated member names to include in the prompt")
+    parser.add_argument("--profiles", default=",".join(WHISPER_PROFILES), help="Profiles to compare")
+    args = parser.parse_args()
+
+    speech.load_models()
+    fixtures = load_fixtures(args.fixtures)
+    if not fixtures:
+        raise SystemExit(f"No audio fixtures found in {args.fixtures}")
+
+    names = [name.strip() for name in args.names.split(",") if name.strip()]
+    guild = fake_guild(names)
+    prompt = build_vocabulary_prompt(guild)
+    audio_seconds = sum(len(whisper.load_audio(f["path"])) for f in fixtures) / whisper.audio.SAMPLE_RATE
+
+    print(f"{'profile':10} {'RTF':>6} {'WER':>6} {'recall raw':>11} {'recall fixed':>13}")
+    for profile in args.profiles.split(","):
+        total_time = 0.0
+        wers, raw_recalls, fixed_recalls = [], [], []
+        for fixture in fixtures:
+            text, seconds = timed(speech.run_whisper, fixture["path"], profile=profile, initial_prompt=prompt)
+            total_time += seconds
+            if not fixture["reference"]:
+                continue
+
+            fixed = correct_transcript(text, guild)
+            keywords = reference_keywords(fixture["reference"], names)
+            wers.append(word_error_rate(fixture["reference"], text))
+            for recalls, hypothesis in ((raw_recalls, text), (fixed_recalls, fixed)):
+                recall = keyword_recall(keywords, hypothesis)
+                if recall is not None:
+                    recalls.append(recall)
+
+        mean = lambda values: f"{sum(values) / len(values):.2f}" if values else "-"
+        print(f"{profile:10} {total_time / audio_seconds:6.3f} {mean(wers):>6} "
+              f"{mean(raw_recalls):>11} {mean(fixed_recalls):>13}")
+
+if __name__ == "__main__":
+    main()
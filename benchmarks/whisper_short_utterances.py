@@ -0,0 +1,65 @@
+"""Compare the short-utterance Whisper fast path against the padded 30 second path
+
+Usage: python -m benchmarks.whisper_short_utterances --fixtures path/to/clips [--repeat 3]
+
+Each clip is transcribed both ways. The report shows the word error rate of the
+fast path against the padded output (and against a reference .txt if present)
+and the speed-up.
+"""
+import argparse
+import whisper
+from benchmarks.common import load_fixtures, word_error_rate, timed
+from config import SHORT_UTTERANCE_MAX_SECONDS
+import utils.speech as speech
+
+def padded_transcribe(audio):
+    return speech.whisper_model.transcribe(audio, language="en", fp16=False, temperature=0.0)["text"]
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--fixtures", required=True, help="Directory of short audio clips")
+    parser.add_argument("--repeat", type=int, default=3, help="Timed runs per clip for each path")
+    parser.add_argument("--max-wer", type=float, default=0.15, help="Fail if the mean fast path WER vs padded exceeds this")
+    args = parser.parse_args()
+
+    speech.load_models()
+    fixtures = load_fixtures(args.fixtures)
+    if not fixtures:
+        raise SystemExit(f"No audio fixtures found in {args.fixtures}")
+
+    total_padded = total_fast = 0.0
+    agreement = []
+    print(f"{'clip':30} {'secs':>5} {'padded':>8} {'fast':>8} {'speedup':>8} {'wer':>6} {'ref wer':>8}")
+    for fixture in fixtures:
+        audio = whisper.load_audio(fixture["path"])
+        seconds = len(audio) / whisper.audio.SAMPLE_RATE
+        if seconds > SHORT_UTTERANCE_MAX_SECONDS:
+            print(f"{fixture['name']:30} skipped ({seconds:.1f}s is above the fast path limit)")
+            continue
+
+        # Warm both paths once so the timings are steady state
+        padded_text = padded_transcribe(audio)
+        fast_text = speech.transcribe_short(audio)
+
+        padded_time = min(timed(padded_transcribe, audio)[1] for _ in range(args.repeat))
+        fast_time = min(timed(speech.transcribe_short, audio)[1] for _ in range(args.repeat))
+        total_padded += padded_time
+        total_fast += fast_time
+
+        wer = word_error_rate(padded_text, fast_text)
+        agreement.append(wer)
+        ref_wer = f"{word_error_rate(fixture['reference'], fast_text):.2f}" if fixture["reference"] else "-"
+        print(f"{fixture['name']:30} {seconds:5.1f} {padded_time:8.3f} {fast_time:8.3f} "
+              f"{padded_time / fast_time:7.1f}x {wer:6.2f} {ref_wer:>8}")
+
+    if not agreement:
+        raise SystemExit("No clips were short enough for the fast path")
+
+    mean_wer = sum(agreement) / len(agreement)
+    print(f"\nTotal: padded {total_padded:.2f}s, fast {total_fast:.2f}s, "
+          f"speed-up {total_padded / total_fast:.1f}x, mean WER vs padded {mean_wer:.3f}")
+    if mean_wer > args.max_wer:
+        raise SystemExit(f"Fast path accuracy check failed: mean WER {mean_wer:.3f} > {args.max_wer}")
+
+if __name__ == "__main__":
+    main()
@@ -1,6 +1,7 @@
 import discord
 from discord.ext import commands
-from config import BOT_PREFIX, logger
+from config import BOT_PREFIX, RESULTS_TOPIC, logger
+from utils.alerts import AlertDispatcher
 
 # Initialize Discord bot with intents
 intents = discord.Intents.default()
@@ -8,12 +9,31 @@ intents.voice_states = True
 intents.messages = True
 intents.message_content = True
 
+def create_bot(shard_ids=None, shard_count=None):
+    """Create the bot instance, sharded if a shard count is given"""
+    if shard_count:
+        new_bot = commands.AutoShardedBot(
+            command_prefix=BOT_PREFIX,
+            intents=intents,
+            shard_ids=shard_ids,
+            shard_count=shard_count
+        )
+    else:
+        new_bot = commands.Bot(command_prefix=BOT_PREFIX, intents=intents)
+    new_bot.remove_command('help')  # Remove the built-in help command
+    return new_bot
+
 # Create bot instance
-bot = commands.Bot(command_prefix=BOT_PREFIX, intents=intents)
-bot.remove_command('help')  # Remove the built-in help command
+bot = create_bot()
 
-def setup_bot():
+def setup_bot(bus=None, shard_ids=None, shard_count=None):
+    global bot
     from bot.commands import setup_commands
+    from bot.gateway import start_result_collector
+    
+    # Sharded processes each get their own AutoShardedBot for their slice of shards
+    if shard_count:
+        bot = create_bot(shard_ids, shard_count)
     from bot.events import setup_events
     
     # Set up commands
@@ -22,7 +42,15 @@ def setup_bot():
     # Set up events
     setup_events(bot)
     
-    # Set default sensitivity
-    bot.sensitivity_multiplier = 1.0
+    # Tilt alerts go through one dispatcher so busy channels aren't flooded
+    bot.alert_dispatcher = AlertDispatcher()
+    
+    # In gateway mode inference happens on workers and results come back over the bus
+    bot.bus = bus
+    bot.results_topic = RESULTS_TOPIC
+    if shard_ids:
+        bot.results_topic = f"{RESULTS_TOPIC}:{'-'.join(str(shard_id) for shard_id in shard_ids)}"
+    if bus is not None:
+        start_result_collector(bot, bus)
     
     return bot
\ No newline at end of file
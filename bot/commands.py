@@ -1,11 +1,99 @@
+import asyncio
+import os
+import time
 import discord
 import threading
 import queue
 from discord.ext import commands
-from config import user_tilt_scores, voice_clients, processing_queues, logger
-from utils.tilt import update_tilt_decay, get_tilt_message, get_tilt_color
+from config import (voice_clients, processing_queues, PROFILE_MAX_SECONDS, SENSITIVITY_LEVELS, RENDER_CACHE_TTL,
+                    RENDER_CACHE_SIZE, EXPORT_DIR, EXPORT_FORMAT, new_tilt_entry, logger)
+from data.guild_settings import get_guild_settings, update_guild_settings
+from utils.leaderboard import RenderCache
+from utils.tilt import (update_tilt_decay, get_guild_leaderboard, get_guild_version, get_user_tilt, reset_tilt,
+                        get_tilt_message, get_tilt_color)
 from bot.voice import start_listening, process_audio_thread
 
+# Rendered !tilt/!tilts replies, reused while the guild's version is unchanged
+# The TTL bounds how stale decay, renames and triggers on an unchanged score can get
+render_cache = RenderCache(RENDER_CACHE_TTL, RENDER_CACHE_SIZE)
+
+def tilt_meter(tilt_score):
+    return "█" * int(tilt_score // 10) + "░" * int(10 - (tilt_score // 10))
+
+def render_tilt(guild_id, member):
+    """Build the !tilt reply for a member"""
+    update_tilt_decay(guild_id, member.id)
+    # Looking someone up mustn't track them - that would add them to the leaderboard and bump the guild version
+    user_tilt = get_user_tilt(guild_id, member.id, create=False) or new_tilt_entry()
+    tilt_score = user_tilt["score"]
+    tilt_score = round(tilt_score, 1)
+
+    tilt_message = get_tilt_message(tilt_score)
+    
+    embed = discord.Embed(
+        title=f"🌡️ Tilt Level: {member.display_name}",
+        description=f"Current tilt level: **{tilt_score}/100**\n{tilt_message}",
+        color=get_tilt_color(tilt_score)
+    )
+    
+    # progress bar - convert to integer here
+    embed.add_field(name="Tilt Meter", value=f"`{tilt_meter(tilt_score)}`", inline=False)
+    
+    # recent triggers if available
+    if user_tilt.get("triggers", []):
+        triggers = user_tilt["triggers"][-6:]  # Get last 6 triggers
+        formatted_triggers = []
+        for trigger in triggers:
+            if trigger.startswith("+"):  # Positive triggers
+                formatted_triggers.append(f"• 🟢 {trigger[1:]}")
+            else:
+                formatted_triggers.append(f"• 🔴 {trigger}")
+                
+        embed.add_field(
+            name="Recent Triggers",
+            value="\n".join(formatted_triggers) or "None detected",
+            inline=False
+        )
+    
+    return {"embed": embed}
+
+def render_tilts(guild):
+    """Build the !tilts reply from the guild's leaderboard"""
+    # Discord has a 25 field limit per embed; fetch more if some of the top users have left the server
+    limit = 25
+    while True:
+        ranked = get_guild_leaderboard(guild.id, limit)
+        rows = []
+        for user_id, tilt_score in ranked:
+            user = guild.get_member(user_id)
+            if user:
+                rows.append((user, tilt_score))
+                if len(rows) >= 25:
+                    break
+        if len(rows) >= 25 or len(ranked) < limit:
+            break
+        limit *= 2
+    
+    if not ranked:
+        return {"content": "No tilt data available yet!"}
+    if not rows:
+        return {"content": "Could not find any users with tilt scores. They may have left the server."}
+    
+    embed = discord.Embed(
+        title="🌡️ Team Tilt Levels",
+        description="Current tilt levels for all tracked players",
+        color=discord.Color.purple()
+    )
+    for user, tilt_score in rows:
+        # Round the tilt score to avoid float display issues
+        tilt_score = round(tilt_score, 1)
+        embed.add_field(
+            name=f"{user.display_name}: {tilt_score}/100",
+            value=f"`{tilt_meter(tilt_score)}`\n{get_tilt_message(tilt_score)[:50]}",
+            inline=False
+        )
+    return {"embed": embed}
+
 def setup_commands(bot):
     @bot.command(name='join')
     async def join(ctx):
@@ -18,15 +106,17 @@ def setup_commands(bot):
                 voice_client = await channel.connect()
                 voice_clients[ctx.guild.id] = voice_client
                 
-                # Set up audio processing queue for this guild
-                processing_queues[ctx.guild.id] = queue.Queue()
-                
-                # Start audio processing thread
-                threading.Thread(
-                    target=process_audio_thread, 
-                    args=(ctx.guild.id, ctx.channel.id),
-                    daemon=True
-                ).start()
+                # In gateway mode audio goes to the inference workers instead of a local thread
+                if getattr(bot, 'bus', None) is None:
+                    # Set up audio processing queue for this guild
+                    processing_queues[ctx.guild.id] = queue.Queue()
+                    
+                    # Start audio processing thread
+                    threading.Thread(
+                        target=process_audio_thread, 
+                        args=(ctx.guild.id, ctx.channel.id),
+                        daemon=True
+                    ).start()
                 
                 await ctx.send(f"JustFF joined {channel} and is monitoring tilt levels!")
                 
@@ -61,106 +151,70 @@ def setup_commands(bot):
         if member is None:
             member = ctx.author
         
-        update_tilt_decay(member.id)
-        tilt_score = user_tilt_scores[member.id]["score"]
-        tilt_score = round(tilt_score, 1)
+        # Reuse the last reply while nothing in the guild has changed (read the version before rendering)
+        key = ("tilt", ctx.guild.id, member.id)
+        version = get_guild_version(ctx.guild.id)
+        reply = render_cache.get(key, version)
+        if reply is None:
+            reply = render_tilt(ctx.guild.id, member)
+            render_cache.put(key, version, reply)
+        await ctx.send(**reply)
 
-        tilt_message = get_tilt_message(tilt_score)
+    @bot.command(name='tilthistory')
+    async def tilthistory(ctx, member: discord.Member = None):
+        """Show how a player's tilt has moved over the last minute, hour and two days"""
+        from utils.history import sparkline
         
+        if member is None:
+            member = ctx.author
+        
+        update_tilt_decay(ctx.guild.id, member.id)
+        user_tilt = get_user_tilt(ctx.guild.id, member.id, create=False)
+        history = user_tilt.get("history") if user_tilt is not None else None
+        if history is None:
+            await ctx.send(f"No tilt history for {member.display_name} yet!")
+            return
+        
+        now = time.time()
         embed = discord.Embed(
-            title=f"🌡️ Tilt Level: {member.display_name}",
-            description=f"Current tilt level: **{tilt_score}/100**\n{tilt_message}",
-            color=get_tilt_color(tilt_score)
+            title=f"📈 Tilt History: {member.display_name}",
+            description=f"Current tilt level: **{round(user_tilt['score'], 1)}/100**",
+            color=get_tilt_color(user_tilt["score"])
         )
         
-        # progress bar - convert to integer here
-        progress = "█" * int(tilt_score // 10) + "░" * int(10 - (tilt_score // 10))
-        embed.add_field(name="Tilt Meter", value=f"`{progress}`", inline=False)
-        
-        # recent triggers if available
-        if user_tilt_scores[member.id].get("triggers", []):
-            triggers = user_tilt_scores[member.id]["triggers"][-6:]  # Get last 6 triggers
-            formatted_triggers = []
-            for trigger in triggers:
-                if trigger.startswith("+"):  # Positive triggers
-                    formatted_triggers.append(f"• 🟢 {trigger[1:]}")
-                else:
-                    formatted_triggers.append(f"• 🔴 {trigger}")
-                    
-            embed.add_field(
-                name="Recent Triggers",
-                value="\n".join(formatted_triggers) or "None detected",
-                inline=False
+        for level, label, trend_seconds, trend_label in (
+            ("second", "Last minute", 60, "1 min"),
+            ("minute", "Last hour", 600, "10 min"),
+            ("hour", "Last 2 days", 6 * 3600, "6 h"),
+        ):
+            change = history.change(now, trend_seconds)
+            trend = "no data that far back" if change is None else (
+                f"{'▲' if change > 0 else '▼' if change < 0 else '▬'} {change:+.1f} over {trend_label}"
             )
+            embed.add_field(name=f"{label} ({trend})", value=f"`{sparkline(history.series(level, now))}`", inline=False)
         
         await ctx.send(embed=embed)
 
     @bot.command(name='tilts')
     async def tilts(ctx):
         """Check all players' tilt levels"""
-        # Apply tilt decay to all users
-        for user_id in list(user_tilt_scores.keys()):
-            update_tilt_decay(user_id)
-        
-        if not user_tilt_scores:
-            await ctx.send("No tilt data available yet!")
-            return
-        
-        embed = discord.Embed(
-            title="🌡️ Team Tilt Levels",
-            description="Current tilt levels for all tracked players",
-            color=discord.Color.purple()
-        )
-        
-        # Sort users by tilt score
-        sorted_users = sorted(user_tilt_scores.items(), 
-                            key=lambda x: x[1]["score"], 
-                            reverse=True)
-        
-        users_added = 0
-        
-        for user_id, data in sorted_users:
-            tilt_score = data["score"]
-            
-            # Try both methods to get the user
-            user = bot.get_user(user_id)
-            if not user and ctx.guild:
-                user = ctx.guild.get_member(user_id)
-                
-            if user:
-                # Round the tilt score to avoid float display issues
-                tilt_score = round(tilt_score, 1)
-                progress = "█" * int(tilt_score // 10) + "░" * int(10 - (tilt_score // 10))
-                embed.add_field(
-                    name=f"{user.display_name}: {tilt_score}/100",
-                    value=f"`{progress}`\n{get_tilt_message(tilt_score)[:50]}",
-                    inline=False
-                )
-                users_added += 1
-                
-                # Discord has a 25 field limit per embed
-                if users_added >= 25:
-                    break
-        
-        if users_added > 0:
-            await ctx.send(embed=embed)
-        else:
-            # If we have scores but couldn't find any users
-            if user_tilt_scores:
-                await ctx.send("Could not find any users with tilt scores. They may have left the server.")
-            else:
-                await ctx.send("No tilt data available yet!")
+        key = ("tilts", ctx.guild.id)
+        version = get_guild_version(ctx.guild.id)
+        reply = render_cache.get(key, version)
+        if reply is None:
+            reply = render_tilts(ctx.guild)
+            render_cache.put(key, version, reply)
+        await ctx.send(**reply)
 
     @bot.command(name='reset')
     async def reset(ctx, member: discord.Member = None):
         """Reset tilt scores for a user or everyone"""
         if member:
-            user_tilt_scores[member.id] = {"score": 0, "last_updated": time.time(), "samples": [], "triggers": []}
+            reset_tilt(ctx.guild.id, member.id)
             await ctx.send(f"Reset tilt score for {member.display_name} to 0.")
         else:
-            for user_id in list(user_tilt_scores.keys()):
-                user_tilt_scores[user_id] = {"score": 0, "last_updated": time.time(), "samples": [], "triggers": []}
-            await ctx.send("Reset tilt scores for all users to 0.")
+            reset_tilt(ctx.guild.id)
+            await ctx.send("Reset tilt scores for all users in this server to 0.")
 
     @bot.command(name='help')
     async def help_command(ctx):
@@ -174,9 +228,13 @@ def setup_commands(bot):
         embed.add_field(name="!join", value="Bot joins your voice channel and starts monitoring", inline=False)
         embed.add_field(name="!leave", value="Bot leaves the voice channel", inline=False)
         embed.add_field(name="!tilt [@user]", value="Check tilt level of yourself or mentioned user", inline=False)
+        embed.add_field(name="!tilthistory [@user]", value="Chart tilt over the last minute, hour and two days", inline=False)
         embed.add_field(name="!tilts", value="Check tilt levels of all tracked players", inline=False)
-        embed.add_field(name="!reset [@user]", value="Reset tilt score for yourself or mentioned user (no mention = reset all)", inline=False)
-        embed.add_field(name="!sensitivity [low|medium|high]", value="Adjust tilt detection sensitivity", inline=False)
+        embed.add_field(name="!reset [@user]", value="Reset tilt score for yourself or mentioned user (no mention = reset everyone in this server)", inline=False)
+        embed.add_field(name="!sensitivity [low|medium|high]", value="Adjust tilt detection sensitivity for this server", inline=False)
+        embed.add_field(name="!packs [pack...]", value="Show or choose game keyword packs (moba, fps, br) for this server", inline=False)
+        embed.add_field(name="!profile [seconds]", value="Profile the bot and post the hottest functions (admins only)", inline=False)
+        embed.add_field(name="!export [jsonl|parquet] [transcripts]", value="Export this server's tilt data to files for analysis (admins only)", inline=False)
         
         await ctx.send(embed=embed)
 
@@ -188,21 +246,42 @@ def setup_commands(bot):
             return
         
         level = level.lower()
-        if level not in ["low", "medium", "high"]:
-            await ctx.send("Invalid sensitivity level. Choose from: low, medium, high")
+        if level not in SENSITIVITY_LEVELS:
+            await ctx.send(f"Invalid sensitivity level. Choose from: {', '.join(SENSITIVITY_LEVELS)}")
             return
         
-        multipliers = {
-            "low": 0.5,
-            "medium": 1.0,
-            "high": 1.5
-        }
-        
-        # Store the sensitivity multiplier in the bot's state
-        bot.sensitivity_multiplier = multipliers[level]
+        # Sensitivity is per guild, and saved so it survives restarts
+        update_guild_settings(ctx.guild.id, sensitivity=SENSITIVITY_LEVELS[level])
         
         await ctx.send(f"Tilt detection sensitivity set to {level.upper()}")
 
+    @bot.command(name='packs')
+    async def packs(ctx, *names: str):
+        """Show or choose the game keyword packs used for this server"""
+        from utils.keywords import get_keyword_registry
+        
+        available = get_keyword_registry().pack_names()
+        if not names:
+            current = get_guild_settings(ctx.guild.id)["keyword_packs"]
+            lines = [f"• **{name}** — {description}{' ✅' if name in current else ''}"
+                     for name, description in sorted(available.items())]
+            await ctx.send("Keyword packs (✅ = in use here):\n" + ("\n".join(lines) or "None installed") +
+                           "\nUse `!packs <name> [name...]` to choose, or `!packs none` for the built-in keywords only.")
+            return
+        
+        if not ctx.author.guild_permissions.manage_guild:
+            await ctx.send("You need the Manage Server permission to change keyword packs.")
+            return
+        
+        chosen = [] if [name.lower() for name in names] == ["none"] else [name.lower() for name in names]
+        unknown = [name for name in chosen if name not in available]
+        if unknown:
+            await ctx.send(f"Unknown keyword pack(s): {', '.join(unknown)}. Available: {', '.join(sorted(available)) or 'none'}")
+            return
+        
+        update_guild_settings(ctx.guild.id, keyword_packs=chosen)
+        await ctx.send(f"Keyword packs for this server: {', '.join(chosen) or 'built-in keywords only'}")
+
     @bot.command(name='analyze')
     async def analyze_command(ctx, *, text: str = None):
         """Analyze text with the sentiment analyzer to see tilt score calculation"""
@@ -212,13 +291,16 @@ def setup_commands(bot):
             
         await ctx.send(f"Analyzing: '{text}'...")
         
+        from utils.language import get_language_cache
         from utils.speech import analyze_text_for_tilt, tilt_pipeline
         from utils.text_analysis import fallback_analyze_text_for_tilt
         
         # Use the sentiment analyzer first
+        packs = get_guild_settings(ctx.guild.id)["keyword_packs"] if ctx.guild else None
+        language = get_language_cache().language(ctx.author.id)
         if tilt_pipeline is not None:
-            score = analyze_text_for_tilt(text)
-            keyword_score = fallback_analyze_text_for_tilt(text)
+            score = analyze_text_for_tilt(text, packs=packs, language=language)
+            keyword_score = fallback_analyze_text_for_tilt(text, packs, language)
             
             embed = discord.Embed(
                 title="Tilt Analysis Results",
@@ -236,7 +318,62 @@ def setup_commands(bot):
             await ctx.send(embed=embed)
         else:
             await ctx.send("Sentiment analysis is not available. Using keyword analysis only.")
-            score = fallback_analyze_text_for_tilt(text)
+            score = fallback_analyze_text_for_tilt(text, packs, language)
             await ctx.send(f"Keyword analysis score: {score}/20")
-    
+
+    @bot.command(name='profile')
+    @commands.has_permissions(administrator=True)
+    async def profile(ctx, seconds: int = 30):
+        """Sample where the bot spends its time and memory for a while"""
+        from utils.profiling import start_profile
+        
+        seconds = max(1, min(seconds, PROFILE_MAX_SECONDS))
+        session = start_profile(seconds)
+        if session is None:
+            await ctx.send("A profile is already running, try again when it finishes.")
+            return
+        
+        await ctx.send(f"Profiling for {seconds}s...")
+        report = await asyncio.get_running_loop().run_in_executor(None, session.wait)
+        if report is None:
+            await ctx.send("Profiling failed, check the logs.")
+            return
+        
+        # Discord messages are capped at 2000 characters; the full summary is on disk
+        await ctx.send(f"```\n{report['summary'][:1900]}\n```", file=discord.File(report["collapsed_path"]))
+
+    @profile.error
+    async def profile_error(ctx, error):
+        if isinstance(error, commands.MissingPermissions):
+            await ctx.send("Only server administrators can run !profile.")
+        else:
+            logger.error(f"Error in !profile: {error}")
+
+    @bot.command(name='export')
+    @commands.has_permissions(administrator=True)
+    async def export(ctx, *options: str):
+        """Export this server's tilt scores, history and optionally transcripts for offline analysis"""
+        from utils.export import export_data
+        from utils.tilt import get_tilt_state
+
+        fmt = "parquet" if "parquet" in options else "jsonl" if "jsonl" in options else EXPORT_FORMAT
+        directory = os.path.join(EXPORT_DIR, f"guild-{ctx.guild.id}-{time.strftime('%Y%m%d-%H%M%S')}")
+        await ctx.send(f"Exporting to `{directory}`...")
+        try:
+            # Chunked reads and file writes happen off the event loop
+            counts = await asyncio.get_running_loop().run_in_executor(
+                None, lambda: export_data(directory, get_tilt_state(), [ctx.guild.id], fmt, "transcripts" in options)
+            )
+        except (RuntimeError, OSError) as e:
+            await ctx.send(f"Export failed: {e}")
+            return
+        await ctx.send("Exported " + ", ".join(f"{count} {table} rows" for table, count in counts.items()) + ".")
+
+    @export.error
+    async def export_error(ctx, error):
+        if isinstance(error, commands.MissingPermissions):
+            await ctx.send("Only server administrators can run !export.")
+        else:
+            logger.error(f"Error in !export: {error}")
+
     return bot
\ No newline at end of file
@@ -1,6 +1,12 @@
-from config import logger, user_tilt_scores
+import asyncio
+from config import logger
+from data.guild_settings import get_guild_settings
+from data.transcripts import record_transcript
+from utils.language import get_language_cache
+from utils.resources import get_cpu_budget
 from utils.speech import analyze_text_for_tilt
 from utils.tilt import update_tilt_score
+from bot.gateway import submit_text_job
 
 def setup_events(bot):
     @bot.event
@@ -22,23 +28,41 @@ def setup_events(bot):
         
         # Only analyze messages in voice channels or their associated text channels
         if message.author.voice:
-            tilt_score_increase = analyze_text_for_tilt(message.content.lower())
+            # In gateway mode the sentiment model runs on an inference worker
+            if getattr(bot, 'bus', None) is not None:
+                submit_text_job(bot.bus, message, bot.results_topic)
+                return
             
-            if tilt_score_increase != 0:
-                # Apply sensitivity multiplier if set
-                if hasattr(bot, 'sensitivity_multiplier'):
-                    tilt_score_increase *= bot.sensitivity_multiplier
-                    
-                update_tilt_score(message.author.id, tilt_score_increase, trigger=message.content)
-                
-                # Log based on whether it's positive or negative
-                if tilt_score_increase > 0:
-                    logger.debug(f"Increased {message.author.name}'s tilt by {tilt_score_increase} to {user_tilt_scores[message.author.id]['score']}")
-                else:
-                    logger.debug(f"Decreased {message.author.name}'s tilt by {abs(tilt_score_increase)} to {user_tilt_scores[message.author.id]['score']}")
-                
-                # If someone gets very tilted, send a notification
-                if user_tilt_scores[message.author.id]["score"] >= 90:
-                    await message.channel.send(f"⚠️ **Tilt Alert**: {message.author.mention} is reaching critical tilt levels! ({user_tilt_scores[message.author.id]['score']}/100)")
+            # Run the sentiment model on its own threads so it never stalls the event loop
+            # Messages go to the model for the language the author was last heard speaking
+            packs = get_guild_settings(message.guild.id)["keyword_packs"]
+            language = get_language_cache().language(message.author.id)
+            tilt_score_increase = await asyncio.get_running_loop().run_in_executor(
+                get_cpu_budget().executor("sentiment"), analyze_text_for_tilt, message.content.lower(), "transformer",
+                packs, language
+            )
+            apply_text_tilt(bot, message.channel, message.author, tilt_score_increase, message.content)
     
-    return bot
\ No newline at end of file
+    return bot
+
+def apply_text_tilt(bot, channel, member, tilt_score_increase, trigger):
+    """Apply a tilt change detected in a text message"""
+    # Apply the guild's sensitivity multiplier
+    guild_id = member.guild.id
+    tilt_score_increase *= get_guild_settings(guild_id)["sensitivity"]
+    
+    # Logged even when nothing changed - misses matter as much as hits when tuning keywords
+    record_transcript(guild_id, member.id, "text", trigger, tilt_score_increase)
+    if tilt_score_increase == 0:
+        return
+    
+    tilt_score = update_tilt_score(guild_id, member.id, tilt_score_increase, trigger=trigger)
+    
+    # Log based on whether it's positive or negative
+    if tilt_score_increase > 0:
+        logger.debug(f"Increased {member.name}'s tilt by {tilt_score_increase} to {tilt_score}")
+    else:
+        logger.debug(f"Decreased {member.name}'s tilt by {abs(tilt_score_increase)} to {tilt_score}")
+    
+    # If someone gets very tilted, queue a notification (coalesced and rate limited)
+    bot.alert_dispatcher.submit(channel, member, tilt_score)
@@ -0,0 +1,79 @@
+import threading
+import time
+from config import JOBS_TOPIC, RESULTS_TOPIC, logger
+from data.guild_settings import get_guild_settings
+from utils.language import get_language_cache
+from utils.worker import member_snapshot
+
+def submit_text_job(bus, message, reply_to=RESULTS_TOPIC):
+    """Send a text message to the inference workers"""
+    bus.publish(JOBS_TOPIC, {
+        "reply_to": reply_to,
+        "kind": "text",
+        "guild_id": message.guild.id,
+        "channel_id": message.channel.id,
+        "user_id": message.author.id,
+        "text": message.content,
+        "keyword_packs": get_guild_settings(message.guild.id)["keyword_packs"],
+        "language": get_language_cache().language(message.author.id),
+    })
+
+def submit_audio_job(bus, guild, channel_id, user_id, audio_bytes, reply_to=RESULTS_TOPIC, recorded_at=None):
+    """Send a recorded audio segment to the inference workers, routed by the speaker's cached language"""
+    language, detect = get_language_cache().route(user_id)
+    bus.publish(JOBS_TOPIC, {
+        "reply_to": reply_to,
+        "kind": "audio",
+        "guild_id": guild.id,
+        "channel_id": channel_id,
+        "user_id": user_id,
+        "audio": audio_bytes,
+        "recorded_at": recorded_at or time.time(),
+        "members": member_snapshot(guild),
+        "keyword_packs": get_guild_settings(guild.id)["keyword_packs"],
+        "language": language,
+        "detect_language": detect,
+    })
+
+def apply_result(bot, result):
+    """Apply an inference result to the tilt state (runs on the event loop)"""
+    from bot.events import apply_text_tilt
+    from bot.voice import apply_voice_tilt
+    from utils.prosody import apply_prosody_tilt
+
+    try:
+        if result["kind"] == "text":
+            guild = bot.get_guild(result["guild_id"])
+            channel = bot.get_channel(result["channel_id"])
+            member = guild.get_member(result["user_id"]) if guild else None
+            if member is None or channel is None:
+                return
+            apply_text_tilt(bot, channel, member, result["score_change"], result["trigger"])
+        else:
+            # Detections made on a worker settle the speaker's language here, once for all workers
+            if result.get("language_probabilities"):
+                get_language_cache().observe(result["user_id"], result["language_probabilities"])
+            # Overlap tracking needs every speaker in the guild, so it happens here rather than on the worker
+            if result.get("features"):
+                features = result["features"]
+                apply_prosody_tilt(result["guild_id"], result["user_id"], features,
+                                   result["recorded_at"] - features["duration"])
+            if result["trigger"]:
+                apply_voice_tilt(bot, result["guild_id"], result["user_id"], result["score_change"], result["trigger"])
+    except Exception as e:
+        logger.error(f"Error applying inference result: {e}")
+
+def start_result_collector(bot, bus):
+    """Start a thread that moves worker results back onto the bot's event loop"""
+    def collect():
+        logger.info("Result collector started")
+        while not bot.is_closed():
+            # Each shard process gets its own results topic so it only sees its own guilds
+            result = bus.consume(bot.results_topic, timeout=1)
+            if result is not None:
+                bot.loop.call_soon_threadsafe(apply_result, bot, result)
+        logger.info("Result collector exited")
+
+    thread = threading.Thread(target=collect, daemon=True)
+    thread.start()
+    return thread
@@ -1,14 +1,19 @@
 import asyncio
+import time
 import tempfile
 import os
 import threading
 import queue
+from collections import defaultdict
 import discord
-from config import logger, processing_queues, voice_clients
+from config import (PROSODY_ENABLED, INCREMENTAL_TRANSCRIPTION, RECORDING_CHUNK_SECONDS, INCREMENTAL_CHUNK_SECONDS,
+                    STREAM_IDLE_SECONDS, logger, processing_queues, voice_clients)
+from data.guild_settings import get_guild_settings
+from data.transcripts import record_transcript
 from utils.tilt import update_tilt_score
-from utils.speech import whisper_model, analyze_text_for_tilt
-from utils.text_analysis import correct_gaming_terms, correct_usernames
-from utils.audio_processing import preprocess_audio
+from utils.scheduler import score_audio_segment, score_quiet_streams, degraded_mode
+from utils.prosody import analyze_clip_prosody, score_acoustic_only
+from bot.gateway import submit_audio_job
 
 class VoiceReceiver(discord.VoiceClient):
     def __init__(self, client, channel):
@@ -51,8 +56,11 @@ async def start_listening(ctx, voice_client):
 
 async def process_recordings_regularly(ctx, voice_client):
     """Regularly stop and restart recording to process chunks"""
+    # Incremental transcription stitches chunk boundaries back together, so it can cut more often
+    incremental = INCREMENTAL_TRANSCRIPTION and getattr(ctx.bot, 'bus', None) is None
+    chunk_seconds = INCREMENTAL_CHUNK_SECONDS if incremental else RECORDING_CHUNK_SECONDS
     while ctx.voice_client and ctx.voice_client.is_connected():
-        await asyncio.sleep(10)  # Process every 10 seconds
+        await asyncio.sleep(chunk_seconds)
         if hasattr(voice_client, 'recording') and voice_client.recording:
             try:
                 voice_client.stop_recording()  # This triggers the callback
@@ -72,9 +80,18 @@ async def finished_callback(sink, channel):
     """Callback for when recording is finished"""
     logger.info("Recording callback triggered")
     
+    from bot.client import bot
+    recorded_at = time.time()  # End of the recording window, for lining up speakers
+    
     try:
         # Process the recorded audio data
         for user_id, audio in sink.audio_data.items():
+            # In gateway mode the segment goes straight to the inference workers
+            if getattr(bot, 'bus', None) is not None:
+                audio.file.seek(0)
+                submit_audio_job(bot.bus, channel.guild, channel.id, user_id, audio.file.read(), bot.results_topic, recorded_at)
+                continue
+            
             # Add to processing queue for analysis
             if channel.guild.id in processing_queues:
                 try:
@@ -87,7 +104,7 @@ async def finished_callback(sink, channel):
                         temp_path = temp_file.name
                     
                     # Add file path to processing queue instead of raw bytes
-                    processing_queues[channel.guild.id].put((user_id, temp_path))
+                    processing_queues[channel.guild.id].put((user_id, temp_path, recorded_at))
                 except Exception as e:
                     logger.error(f"Error processing audio data: {e}")
     except Exception as e:
@@ -99,81 +116,105 @@ def process_audio_thread(guild_id, channel_id):
     
     while True:
         try:
-            # Get the next audio packet from the queue
-            task = processing_queues[guild_id].get()
+            # Get the next audio packet from the queue, waking up now and then to flush quiet speakers
+            try:
+                task = processing_queues[guild_id].get(timeout=STREAM_IDLE_SECONDS / 2 if INCREMENTAL_TRANSCRIPTION else None)
+            except queue.Empty:
+                task = ()
             
             # None is the signal to exit
             if task is None:
                 logger.info(f"Stopping audio processing thread for guild {guild_id}")
+                if INCREMENTAL_TRANSCRIPTION:
+                    flush_quiet_speakers(guild_id, idle_seconds=0)
                 break
             
-            user_id, audio_data = task
+            if task:
+                user_id, audio_data, recorded_at = task
+                
+                # Process the audio data
+                process_audio(guild_id, channel_id, user_id, audio_data, recorded_at)
             
-            # Process the audio data
-            process_audio(guild_id, channel_id, user_id, audio_data)
+            if INCREMENTAL_TRANSCRIPTION:
+                flush_quiet_speakers(guild_id)
             
         except Exception as e:
             logger.error(f"Error in audio processing thread: {e}")
     
     logger.info(f"Audio processing thread for guild {guild_id} exited")
 
-def process_audio(guild_id, channel_id, user_id, audio_path):
+def process_audio(guild_id, channel_id, user_id, audio_path, recorded_at=None):
     """Process audio data for a user"""
     try:
         # Get the guild object
         from bot.client import bot
         guild = bot.get_guild(guild_id)
         
-        # Preprocess the audio
-        processed_path = f"{audio_path}_processed.wav"
-        processed_path = preprocess_audio(audio_path, processed_path)
+        # Skip ASR when we're too far behind (or Whisper is still loading)
+        queue_depth = sum(q.qsize() for q in list(processing_queues.values()))
+        lag = time.time() - recorded_at if recorded_at else 0
+        degraded = degraded_mode.update(lag, queue_depth)
         
-        # Use Whisper to transcribe the audio
-        try:
-            result = whisper_model.transcribe(
-                processed_path, 
-                language="en",
-                word_timestamps=True,  # Get timestamps for words
-                fp16=False  # Explicitly disable FP16
-            )
-            
-            transcription = result["text"].strip()
-            
-            if transcription:
-                # Apply gaming term corrections
-                corrected_text = correct_gaming_terms(transcription)
-                
-                # Apply username corrections
-                corrected_text = correct_usernames(corrected_text, guild)
-                
-                logger.info(f"Transcribed: {transcription}")
-                logger.info(f"Corrected: {corrected_text}")
+        # Acoustic features are cheap next to ASR, so score them on every clip
+        features = None
+        if PROSODY_ENABLED or degraded:
+            try:
+                features = analyze_clip_prosody(guild_id, user_id, audio_path, recorded_at, track_pitch=degraded)
+            except Exception as e:
+                logger.error(f"Error in prosody analysis: {e}")
+        
+        if degraded:
+            if features:
+                tilt_score_increase, reasons = score_acoustic_only(features)
+                if reasons:
+                    apply_voice_tilt(bot, guild_id, user_id, tilt_score_increase, f"[voice estimate: {', '.join(reasons)}]")
+        else:
+            try:
+                # Model tier depends on how far behind processing is across all guilds
+                packs = get_guild_settings(guild_id)["keyword_packs"]
+                stream_key = (guild_id, user_id) if INCREMENTAL_TRANSCRIPTION else None
+                corrected_text, tilt_score_increase = score_audio_segment(audio_path, guild, queue_depth, packs=packs,
+                                                                          user_id=user_id, stream_key=stream_key)
                 
-                # Analyze the corrected transcription for tilt
-                tilt_score_increase = analyze_text_for_tilt(corrected_text.lower())
+                if corrected_text:
+                    apply_voice_tilt(bot, guild_id, user_id, tilt_score_increase, corrected_text)
                 
-                if tilt_score_increase != 0:
-                    # Apply sensitivity multiplier if set
-                    from bot.client import bot
-                    if hasattr(bot, 'sensitivity_multiplier'):
-                        tilt_score_increase *= bot.sensitivity_multiplier
-                    
-                    update_tilt_score(user_id, tilt_score_increase, trigger=corrected_text)
-                    if tilt_score_increase > 0:
-                        logger.info(f"Voice caused tilt increase of {tilt_score_increase} for user {user_id}")
-                    else:
-                        logger.info(f"Voice caused tilt decrease of {abs(tilt_score_increase)} for user {user_id}")
-            
-        except Exception as e:
-            logger.error(f"Error in speech recognition: {e}")
+            except Exception as e:
+                logger.error(f"Error in speech recognition: {e}")
         
         # Clean up temporary files
         try:
             os.unlink(audio_path)
-            if processed_path != audio_path:
-                os.unlink(processed_path)
         except Exception as e:
             logger.error(f"Error cleaning up temp files: {e}")
         
     except Exception as e:
-        logger.error(f"Error processing audio: {e}")
\ No newline at end of file
+        logger.error(f"Error processing audio: {e}")
+
+def flush_quiet_speakers(guild_id, idle_seconds=None):
+    """Score the words incremental transcription was still holding for speakers who stopped talking"""
+    from bot.client import bot
+    try:
+        packs = get_guild_settings(guild_id)["keyword_packs"]
+        for user_id, text, tilt_score_increase in score_quiet_streams(guild_id, bot.get_guild(guild_id), packs=packs,
+                                                                      idle_seconds=idle_seconds):
+            apply_voice_tilt(bot, guild_id, user_id, tilt_score_increase, text)
+    except Exception as e:
+        logger.error(f"Error flushing incremental transcripts: {e}")
+
+def apply_voice_tilt(bot, guild_id, user_id, tilt_score_increase, trigger):
+    """Apply a tilt change detected in voice chat"""
+    # Apply the guild's sensitivity multiplier
+    tilt_score_increase *= get_guild_settings(guild_id)["sensitivity"]
+    
+    # Log transcripts, not acoustic-only estimates, even when nothing changed
+    if not trigger.startswith("[voice"):
+        record_transcript(guild_id, user_id, "voice", trigger, tilt_score_increase)
+    if tilt_score_increase == 0:
+        return
+    
+    update_tilt_score(guild_id, user_id, tilt_score_increase, trigger=trigger)
+    if tilt_score_increase > 0:
+        logger.info(f"Voice caused tilt increase of {tilt_score_increase} for user {user_id}")
+    else:
+        logger.info(f"Voice caused tilt decrease of {abs(tilt_score_increase)} for user {user_id}")
@@ -1,6 +1,5 @@
 import logging
 import os
-from collections import defaultdict
 import time
 from dotenv import load_dotenv
 
@@ -13,21 +12,162 @@ DISCORD_TOKEN = os.getenv("DISCORD_BOT_TOKEN")
 
 # Whisper model configuration
 WHISPER_MODEL_SIZE = "base"  # Options: "tiny", "base", "small", "medium", "large"
+WHISPER_MMAP_WEIGHTS = True  # Memory-map weights from safetensors so processes share one copy
+MODEL_CACHE_DIR = os.getenv("JUSTFF_MODEL_CACHE", os.path.join(os.path.expanduser("~"), ".cache", "justff"))
+ASR_TIERS = ["tiny", "base", "small"]  # Adaptive tiering options, fastest to most accurate
+ASR_PRELOAD_TIERS = ["tiny"]  # Extra tiers loaded in the background at startup
+
+# Whisper latency profiles - "realtime" is greedy with no fallback, "accurate" is Whisper's defaults plus beam search
+WHISPER_PROFILE = os.getenv("JUSTFF_WHISPER_PROFILE", "balanced")
+WHISPER_PROFILES = {
+    "realtime": {
+        "beam_size": None,  # Greedy decoding
+        "best_of": None,
+        "temperature": 0.0,  # No temperature fallback re-decodes
+        "condition_on_previous_text": False,
+        "word_timestamps": False,
+        "initial_prompt": True,  # Prime with gaming vocabulary and member names
+        "fast_path": True,  # Allow the short-utterance encoder
+    },
+    "balanced": {
+        "beam_size": None,
+        "best_of": None,
+        "temperature": (0.0, 0.4),  # One fallback retry for garbled clips
+        "condition_on_previous_text": False,
+        "word_timestamps": False,
+        "initial_prompt": True,
+        "fast_path": True,
+    },
+    "accurate": {
+        "beam_size": 5,
+        "best_of": 5,
+        "temperature": (0.0, 0.2, 0.4, 0.6, 0.8, 1.0),
+        "condition_on_previous_text": True,
+        "word_timestamps": True,
+        "initial_prompt": True,
+        "fast_path": False,
+    },
+}
+PROMPT_MAX_NAMES = 15  # Member names included in the vocabulary prompt
+PROMPT_MAX_CHARS = 600  # Keeps the prompt well inside Whisper's 224 prompt tokens
+
+# Transcript correction against the gaming vocabulary and guild member names
+CORRECTION_MIN_LENGTH = 5  # Shorter words are only corrected on an exact match
+CORRECTION_MAX_ERROR = 0.34  # Spelling edits per character allowed for a phonetic match on a gaming term
+CORRECTION_NAME_MAX_ERROR = 0.5  # Same for member names, which Whisper mangles more freely
+CORRECTION_NAME_CACHE_SIZE = 64  # Guild member-name indexes kept built
+
+# Incremental transcription - each speaker's clips decoded as overlapping windows (standalone mode only)
+INCREMENTAL_TRANSCRIPTION = False  # Inference workers see clips out of order, so they always decode clip by clip
+RECORDING_CHUNK_SECONDS = 10  # How often recordings are cut into clips
+INCREMENTAL_CHUNK_SECONDS = 4  # Shorter cuts when incremental - the overlap stitches the boundaries
+STREAM_OVERLAP_SECONDS = 1.5  # Audio carried into the next window as context across the cut
+STREAM_HOLDBACK_SECONDS = 1.0  # Words ending this close to a window's end wait for the next window
+STREAM_MAX_TAIL_SECONDS = 8  # Longest audio tail carried between windows
+STREAM_CONTEXT_CHARS = 200  # Recent text carried into the next window's prompt
+STREAM_IDLE_SECONDS = 12  # Held words are flushed once a speaker has been quiet this long
+
+SHORT_UTTERANCE_FAST_PATH = True  # Encode short clips without padding them to 30 seconds
+SHORT_UTTERANCE_MAX_SECONDS = 8  # Longer clips use the regular padded transcribe
+SHORT_UTTERANCE_PAD_SECONDS = 0.5  # Trailing silence added before encoding a short clip
+
+# Model startup configuration
+MODEL_WARMUP = True  # Run synthetic audio and text through the models before reporting them ready
+MODEL_WARMUP_PASSES = 2  # Passes per path - the second settles allocator growth from the first
+MODEL_OPTIMIZATION = os.getenv("JUSTFF_MODEL_OPTIMIZATION") or None  # None, "compile" or "torchscript"
+TORCH_INTRA_OP_THREADS = int(os.getenv("JUSTFF_TORCH_THREADS", "0"))  # 0 keeps torch's default of one per core
+TORCH_INTER_OP_THREADS = 1  # We never run independent ops in parallel inside one inference call
+
+# CPU budget - how the inference engines share the cores between concurrent guilds
+CPU_BUDGET_ENABLED = True
+CPU_CORES = int(os.getenv("JUSTFF_CPU_CORES", "0"))  # 0 uses every core this process may run on
+CPU_AFFINITY = False  # Pin each engine's threads to its own cores (Linux only)
+CPU_BUDGET = {
+    # share of the cores, and torch threads per inference call (cores / threads = concurrent calls)
+    "whisper": {"share": 0.75, "threads_per_call": 4},
+    "sentiment": {"share": 0.25, "threads_per_call": 1},
+}
 
 # LLM configuration
 SENTIMENT_MODEL = "distilbert/distilbert-base-uncased-finetuned-sst-2-english"
+SENTIMENT_MODES = ["transformer", "keyword"]  # Adaptive tiering options, most accurate first
+
+# Per-user language detection and routing
+LANGUAGE_DETECTION = True  # Detect each speaker's language instead of decoding everyone as English
+DEFAULT_LANGUAGE = "en"  # Until a speaker's language is known, and with English-only Whisper models
+LANGUAGE_DETECT_SEGMENTS = 3  # Clips a new speaker's language is averaged over before it's trusted
+LANGUAGE_DETECT_MAX_SEGMENTS = 8  # Settle on the leading language after this many, however unsure
+LANGUAGE_MIN_CONFIDENCE = 0.6  # Averaged probability the leading language needs to settle early
+LANGUAGE_RECHECK_CLIPS = 50  # Detect again after this many clips in the cached language...
+LANGUAGE_RECHECK_SECONDS = 1800  # ...or this long, in case the speaker switched
+LANGUAGE_CACHE_SIZE = 10000  # Speakers remembered per process, least recently heard evicted first
+SENTIMENT_MODELS = {"en": SENTIMENT_MODEL}  # Sentiment model per language
+MULTILINGUAL_SENTIMENT_MODEL = "cardiffnlp/twitter-xlm-roberta-base-sentiment"  # Languages not listed above, loaded on first use
+KEYWORD_LANGUAGES = ("en",)  # Languages the keyword packs and gaming-term corrections are written in
+
+# Adaptive tiering configuration
+ADAPTIVE_TIERING = True  # Drop to faster models when processing falls behind
+TARGET_LATENCY_SECONDS = 8.0  # Target time from a segment being queued to its tilt update
+TIER_LATENCY_SMOOTHING = 0.3  # Weight of the newest latency sample in the moving average
+TIER_UPGRADE_HEADROOM = 0.5  # Step back up once expected latency is below this fraction of the target
+TIER_MIN_DWELL_SECONDS = 15  # Minimum time between tier switches
 
 # Tilt configuration
 TILT_DECAY_RATE = 5  # Points per minute that tilt score decreases
 MAX_SAMPLES = 10  # Maximum number of voice samples to store per user
 DEFAULT_TILT_SCORE = 50  # Default starting tilt score
+TILT_HISTORY_LEVELS = [  # (name, bucket seconds, buckets kept) - fixed memory per user whatever the activity
+    ("second", 1, 60),  # Last minute
+    ("minute", 60, 60),  # Last hour
+    ("hour", 3600, 48),  # Last two days
+]
+RENDER_CACHE_TTL = 10  # Seconds a rendered !tilt/!tilts reply is reused while the guild's scores are unchanged
+RENDER_CACHE_SIZE = 1024  # Rendered replies kept across all guilds
+
+# Tilt alert configuration
+TILT_ALERT_THRESHOLD = 90  # Score at which a tilt alert is sent
+ALERT_USER_COOLDOWN = 120  # Seconds before the same user can trigger another alert
+ALERT_COALESCE_WINDOW = 3  # Seconds to collect alerts in a channel before sending one message
+ALERT_RATE = 0.2  # Alert messages per second allowed across all channels
+ALERT_BURST = 3  # Alert messages that can be sent back to back
+ALERT_MAX_DELAY = 30  # Seconds an alert can wait for the rate limiter before it is dropped
+
+# Deployment configuration
+DEPLOYMENT_MODE = os.getenv("JUSTFF_MODE", "standalone")  # Options: "standalone", "gateway", "worker"
+BUS_BACKEND = os.getenv("JUSTFF_BUS", "inprocess")  # Options: "inprocess", "redis"
+BUS_URL = os.getenv("JUSTFF_BUS_URL", "redis://localhost:6379/0")
+BUS_PREFIX = "justff:"  # Key prefix for bus topics
+JOBS_TOPIC = "jobs"  # Gateway -> inference workers
+RESULTS_TOPIC = "results"  # Inference workers -> gateway
+INFERENCE_WORKERS = int(os.getenv("JUSTFF_WORKERS", "1"))  # Worker threads (in-process bus) or forked processes (worker mode)
+WORKER_MEMORY_REPORT_SECONDS = 300  # How often a worker pool logs per-worker memory
+
+# Shared tilt state configuration
+STATE_BACKEND = os.getenv("JUSTFF_STATE", "memory")  # Options: "memory", "service"
+STATE_SERVICE_ADDRESS = (os.getenv("JUSTFF_STATE_HOST", "127.0.0.1"), int(os.getenv("JUSTFF_STATE_PORT", "50555")))
+STATE_SERVICE_AUTHKEY = os.getenv("JUSTFF_STATE_AUTHKEY", "justff").encode()
+
+# Sharding configuration
+SHARD_COUNT = int(os.getenv("JUSTFF_SHARDS", "0"))  # 0 = unsharded single bot
+SHARD_PROCESSES = int(os.getenv("JUSTFF_SHARD_PROCESSES", "1"))  # Processes to spread shards across
+
+# Profiling configuration (!profile and SIGUSR1)
+PROFILE_MAX_SECONDS = 300  # Longest profile the command will run
+PROFILE_SIGNAL_SECONDS = 30  # How long SIGUSR1 profiles for
+PROFILE_SAMPLE_INTERVAL = 0.005  # Seconds between stack samples
+PROFILE_TOP_N = 15  # Entries per section of the summary
+PROFILE_TRACEMALLOC_FRAMES = 10  # Stack depth tracemalloc records per allocation
+PROFILE_OUTPUT_DIR = os.getenv("JUSTFF_PROFILE_DIR", "profiles")
 
 # Set up logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
 logger = logging.getLogger('JustFF')
 
 # Global state
-user_tilt_scores = defaultdict(lambda: {"score": DEFAULT_TILT_SCORE, "last_updated": time.time(), "samples": [], "triggers": []})
+def new_tilt_entry(score=DEFAULT_TILT_SCORE):
+    """Create a fresh tilt record for a user"""
+    return {"score": score, "last_updated": time.time(), "samples": [], "triggers": []}
+
 voice_clients = {}  # Store voice clients for each guild
 processing_queues = {}  # Audio processing queues
 
@@ -125,9 +265,45 @@ POSITIVE_KEYWORDS = {
     r'\bhave\s+fun\b': 2,  # have fun
 }
 
+# Keyword packs - game-specific keywords on top of the ones above, chosen per guild with !packs
+KEYWORD_PACK_DIR = os.getenv("JUSTFF_KEYWORD_PACKS", os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "keyword_packs"))
+KEYWORD_PACK_POLL_SECONDS = 5  # How often pack files (and guild settings) are checked for changes
+DEFAULT_KEYWORD_PACKS = []  # Packs for guilds that haven't picked any
+GUILD_SETTINGS_PATH = os.getenv("JUSTFF_GUILD_SETTINGS", "guild_settings.json")
+SENSITIVITY_LEVELS = {"low": 0.5, "medium": 1.0, "high": 1.5}
+
+# Data export - !export and python -m utils.export
+TRANSCRIPT_LOG_DIR = os.getenv("JUSTFF_TRANSCRIPT_DIR")  # Log analyzed transcripts and messages here for exports (off when unset)
+EXPORT_DIR = os.getenv("JUSTFF_EXPORT_DIR", "exports")
+EXPORT_FORMAT = "jsonl"  # "jsonl" (gzipped) or "parquet" (needs pyarrow)
+EXPORT_CHUNK_ROWS = 5000  # Rows read from the state and written per chunk
+
 # Voice indicators of tilt
 VOICE_TILT_INDICATORS = {
     'amplitude': {'threshold': 0.7, 'score': 5},  # Loud volume
     'speaking_rate': {'threshold': 3.5, 'score': 3},  # Fast speaking
     'interruptions': {'threshold': 2, 'score': 4},  # Interrupting others
-}
\ No newline at end of file
+}
+
+# Streaming acoustic feature configuration
+PROSODY_ENABLED = True  # Score loudness, speaking rate and interruptions alongside transcripts
+PROSODY_SAMPLE_RATE = 16000  # Clips are resampled to this before feature extraction
+PROSODY_FRAME_MS = 20  # Frame length for the streaming extractor
+VOICE_ACTIVITY_RATIO = 3.0  # Frame energy must be this many times the noise floor to count as speech
+PROSODY_MIN_ENERGY = 0.01  # Absolute RMS floor for speech, so silence never counts
+LOUD_MIN_SECONDS = 0.2  # Loud speech must last this long to count as shouting
+SPEECH_HANGOVER_SECONDS = 0.25  # Gaps shorter than this don't split a speech interval
+MIN_SPEECH_SECONDS = 0.2  # Ignore voiced blips shorter than this
+INTERRUPTION_WINDOW_SECONDS = 60  # Interruptions are counted over this window
+PITCH_MIN_HZ = 75  # Pitch search range for the autocorrelation tracker
+PITCH_MAX_HZ = 500
+PITCH_MIN_CORRELATION = 0.3  # Frames less periodic than this get no pitch estimate
+
+# Degraded (ASR-free) mode configuration
+DEGRADED_MODE_ENABLED = True  # Score voice from acoustics only when transcription can't keep up
+DEGRADED_ENTER_LAG_SECONDS = 30  # Switch to acoustic-only once segments wait this long
+DEGRADED_EXIT_LAG_SECONDS = 5  # Switch back once the queue is empty and lag is below this
+DEGRADED_PITCH_STD_SEMITONES = 4.0  # Pitch movement above this reads as agitated
+DEGRADED_PITCH_SCORE = 4
+SHOUT_PITCH_HZ = 250  # Loud speech with a raised mean pitch reads as shouting
+DEGRADED_SHOUT_SCORE = 5
\ No newline at end of file
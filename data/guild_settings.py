@@ -0,0 +1,80 @@
+import copy
+import json
+import os
+import threading
+import time
+from config import GUILD_SETTINGS_PATH, DEFAULT_KEYWORD_PACKS, KEYWORD_PACK_POLL_SECONDS, logger
+
+def default_guild_settings():
+    return {"keyword_packs": list(DEFAULT_KEYWORD_PACKS), "sensitivity": 1.0}
+
+class GuildSettingsStore:
+    """Per-guild settings persisted to a JSON file
+
+    Re-reads the file when it changes on disk (at most once per poll interval),
+    so shard and worker processes pick up changes made by another process.
+    """
+    def __init__(self, path=GUILD_SETTINGS_PATH, poll_seconds=KEYWORD_PACK_POLL_SECONDS):
+        self.path = path
+        self.poll_seconds = poll_seconds
+        self.lock = threading.Lock()
+        self.settings = {}
+        self.mtime = None
+        self.last_check = 0
+        self._reload()
+
+    def _reload(self):
+        try:
+            mtime = os.stat(self.path).st_mtime_ns
+        except OSError:
+            return  # Nothing saved yet
+        if mtime == self.mtime:
+            return
+        try:
+            with open(self.path) as f:
+                self.settings = {int(guild_id): settings for guild_id, settings in json.load(f).items()}
+            self.mtime = mtime
+        except (OSError, ValueError) as e:
+            logger.error(f"Could not read guild settings from {self.path}: {e}")
+
+    def get(self, guild_id):
+        """Settings for a guild, with defaults for anything it hasn't set"""
+        now = time.monotonic()
+        with self.lock:
+            if now - self.last_check >= self.poll_seconds:
+                self.last_check = now
+                self._reload()
+            return self._merged(guild_id)
+
+    def update(self, guild_id, **changes):
+        """Change some of a guild's settings and save them"""
+        with self.lock:
+            self._reload()
+            self.settings.setdefault(guild_id, {}).update(changes)
+            temp_path = f"{self.path}.{os.getpid()}.tmp"
+            with open(temp_path, "w") as f:
+                json.dump({str(key): value for key, value in self.settings.items()}, f, indent=2)
+            os.replace(temp_path, self.path)  # Readers never see a half-written file
+            self.mtime = os.stat(self.path).st_mtime_ns
+            return self._merged(guild_id)
+
+    def _merged(self, guild_id):
+        settings = default_guild_settings()
+        settings.update(copy.deepcopy(self.settings.get(guild_id, {})))
+        return settings
+
+guild_settings = None
+
+def get_guild_settings(guild_id):
+    """Get a guild's settings from the process-wide store"""
+    global guild_settings
+    if guild_settings is None:
+        guild_settings = GuildSettingsStore()
+    return guild_settings.get(guild_id)
+
+def update_guild_settings(guild_id, **changes):
+    """Change a guild's settings in the process-wide store"""
+    global guild_settings
+    if guild_settings is None:
+        guild_settings = GuildSettingsStore()
+    return guild_settings.update(guild_id, **changes)
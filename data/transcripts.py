@@ -0,0 +1,76 @@
+import glob
+import json
+import os
+import queue
+import threading
+import time
+from config import TRANSCRIPT_LOG_DIR, logger
+
+class TranscriptLog:
+    """Append-only JSONL log of analyzed transcripts and chat messages with the score change each produced
+
+    Records go through a queue to a writer thread, so logging from the event
+    loop never waits on disk. Each process writes its own file per day, so
+    shard processes never interleave lines.
+    """
+    def __init__(self, log_dir=TRANSCRIPT_LOG_DIR):
+        self.log_dir = log_dir
+        self.records = queue.Queue()
+        self.writer = threading.Thread(target=self._write, name="justff-transcripts", daemon=True)
+        self.writer.start()
+
+    def record(self, guild_id, user_id, source, text, score_change, timestamp=None):
+        self.records.put({
+            "guild_id": guild_id,
+            "user_id": user_id,
+            "timestamp": time.time() if timestamp is None else timestamp,
+            "source": source,
+            "text": text,
+            "score_change": float(score_change),
+        })
+
+    def _path(self, timestamp):
+        return os.path.join(self.log_dir, f"transcripts-{time.strftime('%Y%m%d', time.gmtime(timestamp))}-{os.getpid()}.jsonl")
+
+    def _write(self):
+        os.makedirs(self.log_dir, exist_ok=True)
+        path, f = None, None
+        while True:
+            record = self.records.get()
+            try:
+                if self._path(record["timestamp"]) != path:
+                    if f is not None:
+                        f.close()
+                    path = self._path(record["timestamp"])
+                    f = open(path, "a")
+                f.write(json.dumps(record) + "\n")
+                if self.records.empty():
+                    f.flush()  # Batch writes while busy, but don't sit on lines when idle
+            except Exception as e:
+                logger.error(f"Could not write transcript log: {e}")
+
+def iter_transcripts(log_dir=TRANSCRIPT_LOG_DIR, guild_id=None):
+    """Logged records, file by file in name order, one line in memory at a time"""
+    for path in sorted(glob.glob(os.path.join(log_dir, "transcripts-*.jsonl"))):
+        with open(path) as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    continue  # Partial last line from a process that was killed mid-write
+                if guild_id is None or record["guild_id"] == guild_id:
+                    yield record
+
+transcript_log = None
+transcript_log_lock = threading.Lock()  # Audio threads log too; two logs would mean two writers on one file
+
+def record_transcript(guild_id, user_id, source, text, score_change):
+    """Log an analyzed transcript or message if TRANSCRIPT_LOG_DIR is set"""
+    global transcript_log
+    if not TRANSCRIPT_LOG_DIR:
+        return
+    if transcript_log is None:
+        with transcript_log_lock:
+            if transcript_log is None:
+                transcript_log = TranscriptLog()
+    transcript_log.record(guild_id, user_id, source, text, score_change)
@@ -1,16 +1,128 @@
-import os
-from bot import setup_bot
-from config import DISCORD_TOKEN, logger
+import argparse
+import multiprocessing
+import threading
+from config import (DISCORD_TOKEN, DEPLOYMENT_MODE, BUS_BACKEND, INFERENCE_WORKERS,
+                    SHARD_COUNT, SHARD_PROCESSES, logger)
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="JustFF Discord bot")
+    parser.add_argument("--mode", choices=["standalone", "gateway", "worker", "state"], default=DEPLOYMENT_MODE,
+                        help="standalone runs everything in one process, gateway/worker split the bot from inference, "
+                             "state runs the shared tilt state service")
+    parser.add_argument("--bus", choices=["inprocess", "redis"], default=BUS_BACKEND,
+                        help="Message bus used between the gateway and inference workers")
+    parser.add_argument("--workers", type=int, default=INFERENCE_WORKERS,
+                        help="Inference worker threads alongside an in-process gateway, or forked worker processes in worker mode")
+    parser.add_argument("--shards", type=int, default=SHARD_COUNT,
+                        help="Total number of Discord shards (0 runs a single unsharded bot)")
+    parser.add_argument("--shard-processes", type=int, default=SHARD_PROCESSES,
+                        help="Number of bot processes to spread the shards across")
+    return parser.parse_args()
+
+def run_worker(bus_backend, workers=1):
+    """Run stateless inference workers that consume jobs from the bus"""
+    from utils.bus import create_bus
+    from utils.speech import load_models
+    from utils.worker import run_inference_worker, run_worker_pool
+
+    if workers > 1:
+        # Preload once, then fork so every worker shares the same weights
+        load_models(preload_in_background=False, warmup=False)
+        logger.info(f"Starting JustFF inference worker pool ({workers} processes)...")
+        run_worker_pool(bus_backend, workers)
+        return
+
+    load_models()
+    logger.info("Starting JustFF inference worker...")
+    run_inference_worker(create_bus(bus_backend))
+
+def run_state_service():
+    """Run the shared tilt state service in the foreground"""
+    import utils.tilt  # The service applies tilt functions sent by the shards
+    from utils.tilt_state import TiltStateManager
+    from config import STATE_SERVICE_ADDRESS, STATE_SERVICE_AUTHKEY
+
+    manager = TiltStateManager(address=STATE_SERVICE_ADDRESS, authkey=STATE_SERVICE_AUTHKEY)
+    logger.info(f"Starting JustFF tilt state service on {STATE_SERVICE_ADDRESS}...")
+    manager.get_server().serve_forever()
+
+def run_shard_process(mode, bus_backend, workers, shard_ids, shard_count):
+    """Run one bot process for a slice of shards against the shared tilt state"""
+    from utils.tilt import set_tilt_state
+    from utils.tilt_state import connect_tilt_state
+
+    set_tilt_state(connect_tilt_state())
+    run_bot(mode, bus_backend, workers, shard_ids, shard_count)
+
+def run_sharded(mode, bus_backend, workers, shard_count, processes):
+    """Start the shared tilt state service and spread shards across bot processes"""
+    import utils.tilt  # The service applies tilt functions sent by the shards
+    from utils.tilt_state import start_tilt_state_service
+
+    manager = start_tilt_state_service()
+
+    processes = max(1, min(processes, shard_count))
+    shard_processes = []
+    for index in range(processes):
+        shard_ids = list(range(index, shard_count, processes))
+        logger.info(f"Starting bot process {index} for shards {shard_ids}")
+        process = multiprocessing.Process(
+            target=run_shard_process,
+            args=(mode, bus_backend, workers, shard_ids, shard_count),
+            name=f"justff-shards-{index}"
+        )
+        process.start()
+        shard_processes.append(process)
+
+    try:
+        for process in shard_processes:
+            process.join()
+    finally:
+        manager.shutdown()
+
+def run_bot(mode, bus_backend, workers, shard_ids=None, shard_count=None):
+    """Run the Discord bot, optionally as a gateway that hands inference to workers"""
+    from bot.client import setup_bot
+    from utils.speech import load_models, load_models_in_background
+
+    bus = None
+    if mode == "gateway":
+        from utils.bus import create_bus
+        bus = create_bus(bus_backend)
+
+        # An in-process bus can only be served by workers in this process
+        if bus_backend == "inprocess":
+            from utils.worker import run_inference_worker
+            load_models()
+            for worker_id in range(workers):
+                threading.Thread(target=run_inference_worker, args=(bus, worker_id), daemon=True).start()
+    else:
+        # Voice falls back to acoustic-only scoring until Whisper finishes loading
+        load_models_in_background()
+
+    bot = setup_bot(bus, shard_ids, shard_count)
+    logger.info(f"Starting JustFF bot ({mode} mode)...")
+    bot.run(DISCORD_TOKEN)
 
 def main():
     """Main entry point for the Discord bot"""
-    bot = setup_bot()
-    
+    args = parse_args()
+
+    # kill -USR1 <pid> profiles any process for a while without restarting it
+    from utils.profiling import install_profile_signal_handler
+    install_profile_signal_handler()
+
     try:
-        logger.info("Starting JustFF bot...")
-        bot.run(DISCORD_TOKEN)
+        if args.mode == "worker":
+            run_worker(args.bus, args.workers)
+        elif args.mode == "state":
+            run_state_service()
+        elif args.shards:
+            run_sharded(args.mode, args.bus, args.workers, args.shards, args.shard_processes)
+        else:
+            run_bot(args.mode, args.bus, args.workers)
     except Exception as e:
         logger.error(f"Error starting bot: {e}")
-        
+
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
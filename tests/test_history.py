@@ -0,0 +1,57 @@
+"""Tilt history buckets and the decay filled in between updates"""
+import math
+import numpy as np
+from utils.history import RingSeries, TiltHistory, decayed_score
+
+BASE_TIME = 1_699_999_980  # On a minute boundary
+
+def same_series(a, b):
+    return len(a) == len(b) and all(x == y or (math.isnan(x) and math.isnan(y)) for x, y in zip(a, b))
+
+def test_gap_decays_from_last_score_not_bucket_peak():
+    """A spike calmed within one bucket decays from where it was calmed to"""
+    series = RingSeries(60, 10)
+    series.add(BASE_TIME, 90)
+    series.add(BASE_TIME + 5, 40)
+    series.add(BASE_TIME + 300, 40)
+
+    values = series.series(BASE_TIME + 300)
+    assert values[-6] == 90  # The head bucket still shows its peak
+    assert values[-5:-1] == [40] * 4
+    assert series.value_at(BASE_TIME + 600, 0) == 40
+
+def test_gap_decay_after_drop_to_above_neutral():
+    series = RingSeries(60, 10)
+    series.add(BASE_TIME, 95)
+    series.add(BASE_TIME + 30, 70)
+
+    assert series.series(BASE_TIME + 120)[-2:] == [decayed_score(70, 60), decayed_score(70, 120)]
+    assert series.value_at(BASE_TIME + 120, 0) == decayed_score(70, 120)
+
+def test_change_after_calmed_spike():
+    history = TiltHistory([("minute", 60, 60)])
+    history.add(BASE_TIME, 90)
+    history.add(BASE_TIME + 10, 40)
+    # The minute after the spike is 40, not 90 decayed by a minute
+    assert history.change(BASE_TIME + 180, 60) == 0
+
+def test_add_many_keeps_last_score_of_run():
+    times = np.array([BASE_TIME, BASE_TIME + 1, BASE_TIME + 2], dtype=np.float64)
+    peaks = np.array([80, 95, 60], dtype=np.float64)
+    lasts = np.array([80, 95, 45], dtype=np.float64)
+    batch, single = TiltHistory([("minute", 60, 10)]), TiltHistory([("minute", 60, 10)])
+    batch.add_many(times, peaks, lasts)
+    for time, peak, last in zip(times.tolist(), peaks.tolist(), lasts.tolist()):
+        single.add(time, peak)
+        single.add(time, last)
+    assert same_series(batch.series("minute", BASE_TIME + 300), single.series("minute", BASE_TIME + 300))
+    assert batch.levels["minute"].last == 45
+
+def test_round_trip_keeps_last_score():
+    history = TiltHistory([("minute", 60, 10)])
+    history.add(BASE_TIME, 90)
+    history.add(BASE_TIME + 5, 40)
+    restored = TiltHistory.from_dict(history.to_dict())
+    assert restored.levels["minute"].last == 40
+    values = restored.series("minute", BASE_TIME + 180)
+    assert values[-4:] == [90, 40, 40, 40] and math.isnan(values[0])
@@ -0,0 +1,84 @@
+"""apply_tilt_updates must leave the same records as apply_tilt_update run per event in time order"""
+import copy
+import math
+from hypothesis import given, settings, strategies as st
+from config import new_tilt_entry
+from utils.tilt import apply_tilt_update, apply_tilt_updates
+
+BASE_TIME = 1_700_000_000
+# Each side of the raw-change scaling steps (5, 10, 15) and of zero
+CHANGES = [-40, -15.01, -15, -10, -5, -0.5, 0, 0.5, 4.99, 5, 5.01, 9.99, 10, 10.01, 14.99, 15, 15.01, 40]
+# Each side of the current-score multiplier steps (60, 70, 80), the decay floor (50) and the clamps (0, 100)
+SCORES = [0, 1, 49.99, 50, 50.01, 59.99, 60, 65, 69.99, 70, 79.99, 80, 95, 99.99, 100]
+TRIGGERS = [None, "", "why does nobody rotate", "gg ez", "x" * 80]
+
+changes = st.one_of(st.sampled_from(CHANGES), st.floats(-30, 30, allow_nan=False))
+# Repeated timestamps, and times before a record's last update, happen in real batches
+timestamps = st.one_of(st.sampled_from([BASE_TIME, BASE_TIME + 0.5, BASE_TIME + 60]),
+                       st.floats(BASE_TIME - 120, BASE_TIME + 7200, allow_nan=False))
+
+@st.composite
+def tilt_entries(draw, users):
+    """A record per user: fresh, or with a score, trigger list (some longer than the 10 kept) and history"""
+    entries = {}
+    for user_id in range(users):
+        entry = new_tilt_entry(draw(st.sampled_from(SCORES)))
+        entry["last_updated"] = BASE_TIME - draw(st.sampled_from([0, 1, 30, 600, 7200]))
+        entry["triggers"] = [f"old {i}" for i in range(draw(st.integers(0, 12)))]
+        for change in draw(st.lists(st.sampled_from(CHANGES), max_size=3)):
+            apply_tilt_update(entry, change, None, entry["last_updated"] + draw(st.floats(-120, 300)))
+        entries[user_id] = entry
+    return entries
+
+@st.composite
+def batches(draw):
+    users = draw(st.integers(1, 6))
+    entries = draw(tilt_entries(users))
+    # Up to 60 events over a handful of users, so users repeat and trigger lists overflow
+    events = draw(st.lists(st.tuples(st.integers(0, users - 1), changes, st.sampled_from(TRIGGERS), timestamps),
+                           min_size=1, max_size=60))
+    return entries, events
+
+def apply_sequentially(entries, events):
+    """The reference: one apply_tilt_update per event in timestamp order, ties in list order"""
+    for user_id, change, trigger, timestamp in sorted(events, key=lambda event: event[3]):
+        apply_tilt_update(entries[user_id], change, trigger, timestamp)
+
+def same_value(a, b):
+    return a == b or (isinstance(a, float) and isinstance(b, float) and math.isnan(a) and math.isnan(b))
+
+def assert_same_records(expected, actual):
+    assert expected.keys() == actual.keys()
+    for user_id, want in expected.items():
+        got = actual[user_id]
+        assert same_value(got["score"], want["score"]), f"user {user_id} score"
+        assert got["last_updated"] == want["last_updated"], f"user {user_id} last_updated"
+        assert got["triggers"] == want["triggers"], f"user {user_id} triggers"
+        assert ("history" in got) == ("history" in want), f"user {user_id} history"
+        if "history" in want:
+            for level, series in want["history"].levels.items():
+                other = got["history"].levels[level]
+                assert other.head == series.head, f"user {user_id} {level} history head"
+                assert same_value(other.last, series.last), f"user {user_id} {level} history last score"
+                assert all(map(same_value, other.values, series.values)), f"user {user_id} {level} history"
+
+@settings(max_examples=300, deadline=None)
+@given(batches())
+def test_batch_matches_per_event_updates(batch):
+    entries, events = batch
+    expected, actual = copy.deepcopy(entries), copy.deepcopy(entries)
+    apply_sequentially(expected, events)
+    apply_tilt_updates(actual, events)
+    assert_same_records(expected, actual)
+
+@settings(deadline=None)
+@given(st.sampled_from(SCORES), st.lists(st.tuples(changes, timestamps), min_size=12, max_size=40))
+def test_one_user_many_events(score, user_events):
+    """One user with more events than the trigger window keeps, all applied in one batch"""
+    entry = new_tilt_entry(score)
+    entry["last_updated"] = BASE_TIME
+    events = [(0, change, f"event {index}", timestamp) for index, (change, timestamp) in enumerate(user_events)]
+    expected, actual = {0: copy.deepcopy(entry)}, {0: copy.deepcopy(entry)}
+    apply_sequentially(expected, events)
+    apply_tilt_updates(actual, events)
+    assert_same_records(expected, actual)
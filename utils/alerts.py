@@ -0,0 +1,133 @@
+import asyncio
+import time
+from config import (TILT_ALERT_THRESHOLD, ALERT_USER_COOLDOWN, ALERT_COALESCE_WINDOW,
+                    ALERT_RATE, ALERT_BURST, ALERT_MAX_DELAY, logger)
+
+class TokenBucket:
+    """Token bucket limiting how often we send messages"""
+    def __init__(self, rate, capacity):
+        self.rate = rate  # Tokens added per second
+        self.capacity = capacity
+        self.tokens = capacity
+        self.last_refill = time.monotonic()
+
+    def _refill(self, now):
+        elapsed = now - self.last_refill
+        self.tokens = min(self.capacity, self.tokens + elapsed * self.rate)
+        self.last_refill = now
+
+    def try_acquire(self, now=None):
+        """Take a token if one is available"""
+        now = time.monotonic() if now is None else now
+        self._refill(now)
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return True
+        return False
+
+    def time_until_available(self, now=None):
+        """Seconds until the next token is available"""
+        now = time.monotonic() if now is None else now
+        self._refill(now)
+        if self.tokens >= 1:
+            return 0
+        return (1 - self.tokens) / self.rate
+
+class AlertDispatcher:
+    """Coalesces tilt alerts per channel and rate limits how many we send"""
+    def __init__(self, threshold=TILT_ALERT_THRESHOLD, user_cooldown=ALERT_USER_COOLDOWN,
+                 coalesce_window=ALERT_COALESCE_WINDOW, rate=ALERT_RATE, burst=ALERT_BURST,
+                 max_delay=ALERT_MAX_DELAY):
+        self.threshold = threshold
+        self.user_cooldown = user_cooldown
+        self.coalesce_window = coalesce_window
+        self.max_delay = max_delay
+        self.bucket = TokenBucket(rate, burst)
+        self.last_alerted = {}  # (guild_id, user_id) -> time of last alert
+        self.pending = {}  # channel_id -> {user_id: (member, score)}
+        self.flush_tasks = {}  # channel_id -> scheduled flush task
+        self.stats = {
+            "submitted": 0,
+            "sent_messages": 0,
+            "sent_alerts": 0,
+            "coalesced": 0,
+            "suppressed_cooldown": 0,
+            "suppressed_rate_limit": 0,
+        }
+
+    def submit(self, channel, member, score):
+        """Queue an alert for a member if their score is high enough - returns True if queued"""
+        if score < self.threshold:
+            return False
+
+        self.stats["submitted"] += 1
+        now = time.monotonic()
+        key = (member.guild.id, member.id)
+
+        # Per-user cooldown so one angry player doesn't trigger an alert per message
+        self._prune_cooldowns(now)
+        last = self.last_alerted.get(key)
+        if last is not None and now - last < self.user_cooldown:
+            self.stats["suppressed_cooldown"] += 1
+            return False
+
+        self.last_alerted.pop(key, None)  # Re-insert so the map stays ordered by alert time
+        self.last_alerted[key] = now
+        channel_pending = self.pending.setdefault(channel.id, {})
+        if channel_pending:
+            self.stats["coalesced"] += 1
+        channel_pending[member.id] = (member, score)
+
+        # One flush per channel window - later alerts join the same message
+        if channel.id not in self.flush_tasks:
+            self.flush_tasks[channel.id] = asyncio.create_task(self._flush(channel))
+        return True
+
+    def _prune_cooldowns(self, now):
+        """Forget users whose cooldown has run out, so the map only holds recent alerts"""
+        # Insertion order is alert order (keys are re-inserted on each alert), so stop at the first live one
+        for key, last in list(self.last_alerted.items()):
+            if now - last < self.user_cooldown:
+                break
+            del self.last_alerted[key]
+
+    async def _flush(self, channel):
+        """Wait for the coalesce window, then send one message for all pending users"""
+        try:
+            await asyncio.sleep(self.coalesce_window)
+
+            # Wait for a send token, but give up on stale alerts rather than queue forever
+            waited = 0
+            while not self.bucket.try_acquire():
+                delay = self.bucket.time_until_available()
+                if waited + delay > self.max_delay:
+                    dropped = self.pending.pop(channel.id, {})
+                    self.stats["suppressed_rate_limit"] += len(dropped)
+                    logger.info(f"Dropped {len(dropped)} tilt alerts for channel {channel.id} (rate limited)")
+                    return
+                await asyncio.sleep(delay)
+                waited += delay
+
+            batch = self.pending.pop(channel.id, {})
+            if not batch:
+                return
+
+            await channel.send(self.format_alert(batch.values()))
+            self.stats["sent_messages"] += 1
+            self.stats["sent_alerts"] += len(batch)
+        except Exception as e:
+            logger.error(f"Error sending tilt alert: {e}")
+        finally:
+            self.flush_tasks.pop(channel.id, None)
+
+    def format_alert(self, entries):
+        """Build the alert text for one or more members"""
+        entries = sorted(entries, key=lambda entry: entry[1], reverse=True)
+        if len(entries) == 1:
+            member, score = entries[0]
+            return f"⚠️ **Tilt Alert**: {member.mention} is reaching critical tilt levels! ({round(score, 1)}/100)"
+
+        lines = [f"⚠️ **Tilt Alert**: {len(entries)} players are reaching critical tilt levels!"]
+        for member, score in entries:
+            lines.append(f"• {member.mention} ({round(score, 1)}/100)")
+        return "\n".join(lines)
@@ -1,6 +1,7 @@
 import os
+import numpy as np
 from pydub import AudioSegment
-from config import logger
+from config import PROSODY_SAMPLE_RATE, logger
 
 def preprocess_audio(input_path, output_path):
     """Improve audio quality before transcription"""
@@ -21,23 +22,24 @@ def preprocess_audio(input_path, output_path):
         logger.error(f"Error preprocessing audio: {e}")
         return input_path  # Return original if processing fails
 
+def load_pcm(audio_file, sample_rate=PROSODY_SAMPLE_RATE):
+    """Decode an audio file to mono float samples in [-1, 1]"""
+    audio = AudioSegment.from_file(audio_file).set_channels(1).set_frame_rate(sample_rate)
+    samples = np.array(audio.get_array_of_samples(), dtype=np.float32)
+    return samples / float(1 << (8 * audio.sample_width - 1))
+
+def extract_audio_features(audio_file, noise_floor=None, track_pitch=False):
+    """Run the streaming prosody extractor over an audio file"""
+    from utils.prosody import extract_clip_features
+    return extract_clip_features(load_pcm(audio_file), PROSODY_SAMPLE_RATE, noise_floor, track_pitch)
+
 def analyze_audio_characteristics(audio_file):
     """Analyze audio characteristics for signs of tilt"""
+    from utils.prosody import score_clip_features
     try:
-        # Load audio with pydub
-        audio = AudioSegment.from_file(audio_file)
-        
-        # Analyze volume (dBFS is pydub's measure of volume)
-        volume_score = 0
-        if abs(audio.dBFS) < 20:  # Loud audio has values closer to 0
-            volume_score = 3
-        elif abs(audio.dBFS) < 30:
-            volume_score = 2
-        elif abs(audio.dBFS) < 40:
-            volume_score = 1
-        
-        return volume_score
+        score, _ = score_clip_features(extract_audio_features(audio_file))
+        return score
     
     except Exception as e:
         logger.error(f"Error analyzing audio: {e}")
-        return 0
\ No newline at end of file
+        return 0
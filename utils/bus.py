@@ -0,0 +1,73 @@
+import pickle
+import queue
+import threading
+from config import BUS_BACKEND, BUS_URL, BUS_PREFIX, logger
+
+class InProcessBus:
+    """Message bus backed by in-process queues - gateway and workers share one process"""
+    def __init__(self):
+        self.queues = {}
+        self.lock = threading.Lock()
+
+    def _queue(self, topic):
+        with self.lock:
+            if topic not in self.queues:
+                self.queues[topic] = queue.Queue()
+            return self.queues[topic]
+
+    def publish(self, topic, message):
+        """Put a message on a topic"""
+        self._queue(topic).put(message)
+
+    def consume(self, topic, timeout=None):
+        """Take the next message from a topic, or None if the timeout expires"""
+        try:
+            return self._queue(topic).get(timeout=timeout)
+        except queue.Empty:
+            return None
+
+    def depth(self, topic):
+        """Number of messages waiting on a topic"""
+        return self._queue(topic).qsize()
+
+class RedisBus:
+    """Message bus backed by Redis lists - gateway and workers can run on different machines
+
+    Any client exposing rpush/blpop/llen can be passed in, so a local stand-in can replace Redis.
+    Messages are pickled, so only connect to a server you trust.
+    """
+    def __init__(self, client=None, url=BUS_URL, prefix=BUS_PREFIX):
+        if client is None:
+            try:
+                import redis
+            except ImportError:
+                raise RuntimeError("The redis bus backend requires the 'redis' package")
+            client = redis.Redis.from_url(url)
+        self.client = client
+        self.prefix = prefix
+
+    def publish(self, topic, message):
+        """Put a message on a topic"""
+        self.client.rpush(self.prefix + topic, pickle.dumps(message))
+
+    def consume(self, topic, timeout=None):
+        """Take the next message from a topic, or None if the timeout expires"""
+        # blpop treats 0 as "block forever"
+        item = self.client.blpop([self.prefix + topic], timeout=0 if timeout is None else max(1, int(timeout)))
+        if item is None:
+            return None
+        _, payload = item
+        return pickle.loads(payload)
+
+    def depth(self, topic):
+        """Number of messages waiting on a topic"""
+        return self.client.llen(self.prefix + topic)
+
+def create_bus(backend=BUS_BACKEND, **kwargs):
+    """Create a message bus for the configured backend"""
+    if backend == "inprocess":
+        return InProcessBus()
+    if backend == "redis":
+        return RedisBus(**kwargs)
+    logger.error(f"Unknown bus backend '{backend}', falling back to in-process")
+    return InProcessBus()
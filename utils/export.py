@@ -0,0 +1,217 @@
+"""Bulk export and import of tilt data and transcripts
+
+Usage: python -m utils.export export --out DIR [--format jsonl|parquet] [--guild ID ...] [--transcripts]
+       python -m utils.export import DIR
+
+Exports are a directory with one file per table - scores, history and
+(optionally) transcripts - as gzipped JSONL or Parquet. Rows are read from the
+tilt state and written a chunk at a time, so memory stays flat however many
+users there are, and the state lock is only held per chunk. The CLI works
+against the shared state service (--mode state); a standalone bot exports
+its own state with !export.
+"""
+import argparse
+import gzip
+import itertools
+import json
+import os
+from collections import defaultdict
+from config import EXPORT_FORMAT, EXPORT_CHUNK_ROWS, TRANSCRIPT_LOG_DIR, logger
+from data.transcripts import iter_transcripts
+from utils.history import TiltHistory
+
+# Column types, used as the Parquet schema (JSONL rows have the same fields)
+TABLES = {
+    "scores": [("guild_id", "int64"), ("user_id", "int64"), ("score", "float64"), ("last_updated", "float64"),
+               ("triggers", "list<string>")],
+    "history": [("guild_id", "int64"), ("user_id", "int64"), ("level", "string"), ("resolution", "float64"),
+                ("head", "int64"), ("last", "float64"), ("values", "list<float32>")],
+    "transcripts": [("guild_id", "int64"), ("user_id", "int64"), ("timestamp", "float64"), ("source", "string"),
+                    ("text", "string"), ("score_change", "float64")],
+}
+EXTENSIONS = {"jsonl": ".jsonl.gz", "parquet": ".parquet"}
+
+def import_pyarrow():
+    try:
+        import pyarrow
+        import pyarrow.parquet
+    except ImportError:
+        raise RuntimeError("Parquet exports require the 'pyarrow' package")
+    return pyarrow, pyarrow.parquet
+
+def arrow_schema(table):
+    pa, _ = import_pyarrow()
+    types = {"int64": pa.int64(), "float64": pa.float64(), "string": pa.string(),
+             "list<string>": pa.list_(pa.string()), "list<float32>": pa.list_(pa.float32())}
+    return pa.schema([(name, types[column_type]) for name, column_type in TABLES[table]])
+
+class JsonlWriter:
+    def __init__(self, path, table):
+        self.file = gzip.open(path, "wt", encoding="utf-8")
+
+    def write(self, rows):
+        self.file.write("".join(json.dumps(row) + "\n" for row in rows))
+
+    def close(self):
+        self.file.close()
+
+class ParquetWriter:
+    def __init__(self, path, table):
+        self.pa, pq = import_pyarrow()
+        self.schema = arrow_schema(table)
+        self.writer = pq.ParquetWriter(path, self.schema)
+
+    def write(self, rows):
+        self.writer.write_table(self.pa.Table.from_pylist(rows, schema=self.schema))
+
+    def close(self):
+        self.writer.close()
+
+WRITERS = {"jsonl": JsonlWriter, "parquet": ParquetWriter}
+
+def chunked(rows, size):
+    rows = iter(rows)
+    while True:
+        chunk = list(itertools.islice(rows, size))
+        if not chunk:
+            return
+        yield chunk
+
+def record_rows(guild_id, user_id, record):
+    """Rows for one tilt record: its score row and one history row per level"""
+    score_row = {"guild_id": guild_id, "user_id": user_id, "score": float(record["score"]),
+                 "last_updated": float(record["last_updated"]), "triggers": list(record.get("triggers", []))}
+    history_rows = []
+    if "history" in record:
+        for level, data in record["history"].to_dict().items():
+            history_rows.append({"guild_id": guild_id, "user_id": user_id, "level": level, **data})
+    return score_row, history_rows
+
+def iter_state_chunks(state, guild_ids=None, chunk_rows=EXPORT_CHUNK_ROWS):
+    """(score rows, history rows) a chunk of users at a time"""
+    for guild_id in (guild_ids if guild_ids is not None else state.guild_ids()):
+        for user_ids in chunked(state.user_ids(guild_id), chunk_rows):
+            score_rows, history_rows = [], []
+            for user_id, record in state.get_users(guild_id, user_ids).items():
+                score_row, rows = record_rows(guild_id, user_id, record)
+                score_rows.append(score_row)
+                history_rows.extend(rows)
+            yield score_rows, history_rows
+
+def export_data(directory, state, guild_ids=None, fmt=EXPORT_FORMAT, transcripts=False,
+                transcript_dir=TRANSCRIPT_LOG_DIR, chunk_rows=EXPORT_CHUNK_ROWS):
+    """Write tilt scores, history and optionally logged transcripts to a directory; returns rows per table"""
+    if fmt not in WRITERS:
+        raise ValueError(f"Unknown export format {fmt!r}, expected one of {', '.join(WRITERS)}")
+    if transcripts and not transcript_dir:
+        raise RuntimeError("No transcripts to export - set JUSTFF_TRANSCRIPT_DIR to start logging them")
+    os.makedirs(directory, exist_ok=True)
+
+    def open_table(table):
+        return WRITERS[fmt](os.path.join(directory, table + EXTENSIONS[fmt]), table)
+
+    counts = {"scores": 0, "history": 0}
+    scores, history = open_table("scores"), open_table("history")
+    try:
+        for score_rows, history_rows in iter_state_chunks(state, guild_ids, chunk_rows):
+            scores.write(score_rows)
+            history.write(history_rows)
+            counts["scores"] += len(score_rows)
+            counts["history"] += len(history_rows)
+    finally:
+        scores.close()
+        history.close()
+
+    if transcripts:
+        counts["transcripts"] = 0
+        writer = open_table("transcripts")
+        try:
+            for guild_id in (guild_ids if guild_ids is not None else [None]):
+                for rows in chunked(iter_transcripts(transcript_dir, guild_id), chunk_rows):
+                    writer.write(rows)
+                    counts["transcripts"] += len(rows)
+        finally:
+            writer.close()
+
+    logger.info(f"Exported {counts} to {directory}")
+    return counts
+
+def iter_table(directory, table, chunk_rows=EXPORT_CHUNK_ROWS):
+    """Rows of an exported table in chunks, whichever format it was written in (nothing if it's missing)"""
+    base = os.path.join(directory, table)
+    if os.path.exists(base + EXTENSIONS["parquet"]):
+        _, pq = import_pyarrow()
+        for batch in pq.ParquetFile(base + EXTENSIONS["parquet"]).iter_batches(batch_size=chunk_rows):
+            yield batch.to_pylist()
+    elif os.path.exists(base + EXTENSIONS["jsonl"]):
+        with gzip.open(base + EXTENSIONS["jsonl"], "rt", encoding="utf-8") as f:
+            yield from chunked((json.loads(line) for line in f), chunk_rows)
+
+def restore_scores(entries, rows):
+    """Replace tilt records with exported score rows (history follows separately)"""
+    for row in rows:
+        entry = entries[row["user_id"]]
+        entry.clear()
+        entry.update({"score": row["score"], "last_updated": row["last_updated"], "samples": [],
+                      "triggers": list(row["triggers"] or [])})
+
+def restore_history(entries, rows):
+    """Set history levels on restored tilt records from exported history rows"""
+    levels = defaultdict(dict)
+    for row in rows:
+        levels[row["user_id"]][row["level"]] = {"resolution": row["resolution"], "head": row["head"],
+                                                "last": row.get("last"), "values": row["values"]}
+    for user_id, data in levels.items():
+        entry = entries[user_id]
+        # A user's levels can straddle two chunks
+        existing = entry["history"].to_dict() if "history" in entry else {}
+        entry["history"] = TiltHistory.from_dict({**existing, **data})
+
+def group_by_guild(rows):
+    groups = defaultdict(list)
+    for row in rows:
+        groups[row["guild_id"]].append(row)
+    return groups
+
+def import_data(directory, state, chunk_rows=EXPORT_CHUNK_ROWS):
+    """Load an export's scores and history into a tilt state, replacing those users' records; returns rows per table"""
+    counts = {"scores": 0, "history": 0}
+    for table, restore in (("scores", restore_scores), ("history", restore_history)):
+        for rows in iter_table(directory, table, chunk_rows):
+            for guild_id, guild_rows in group_by_guild(rows).items():
+                user_ids = list(dict.fromkeys(row["user_id"] for row in guild_rows))
+                state.modify_users(guild_id, user_ids, restore, guild_rows)
+            counts[table] += len(rows)
+    logger.info(f"Imported {counts} from {directory}")
+    return counts
+
+def iter_replay_events(directory, chunk_rows=EXPORT_CHUNK_ROWS):
+    """Exported transcripts as (guild_id, [(user_id, score_change, text, timestamp)]) batches for update_tilt_scores"""
+    for rows in iter_table(directory, "transcripts", chunk_rows):
+        for guild_id, guild_rows in group_by_guild(rows).items():
+            yield guild_id, [(row["user_id"], row["score_change"], row["text"], row["timestamp"]) for row in guild_rows]
+
+def main():
+    from utils.tilt_state import connect_tilt_state
+
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    subcommands = parser.add_subparsers(dest="command", required=True)
+    export_parser = subcommands.add_parser("export", help="Export from the state service")
+    export_parser.add_argument("--out", required=True, help="Directory to write the tables to")
+    export_parser.add_argument("--format", choices=list(WRITERS), default=EXPORT_FORMAT)
+    export_parser.add_argument("--guild", type=int, action="append", help="Only this guild (repeatable)")
+    export_parser.add_argument("--transcripts", action="store_true", help="Include logged transcripts")
+    export_parser.add_argument("--transcript-dir", default=TRANSCRIPT_LOG_DIR)
+    import_parser = subcommands.add_parser("import", help="Load an export into the state service")
+    import_parser.add_argument("directory")
+    args = parser.parse_args()
+
+    state = connect_tilt_state()
+    if args.command == "export":
+        counts = export_data(args.out, state, args.guild, args.format, args.transcripts, args.transcript_dir)
+    else:
+        counts = import_data(args.directory, state)
+    print(", ".join(f"{count} {table} rows" for table, count in counts.items()))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,175 @@
+import math
+from array import array
+import numpy as np
+from config import TILT_DECAY_RATE, TILT_HISTORY_LEVELS
+
+SPARK_CHARS = "▁▂▃▄▅▆▇█"
+
+def decayed_score(score, seconds):
+    """Score after `seconds` of decay with no updates, matching apply_tilt_decay"""
+    if score <= 50:
+        return score
+    return max(50.0, score - seconds / 60 * TILT_DECAY_RATE)
+
+class RingSeries:
+    """Fixed-size ring of time buckets holding the peak score seen in each
+
+    Buckets between updates are filled with the newest score decayed, since
+    decay is the only thing that changes a score without an update. That is
+    the last score written, not the newest bucket's peak: a spike calmed
+    within one bucket decays from where it was calmed to. A fill never
+    touches more than the ring's size, so inserts are constant time.
+    """
+    __slots__ = ("resolution", "values", "head", "last")
+
+    def __init__(self, resolution, size):
+        self.resolution = resolution
+        self.values = array("f", [math.nan]) * size
+        self.head = None  # Bucket number of the newest bucket
+        self.last = None  # Last score written to the newest bucket
+
+    def _slot(self, bucket):
+        return bucket % len(self.values)
+
+    def add(self, now, score, last=None):
+        """Record a score at `now`; last is the score it ended on, if `score` is a run's peak"""
+        bucket = int(now // self.resolution)
+        if self.head is not None and bucket > self.head:
+            self._fill(bucket)
+        elif self.head is not None and bucket <= self.head - len(self.values):
+            return  # Older than anything we still keep
+
+        slot = self._slot(bucket)
+        if self.head is None or bucket > self.head:
+            self.values[slot] = score
+            self.head = bucket
+        else:
+            self.values[slot] = score if math.isnan(self.values[slot]) else max(self.values[slot], score)
+        if bucket == self.head:
+            self.last = score if last is None else last
+
+    def _fill(self, bucket):
+        """Decay the last score forward through the buckets up to (not including) `bucket`"""
+        first = max(self.head + 1, bucket - len(self.values))
+        for missing in range(first, bucket):
+            self.values[self._slot(missing)] = decayed_score(self.last, (missing - self.head) * self.resolution)
+
+    def series(self, now):
+        """Bucket values oldest to newest, ending at the bucket containing `now` (nan before tracking)"""
+        size = len(self.values)
+        if self.head is None:
+            return [math.nan] * size
+        bucket = max(int(now // self.resolution), self.head)
+        values = []
+        for index in range(bucket - size + 1, bucket + 1):
+            if index > self.head:
+                values.append(decayed_score(self.last, (index - self.head) * self.resolution))
+            elif index <= self.head - size:
+                values.append(math.nan)
+            else:
+                values.append(self.values[self._slot(index)])
+        return values
+
+    def value_at(self, now, seconds_ago):
+        """Peak score in the bucket `seconds_ago` before now, or nan if it's out of range"""
+        if self.head is None:
+            return math.nan
+        bucket = int((now - seconds_ago) // self.resolution)
+        if bucket > self.head:
+            return decayed_score(self.last, (bucket - self.head) * self.resolution)
+        if bucket <= self.head - len(self.values):
+            return math.nan
+        return self.values[self._slot(bucket)]
+
+class TiltHistory:
+    """Multi-resolution tilt score history for one user, bounded by TILT_HISTORY_LEVELS
+
+    Each level is a RingSeries (e.g. per second for a minute, per minute for an
+    hour, per hour for two days) and every update goes into all of them.
+    """
+    __slots__ = ("levels",)
+
+    def __init__(self, levels=TILT_HISTORY_LEVELS):
+        self.levels = {name: RingSeries(resolution, size) for name, resolution, size in levels}
+
+    def add(self, now, score):
+        for series in self.levels.values():
+            series.add(now, score)
+
+    def add_many(self, times, scores, lasts=None):
+        """Same as add() for each (time, score) in order, with one add per bucket
+
+        lasts is the score each update ended on where `scores` are peaks (e.g.
+        decayed then changed), defaulting to the scores. Runs of consecutive
+        updates in the same bucket collapse to their peak and the last score
+        they ended on, which is all add() would have kept of them. Times must not go
+        backwards, so runs that every later bucket overwrites can be skipped:
+        only the last run before the final window still matters, as the score
+        later gaps are decayed from.
+        """
+        lasts = scores if lasts is None else lasts
+        for series in self.levels.values():
+            buckets = np.floor_divide(times, series.resolution)
+            starts = np.flatnonzero(np.r_[True, buckets[1:] != buckets[:-1]])
+            run_buckets = buckets[starts]
+            first = np.searchsorted(run_buckets, run_buckets[-1] - len(series.values), side="right") - 1
+            if first > 0 and (series.head is None or run_buckets[first] > series.head):
+                starts = starts[first:]
+            peaks = np.maximum.reduceat(scores, starts)
+            ends = lasts[np.r_[starts[1:], len(scores)] - 1]
+            for start, peak, last in zip(times[starts].tolist(), peaks.tolist(), ends.tolist()):
+                series.add(start, peak, last)
+
+    def series(self, level, now):
+        return self.levels[level].series(now)
+
+    def to_dict(self):
+        """Plain-data form of every level, e.g. for exports; from_dict restores it exactly"""
+        return {name: {"resolution": series.resolution, "head": series.head, "last": series.last,
+                       "values": series.values.tolist()}
+                for name, series in self.levels.items()}
+
+    @classmethod
+    def from_dict(cls, data):
+        history = cls([(name, level["resolution"], len(level["values"])) for name, level in data.items()])
+        for name, level in data.items():
+            series = history.levels[name]
+            series.values = array("f", level["values"])
+            series.head = level["head"]
+            # Exports from before `last` was kept only have the newest bucket's peak
+            series.last = level.get("last")
+            if series.last is None and series.head is not None:
+                series.last = series.values[series._slot(series.head)]
+        return history
+
+    def change(self, now, seconds):
+        """Score change over the last `seconds`, read from the finest level that reaches back that far"""
+        for series in self.levels.values():
+            if seconds < series.resolution * len(series.values):
+                then = series.value_at(now, seconds)
+                current = series.value_at(now, 0)
+                return None if math.isnan(then) or math.isnan(current) else current - then
+        return None
+
+def record_tilt_history(entry, now):
+    """Add a tilt record's current score to its history, creating the history on first use"""
+    if "history" not in entry:
+        entry["history"] = TiltHistory()
+    entry["history"].add(now, entry["score"])
+
+def record_tilt_history_many(entry, times, scores, lasts=None):
+    """Add a run of a tilt record's scores, oldest first, to its history (see TiltHistory.add_many)"""
+    if "history" not in entry:
+        entry["history"] = TiltHistory()
+    entry["history"].add_many(times, scores, lasts)
+
+def sparkline(values, low=0, high=100):
+    """Render scores as a line of block characters on a fixed scale, blank where there's no data"""
+    chars = []
+    for value in values:
+        if math.isnan(value):
+            chars.append(" ")
+            continue
+        position = (min(max(value, low), high) - low) / (high - low)
+        chars.append(SPARK_CHARS[min(len(SPARK_CHARS) - 1, int(position * len(SPARK_CHARS)))])
+    return "".join(chars)
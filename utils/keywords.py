@@ -0,0 +1,154 @@
+import glob
+import os
+import re
+import threading
+import time
+import yaml
+from config import TILT_KEYWORDS, POSITIVE_KEYWORDS, KEYWORD_PACK_DIR, KEYWORD_PACK_POLL_SECONDS, logger
+
+BASE_PACK = "base"
+
+class KeywordMatcher:
+    """Tilt and positive keyword patterns from a set of packs, compiled once
+
+    Scores exactly like matching each pattern on its own (overlapping patterns
+    all count), but first runs one combined pattern so messages with no
+    keywords at all - most of them - cost a single regex search.
+    """
+    def __init__(self, tilt_keywords, positive_keywords):
+        self.tilt = [(re.compile(pattern, re.IGNORECASE), value) for pattern, value in tilt_keywords.items()]
+        self.positive = [(re.compile(pattern, re.IGNORECASE), value) for pattern, value in positive_keywords.items()]
+        patterns = list(tilt_keywords) + list(positive_keywords)
+        self.any_keyword = re.compile("|".join(f"(?:{pattern})" for pattern in patterns), re.IGNORECASE) if patterns else None
+
+    def score(self, text):
+        """Tilt keyword weight minus positive keyword weight, counting every match"""
+        if self.any_keyword is None or not self.any_keyword.search(text):
+            return 0
+        score_change = 0
+        for pattern, value in self.tilt:
+            score_change += len(pattern.findall(text)) * value
+        for pattern, value in self.positive:
+            score_change -= len(pattern.findall(text)) * value
+        return score_change
+
+def load_pack_file(path):
+    """Read a keyword pack: {"tilt": {pattern: weight}, "positive": {pattern: weight}}"""
+    with open(path) as f:
+        data = yaml.safe_load(f) or {}
+    pack = {
+        "name": data.get("name") or os.path.splitext(os.path.basename(path))[0],
+        "description": data.get("description", ""),
+        "tilt": {str(pattern): int(value) for pattern, value in (data.get("tilt") or {}).items()},
+        "positive": {str(pattern): int(value) for pattern, value in (data.get("positive") or {}).items()},
+    }
+    # Fail here rather than on the analysis path if a pattern doesn't compile
+    for pattern in list(pack["tilt"]) + list(pack["positive"]):
+        re.compile(pattern)
+    return pack
+
+class KeywordPackRegistry:
+    """Keyword packs loaded from files, with compiled matchers shared by every guild using the same packs
+
+    The loaded packs and their matchers live in one state dict that's replaced
+    wholesale when files change, so analysis always sees a complete old or new
+    version and never waits on a reload.
+    """
+    def __init__(self, pack_dir=KEYWORD_PACK_DIR, poll_seconds=KEYWORD_PACK_POLL_SECONDS):
+        self.pack_dir = pack_dir
+        self.poll_seconds = poll_seconds
+        self.build_lock = threading.Lock()
+        self.watcher = None
+        self.state = self._load({})
+
+    def _scan(self):
+        """Pack file paths and their modification times"""
+        mtimes = {}
+        for path in glob.glob(os.path.join(self.pack_dir, "*.yaml")):
+            try:
+                mtimes[path] = os.stat(path).st_mtime_ns
+            except OSError:
+                continue  # Deleted between the glob and the stat
+        return mtimes
+
+    def _load(self, previous_packs):
+        """Build a new state from the pack files, keeping the previous version of any file that fails to load"""
+        mtimes = self._scan()
+        packs = {BASE_PACK: {"name": BASE_PACK, "description": "Built-in keywords",
+                             "tilt": TILT_KEYWORDS, "positive": POSITIVE_KEYWORDS}}
+        for path in sorted(mtimes):
+            try:
+                pack = load_pack_file(path)
+            except Exception as e:
+                logger.error(f"Could not load keyword pack {path}: {e}")
+                pack = next((p for p in previous_packs.values() if p.get("path") == path), None)
+                if pack is None:
+                    continue
+            pack["path"] = path
+            packs[pack["name"]] = pack  # A base.yaml replaces the built-in keywords
+        return {"packs": packs, "mtimes": mtimes, "matchers": {}}
+
+    def _build(self, state, key):
+        with self.build_lock:
+            if key not in state["matchers"]:
+                tilt, positive = {}, {}
+                for name in key:
+                    tilt.update(state["packs"][name]["tilt"])
+                    positive.update(state["packs"][name]["positive"])
+                state["matchers"][key] = KeywordMatcher(tilt, positive)
+            return state["matchers"][key]
+
+    def matcher(self, pack_names=None):
+        """The compiled matcher for the base pack plus the given packs (unknown names are skipped)"""
+        state = self.state
+        key = (BASE_PACK,) + tuple(sorted(
+            name for name in set(pack_names or ()) if name in state["packs"] and name != BASE_PACK
+        ))
+        matcher = state["matchers"].get(key)
+        return matcher if matcher is not None else self._build(state, key)
+
+    def pack_names(self):
+        """Names and descriptions of the loaded packs, other than the base pack"""
+        return {name: pack["description"] for name, pack in self.state["packs"].items() if name != BASE_PACK}
+
+    def reload_if_changed(self):
+        """Reload when pack files were added, removed or modified; returns True if the packs changed"""
+        state = self.state
+        if self._scan() == state["mtimes"]:
+            return False
+
+        new_state = self._load(state["packs"])
+        # Compile every combination guilds are using before the swap, so nobody pays for it mid-analysis
+        for key in list(state["matchers"]):
+            if all(name in new_state["packs"] for name in key):
+                self._build(new_state, key)
+        self.state = new_state
+        logger.info(f"Reloaded keyword packs: {', '.join(sorted(new_state['packs']))}")
+        return True
+
+    def start_watching(self):
+        """Poll the pack directory for changes on a background thread"""
+        if self.watcher is not None:
+            return self.watcher
+
+        def watch():
+            while True:
+                time.sleep(self.poll_seconds)
+                try:
+                    self.reload_if_changed()
+                except Exception as e:
+                    logger.error(f"Error reloading keyword packs: {e}")
+
+        self.watcher = threading.Thread(target=watch, name="justff-keyword-packs", daemon=True)
+        self.watcher.start()
+        return self.watcher
+
+keyword_registry = None
+
+def get_keyword_registry():
+    """Get the process-wide keyword pack registry, loading the packs on first use"""
+    global keyword_registry
+    if keyword_registry is None:
+        keyword_registry = KeywordPackRegistry()
+        keyword_registry.start_watching()
+    return keyword_registry
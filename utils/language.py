@@ -0,0 +1,154 @@
+import threading
+import time
+from collections import OrderedDict
+from config import (DEFAULT_LANGUAGE, LANGUAGE_DETECT_SEGMENTS, LANGUAGE_DETECT_MAX_SEGMENTS, LANGUAGE_MIN_CONFIDENCE,
+                    LANGUAGE_RECHECK_CLIPS, LANGUAGE_RECHECK_SECONDS, LANGUAGE_CACHE_SIZE, logger)
+
+class LanguageCache:
+    """Each speaker's detected language, so Whisper only detects on a few clips per user
+
+    A new speaker is detected on their first clips, averaging Whisper's language
+    probabilities, until there are enough clips and the leading language is
+    confident enough (or the detection budget runs out). After that clips are
+    decoded straight in the cached language, with one detection every so often
+    in case the speaker switched. Users are evicted least recently heard first.
+    In gateway mode the gateway holds the only cache: jobs carry its routing
+    (see RoutedLanguage) and workers send their detections back with results.
+    """
+    def __init__(self, default=DEFAULT_LANGUAGE, detect_segments=LANGUAGE_DETECT_SEGMENTS,
+                 max_segments=LANGUAGE_DETECT_MAX_SEGMENTS, min_confidence=LANGUAGE_MIN_CONFIDENCE,
+                 recheck_clips=LANGUAGE_RECHECK_CLIPS, recheck_seconds=LANGUAGE_RECHECK_SECONDS,
+                 max_users=LANGUAGE_CACHE_SIZE):
+        self.default = default
+        self.detect_segments = detect_segments
+        self.max_segments = max_segments
+        self.min_confidence = min_confidence
+        self.recheck_clips = recheck_clips
+        self.recheck_seconds = recheck_seconds
+        self.max_users = max_users
+        self.users = OrderedDict()  # user_id -> detection state, least recently heard first
+        self.lock = threading.Lock()
+        self.detections = 0
+        self.switches = 0
+
+    def _settled(self, user):
+        return user["samples"] >= self.max_segments or (
+            user["samples"] >= self.detect_segments and user["confidence"] >= self.min_confidence)
+
+    def route(self, user_id, now=None):
+        """(language, detect) for a user's next clip - detect means run language detection on it first"""
+        if user_id is None:
+            return self.default, False
+        now = time.monotonic() if now is None else now
+        with self.lock:
+            user = self.users.get(user_id)
+            if user is None:
+                return self.default, True
+            self.users.move_to_end(user_id)
+            if not self._settled(user):
+                return user["language"], True
+            user["clips"] += 1
+            due = user["clips"] >= self.recheck_clips or now - user["checked_at"] >= self.recheck_seconds
+            return user["language"], due
+
+    def observe(self, user_id, probabilities, now=None):
+        """Fold one clip's language probabilities into the user's state and return the language to decode in"""
+        if user_id is None or not probabilities:
+            return self.default
+        now = time.monotonic() if now is None else now
+        with self.lock:
+            self.detections += 1
+            user = self.users.get(user_id)
+            if user is not None and self._settled(user):
+                # A recheck - only start over if the clip confidently says something else
+                language = max(probabilities, key=probabilities.get)
+                user["clips"], user["checked_at"] = 0, now
+                if language == user["language"] or probabilities[language] < self.min_confidence:
+                    return user["language"]
+                logger.info(f"User {user_id} switched language {user['language']} -> {language}")
+                self.switches += 1
+                user = None
+
+            if user is None:
+                user = {"totals": {}, "samples": 0, "language": self.default, "confidence": 0.0,
+                        "clips": 0, "checked_at": now}
+                self.users[user_id] = user
+                while len(self.users) > self.max_users:
+                    self.users.popitem(last=False)
+            self.users.move_to_end(user_id)
+
+            totals = user["totals"]
+            for language, probability in probabilities.items():
+                totals[language] = totals.get(language, 0.0) + probability
+            user["samples"] += 1
+            user["language"] = max(totals, key=totals.get)
+            user["confidence"] = totals[user["language"]] / user["samples"]
+            user["checked_at"] = now
+            if self._settled(user):
+                user["totals"] = {}  # Only needed while detecting
+                logger.info(f"User {user_id} speaks {user['language']} "
+                            f"(confidence {user['confidence']:.2f} over {user['samples']} clips)")
+            return user["language"]
+
+    def language(self, user_id):
+        """A user's current language (the default if they haven't been heard yet)"""
+        with self.lock:
+            user = self.users.get(user_id)
+            return user["language"] if user is not None else self.default
+
+    def stats(self):
+        """Snapshot of the cache: users per language and how many detections have run"""
+        with self.lock:
+            languages = {}
+            for user in self.users.values():
+                languages[user["language"]] = languages.get(user["language"], 0) + 1
+            return {
+                "users": len(self.users),
+                "settled": sum(1 for user in self.users.values() if self._settled(user)),
+                "languages": languages,
+                "detections": self.detections,
+                "switches": self.switches,
+            }
+
+class RoutedLanguage:
+    """One clip's routing, decided by the gateway's LanguageCache, for an inference worker
+
+    Stands in for the cache in transcribe_audio and score_audio_segment. The
+    clip is decoded in the routed language unless its detection confidently
+    says otherwise, and the probabilities are kept for the result so the
+    gateway can fold them into its cache.
+    """
+    def __init__(self, language=DEFAULT_LANGUAGE, detect=False, min_confidence=LANGUAGE_MIN_CONFIDENCE):
+        self.current = language
+        self.detect = detect
+        self.min_confidence = min_confidence
+        self.probabilities = None
+
+    def route(self, user_id, now=None):
+        return self.current, self.detect
+
+    def observe(self, user_id, probabilities, now=None):
+        self.probabilities = probabilities
+        if probabilities:
+            language = max(probabilities, key=probabilities.get)
+            if probabilities[language] >= self.min_confidence:
+                self.current = language
+        return self.current
+
+    def language(self, user_id):
+        return self.current
+
+    def top_probabilities(self, count=5):
+        """The detection's most likely languages, small enough to send back over the bus"""
+        if not self.probabilities:
+            return None
+        return dict(sorted(self.probabilities.items(), key=lambda item: item[1], reverse=True)[:count])
+
+language_cache = None
+
+def get_language_cache():
+    """Get the process-wide language cache, creating it on first use"""
+    global language_cache
+    if language_cache is None:
+        language_cache = LanguageCache()
+    return language_cache
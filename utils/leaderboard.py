@@ -0,0 +1,99 @@
+import bisect
+import threading
+import time
+from collections import OrderedDict
+from config import TILT_DECAY_RATE
+
+KEY_TOLERANCE = 1e-6  # Decay recomputes the same key up to float rounding
+
+class GuildLeaderboard:
+    """Tilt scores for one guild kept in ranked order as they change
+
+    Above 50 a score decays linearly until it's updated, so
+    score + TILT_DECAY_RATE * last_updated / 60 ranks those users correctly at
+    any later time: decay never reorders them, and the current score is read
+    back from the key at query time. Scores at or below 50 don't decay and are
+    ranked by the score itself. Each group is a sorted list, so an update is a
+    binary search plus a list insert, and reading the top N costs O(N).
+    """
+    def __init__(self):
+        self.decaying = []  # [(-key, user_id)], highest first
+        self.settled = []  # [(-score, user_id)], highest first
+        self.positions = {}  # user_id -> (group list, item)
+        self.version = 0  # Bumped whenever the ranking or a score changes other than by decay
+
+    def update(self, user_id, score, last_updated):
+        """Place a user by their stored score; returns True if anything visible changed"""
+        if score > 50:
+            group, item = self.decaying, (-(score + TILT_DECAY_RATE * last_updated / 60), user_id)
+        else:
+            group, item = self.settled, (-score, user_id)
+
+        current = self.positions.get(user_id)
+        if current is not None:
+            if current[0] is group and abs(current[1][0] - item[0]) < KEY_TOLERANCE:
+                return False  # Only decayed, which the key already accounts for
+            self._remove(current)
+        bisect.insort(group, item)
+        self.positions[user_id] = (group, item)
+        self.version += 1
+        return True
+
+    def remove(self, user_id):
+        current = self.positions.pop(user_id, None)
+        if current is not None:
+            self._remove(current)
+            self.version += 1
+
+    def _remove(self, position):
+        group, item = position
+        del group[bisect.bisect_left(group, item)]
+
+    def top(self, now, limit=None):
+        """(user_id, score) pairs in descending score order at time `now`, up to `limit`
+
+        Decaying users come first: past the first one that has decayed to 50,
+        the rest have too, and tie with the settled users at 50.
+        """
+        ranked = []
+        for group in (self.decaying, self.settled):
+            for negative_key, user_id in group:
+                if limit is not None and len(ranked) >= limit:
+                    return ranked
+                if group is self.decaying:
+                    ranked.append((user_id, max(50, -negative_key - TILT_DECAY_RATE * now / 60)))
+                else:
+                    ranked.append((user_id, -negative_key))
+        return ranked
+
+    def __len__(self):
+        return len(self.positions)
+
+class RenderCache:
+    """Rendered replies reused until the data behind them changes version or the TTL runs out
+
+    The TTL covers what versions don't track: decay over time and members
+    renaming themselves. Least recently used entries go first when full.
+    """
+    def __init__(self, ttl, max_entries):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.entries = OrderedDict()  # key -> (version, expires_at, value)
+        self.lock = threading.Lock()
+
+    def get(self, key, version, now=None):
+        now = time.monotonic() if now is None else now
+        with self.lock:
+            cached = self.entries.get(key)
+            if cached is None or cached[0] != version or cached[1] <= now:
+                return None
+            self.entries.move_to_end(key)
+            return cached[2]
+
+    def put(self, key, version, value, now=None):
+        now = time.monotonic() if now is None else now
+        with self.lock:
+            self.entries[key] = (version, now + self.ttl, value)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
@@ -0,0 +1,291 @@
+import re
+from functools import lru_cache
+from config import CORRECTION_MIN_LENGTH, CORRECTION_MAX_ERROR
+
+VOWELS = "aeiou"
+FUZZY_CACHE_SIZE = 4096  # Looked-up phrases remembered per index; chat repeats itself a lot
+
+@lru_cache(maxsize=16384)
+def metaphone(word):
+    """Metaphone-style phonetic key: words that sound alike get the same (or a nearby) key
+
+    Follows the original Metaphone rules closely enough for ASR errors, with
+    every leading vowel collapsed to "A". Digits and punctuation are dropped.
+    """
+    word = re.sub(r"[^a-z]", "", word.lower())
+    if not word:
+        return ""
+    if word[:2] in ("ae", "gn", "kn", "pn", "wr"):
+        word = word[1:]
+    elif word[0] == "x":
+        word = "s" + word[1:]
+    elif word.startswith("wh"):
+        word = "w" + word[2:]
+
+    key = []
+    i = 0
+    n = len(word)
+    while i < n:
+        c = word[i]
+        prev = word[i - 1] if i > 0 else ""
+        nxt = word[i + 1] if i + 1 < n else ""
+        after = word[i + 2] if i + 2 < n else ""
+
+        if c == prev and c != "c":
+            pass  # Doubled letters sound like one
+        elif c in VOWELS:
+            if i == 0:
+                key.append("A")
+        elif c == "b":
+            if not (prev == "m" and i == n - 1):  # Silent in "-mb"
+                key.append("B")
+        elif c == "c":
+            if nxt == "i" and after == "a":
+                key.append("X")
+            elif nxt == "h":
+                key.append("K" if prev == "s" else "X")
+                i += 1
+            elif nxt in ("i", "e", "y"):
+                if prev != "s":
+                    key.append("S")
+            else:
+                key.append("K")
+        elif c == "d":
+            if nxt == "g" and after in ("i", "e", "y"):
+                key.append("J")
+                i += 1
+            else:
+                key.append("T")
+        elif c == "g":
+            if nxt == "h" and after and after not in VOWELS:
+                i += 1  # Silent "gh" as in "night"
+            elif nxt == "h" and i + 2 >= n:
+                i += 1  # Word-final "gh" as in "high"
+            elif nxt == "n" and (i + 2 == n or word[i + 2:] == "ed"):
+                pass  # Silent in "-gn" and "-gned"
+            elif nxt in ("i", "e", "y") and prev != "g":
+                key.append("J")
+            else:
+                key.append("K")
+        elif c == "h":
+            if prev not in "cgpst" and not (prev in VOWELS and nxt not in VOWELS):
+                key.append("H")
+        elif c == "k":
+            if prev != "c":
+                key.append("K")
+        elif c == "p":
+            if nxt == "h":
+                key.append("F")
+                i += 1
+            else:
+                key.append("P")
+        elif c == "q":
+            key.append("K")
+        elif c == "s":
+            if nxt == "h":
+                key.append("X")
+                i += 1
+            elif nxt == "i" and after in ("o", "a"):
+                key.append("X")
+            else:
+                key.append("S")
+        elif c == "t":
+            if nxt == "i" and after in ("o", "a"):
+                key.append("X")
+            elif nxt == "h":
+                key.append("0")  # "th"
+                i += 1
+            elif not (nxt == "c" and after == "h"):
+                key.append("T")
+        elif c == "v":
+            key.append("F")
+        elif c in ("w", "y"):
+            if nxt in VOWELS:
+                key.append(c.upper())
+        elif c == "x":
+            key.append("KS")
+        elif c == "z":
+            key.append("S")
+        else:
+            key.append(c.upper())  # f, j, l, m, n, r
+        i += 1
+    return "".join(key)
+
+def levenshtein(a, b, limit=None):
+    """Edit distance between two strings, stopping early once it must exceed `limit`"""
+    if len(a) < len(b):
+        a, b = b, a
+    if limit is not None and len(a) - len(b) > limit:
+        return limit + 1
+    previous = list(range(len(b) + 1))
+    for i, ca in enumerate(a, 1):
+        current = [i]
+        for j, cb in enumerate(b, 1):
+            current.append(min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + (ca != cb)))
+        if limit is not None and min(current) > limit:
+            return limit + 1
+        previous = current
+    return previous[-1]
+
+def deletions(key):
+    """The key itself plus every variant with one character removed"""
+    return {key} | {key[:i] + key[i + 1:] for i in range(len(key))}
+
+class KeyNeighbourhood:
+    """Finds every stored key within one edit of a query with a handful of dict lookups
+
+    Two strings are within one insertion, deletion or substitution of each
+    other only if they share a single-deletion variant, so indexing keys by
+    their variants turns the search into len(key) + 1 lookups however many
+    keys are stored (the symmetric-delete trick SymSpell uses).
+    """
+    def __init__(self):
+        self.variants = {}  # variant -> set of keys
+
+    def add(self, key):
+        for variant in deletions(key):
+            self.variants.setdefault(variant, set()).add(key)
+
+    def search(self, key):
+        """Stored keys within one edit of key, as (distance, key) pairs"""
+        candidates = set()
+        for variant in deletions(key):
+            candidates.update(self.variants.get(variant, ()))
+        results = []
+        for candidate in candidates:
+            distance = levenshtein(key, candidate, 1)
+            if distance <= 1:  # Sharing a variant can also mean two edits apart, e.g. a swap
+                results.append((distance, candidate))
+        return results
+
+def compact(phrase):
+    """Letters and digits only, so "jun gle" and "jungle" compare equal"""
+    return re.sub(r"[^a-z0-9]", "", phrase.lower())
+
+class CorrectionIndex:
+    """Exact and phonetic lookup of transcript phrases against a vocabulary
+
+    Exact entries (known mistakes and the vocabulary itself) are a dict lookup.
+    Fuzzy entries are bucketed by phonetic key, and near-miss keys come from a
+    KeyNeighbourhood, so a lookup only ever compares spellings within a few
+    matching buckets however big the vocabulary is.
+    """
+    def __init__(self, max_error=CORRECTION_MAX_ERROR, near_keys=False, same_initial=False):
+        self.max_error = max_error  # Spelling edits allowed per character of the entry
+        self.near_keys = near_keys  # Also accept phonetic keys one edit away, at half the spelling budget
+        self.same_initial = same_initial  # Only match spellings starting with the same letter
+        self.exact = {}  # phrase -> replacement
+        self.phonetic = {}  # key -> [(compact spelling, replacement)]
+        self.near = KeyNeighbourhood()
+        self.fuzzy_cache = {}  # phrase -> replacement or None
+        self.max_words = 1
+
+    def add(self, phrase, replacement, fuzzy=True):
+        phrase = " ".join(phrase.lower().split())
+        if not phrase:
+            return
+        spelling = compact(phrase)
+        self.exact.setdefault(phrase, replacement)
+        self.exact.setdefault(spelling, replacement)  # "jun gle" and "rage quit" written as one word
+        self.max_words = max(self.max_words, len(phrase.split()))
+
+        key = metaphone(spelling)
+        if fuzzy and key and len(spelling) >= CORRECTION_MIN_LENGTH:
+            entries = self.phonetic.setdefault(key, [])
+            if (spelling, replacement) not in entries:
+                entries.append((spelling, replacement))
+                self.near.add(key)
+                self.fuzzy_cache = {}
+
+    def lookup_exact(self, phrase):
+        replacement = self.exact.get(phrase)
+        if replacement is None and " " in phrase:
+            spelling = compact(phrase)
+            if len(spelling) >= CORRECTION_MIN_LENGTH:
+                replacement = self.exact.get(spelling)
+        return replacement
+
+    def lookup_fuzzy(self, phrase):
+        """Closest phonetic match for a phrase that isn't in the vocabulary, or None"""
+        try:
+            return self.fuzzy_cache[phrase]
+        except KeyError:
+            pass
+        if len(self.fuzzy_cache) >= FUZZY_CACHE_SIZE:
+            self.fuzzy_cache = {}
+        replacement = self._match_fuzzy(phrase)
+        self.fuzzy_cache[phrase] = replacement
+        return replacement
+
+    def _match_fuzzy(self, phrase):
+        spelling = compact(phrase)
+        if len(spelling) < CORRECTION_MIN_LENGTH:
+            return None
+        key = metaphone(spelling)
+        if not key:
+            return None
+
+        candidates = [(0, key)]
+        if self.near_keys and len(key) >= 4:
+            candidates = self.near.search(key)
+
+        best = None
+        for key_distance, candidate_key in candidates:
+            limit = self.max_error if key_distance == 0 else self.max_error / 2
+            for entry_spelling, replacement in self.phonetic.get(candidate_key, ()):
+                if self.same_initial and entry_spelling[0] != spelling[0]:
+                    continue
+                max_edits = int(len(entry_spelling) * limit)
+                distance = levenshtein(spelling, entry_spelling, max_edits)
+                if distance <= max_edits and (best is None or distance < best[0]):
+                    best = (distance, replacement)
+        return best[1] if best else None
+
+def split_token(token):
+    """Split a token into leading punctuation, the word, and trailing punctuation (including a possessive 's)"""
+    match = re.match(r"^(\W*)(.*?)((?:'s)?\W*)$", token)
+    return match.group(1), match.group(2), match.group(3)
+
+def correct_with_indexes(text, indexes):
+    """Replace words and phrases found in the indexes in one left-to-right pass
+
+    At each position the longest exact match in any index wins, then the
+    longest fuzzy match, trying the indexes in order.
+    """
+    tokens = text.split()
+    parts = [split_token(token) for token in tokens]
+    words = [word.lower() for _, word, _ in parts]
+    max_words = max((index.max_words for index in indexes), default=1)
+
+    output = []
+    i = 0
+    while i < len(tokens):
+        if not words[i]:
+            output.append(tokens[i])
+            i += 1
+            continue
+
+        match = None
+        for lookup in ("lookup_exact", "lookup_fuzzy"):
+            for n in range(min(max_words, len(tokens) - i), 0, -1):
+                if not all(words[i:i + n]):
+                    continue
+                phrase = " ".join(words[i:i + n])
+                for index in indexes:
+                    replacement = getattr(index, lookup)(phrase)
+                    if replacement is not None:
+                        match = (n, replacement)
+                        break
+                if match:
+                    break
+            if match:
+                break
+
+        if match:
+            n, replacement = match
+            output.append(parts[i][0] + replacement + parts[i + n - 1][2])
+            i += n
+        else:
+            output.append(tokens[i])
+            i += 1
+    return " ".join(output)
@@ -0,0 +1,157 @@
+import os
+import signal
+import sys
+import threading
+import time
+import tracemalloc
+from collections import Counter
+from config import (PROFILE_SAMPLE_INTERVAL, PROFILE_TOP_N, PROFILE_OUTPUT_DIR, PROFILE_SIGNAL_SECONDS,
+                    PROFILE_TRACEMALLOC_FRAMES, logger)
+
+# Leave the profiler's own bookkeeping out of the memory growth
+TRACEMALLOC_FILTERS = [tracemalloc.Filter(False, __file__), tracemalloc.Filter(False, tracemalloc.__file__)]
+
+def frame_label(frame):
+    """Function name and the last two path components of its file, e.g. process_audio (bot/voice.py)"""
+    code = frame.f_code
+    path = os.path.normpath(code.co_filename).split(os.sep)
+    return f"{code.co_name} ({'/'.join(path[-2:])})"
+
+class ProfileSession:
+    """Samples every thread's stack at a fixed interval, plus tracemalloc growth
+
+    Sampling sys._current_frames() covers the event loop, the per-guild audio
+    threads and worker threads alike without instrumenting any of them, and
+    costs one stack walk per thread per interval. Stacks are written in the
+    collapsed format flamegraph.pl and speedscope read.
+    """
+    def __init__(self, seconds, interval=PROFILE_SAMPLE_INTERVAL, top_n=PROFILE_TOP_N,
+                 output_dir=PROFILE_OUTPUT_DIR, trace_memory=True):
+        self.seconds = seconds
+        self.interval = interval
+        self.top_n = top_n
+        self.output_dir = output_dir
+        self.trace_memory = trace_memory
+        self.stacks = Counter()
+        self.samples = 0
+        self.report = None
+        self.done = threading.Event()
+        self.thread = threading.Thread(target=self._run, name="justff-profiler", daemon=True)
+
+    def start(self):
+        self.thread.start()
+        return self
+
+    def wait(self, timeout=None):
+        """Block until the session finishes and return its report"""
+        self.done.wait(timeout)
+        return self.report
+
+    def _sample(self):
+        names = {thread.ident: thread.name for thread in threading.enumerate()}
+        own_ident = threading.get_ident()
+        for ident, frame in sys._current_frames().items():
+            if ident == own_ident:
+                continue
+            stack = []
+            while frame is not None:
+                stack.append(frame_label(frame))
+                frame = frame.f_back
+            stack.append(names.get(ident, f"thread-{ident}"))
+            self.stacks[";".join(reversed(stack))] += 1
+        self.samples += 1
+
+    def _run(self):
+        started_tracing = False
+        before = None
+        try:
+            if self.trace_memory:
+                if not tracemalloc.is_tracing():
+                    tracemalloc.start(PROFILE_TRACEMALLOC_FRAMES)
+                    started_tracing = True
+                before = tracemalloc.take_snapshot().filter_traces(TRACEMALLOC_FILTERS)
+
+            end = time.monotonic() + self.seconds
+            while time.monotonic() < end:
+                self._sample()
+                time.sleep(self.interval)
+
+            memory = []
+            if before is not None:
+                after = tracemalloc.take_snapshot().filter_traces(TRACEMALLOC_FILTERS)
+                memory = after.compare_to(before, "lineno")[:self.top_n]
+            self.report = self._write_report(memory)
+        except Exception as e:
+            logger.error(f"Profiling failed: {e}")
+        finally:
+            if started_tracing:
+                tracemalloc.stop()
+            self.done.set()
+
+    def summary(self, memory):
+        """Top functions by own and total samples, time per thread and memory growth"""
+        self_counts = Counter()
+        total_counts = Counter()
+        thread_counts = Counter()
+        for stack, count in self.stacks.items():
+            frames = stack.split(";")
+            thread_counts[frames[0]] += count
+            if len(frames) > 1:
+                self_counts[frames[-1]] += count
+            for label in set(frames[1:]):
+                total_counts[label] += count
+
+        samples = max(1, self.samples)
+        lines = [f"{self.samples} samples over {self.seconds}s every {self.interval * 1000:.0f}ms "
+                 f"(% of samples, per thread - waiting threads count too)", "", "Threads:"]
+        lines += [f"  {count / samples:6.1%}  {name}" for name, count in thread_counts.most_common(self.top_n)]
+        lines += ["", "Top functions (self):"]
+        lines += [f"  {count / samples:6.1%}  {label}" for label, count in self_counts.most_common(self.top_n)]
+        lines += ["", "Top functions (total):"]
+        lines += [f"  {count / samples:6.1%}  {label}" for label, count in total_counts.most_common(self.top_n)]
+        if memory:
+            lines += ["", "Memory growth:"]
+            lines += [f"  {stat.size_diff / 1024:+9.1f} KiB  {stat.traceback[0].filename}:{stat.traceback[0].lineno}"
+                      for stat in memory]
+        return "\n".join(lines)
+
+    def _write_report(self, memory):
+        os.makedirs(self.output_dir, exist_ok=True)
+        base = os.path.join(self.output_dir, f"profile-{time.strftime('%Y%m%d-%H%M%S')}-{os.getpid()}")
+        collapsed_path = base + ".collapsed"
+        with open(collapsed_path, "w") as f:
+            for stack, count in self.stacks.most_common():
+                f.write(f"{stack} {count}\n")
+
+        summary = self.summary(memory)
+        summary_path = base + ".txt"
+        with open(summary_path, "w") as f:
+            f.write(summary + "\n")
+        logger.info(f"Profile written to {collapsed_path} and {summary_path}")
+        return {"summary": summary, "collapsed_path": collapsed_path, "summary_path": summary_path}
+
+active_session = None
+session_lock = threading.RLock()  # Re-entrant: the signal handler can interrupt the main thread holding it
+
+def start_profile(seconds, **kwargs):
+    """Start a profiling session, or return None if one is already running"""
+    global active_session
+    with session_lock:
+        if active_session is not None and not active_session.done.is_set():
+            return None
+        active_session = ProfileSession(seconds, **kwargs).start()
+        return active_session
+
+def install_profile_signal_handler(signum=getattr(signal, "SIGUSR1", None), seconds=PROFILE_SIGNAL_SECONDS):
+    """Profile for `seconds` whenever the process gets SIGUSR1, writing the results to disk"""
+    if signum is None:
+        return False  # No SIGUSR1 on Windows
+
+    def handle(received, frame):
+        if start_profile(seconds) is None:
+            logger.info("Profile already running, ignoring signal")
+        else:
+            logger.info(f"Profiling for {seconds}s (signal {received})")
+
+    signal.signal(signum, handle)
+    return True
@@ -0,0 +1,259 @@
+import threading
+import time
+from collections import deque
+import numpy as np
+from config import (VOICE_TILT_INDICATORS, PROSODY_FRAME_MS, VOICE_ACTIVITY_RATIO, PROSODY_MIN_ENERGY,
+                    LOUD_MIN_SECONDS, INTERRUPTION_WINDOW_SECONDS, SPEECH_HANGOVER_SECONDS,
+                    MIN_SPEECH_SECONDS, PITCH_MIN_HZ, PITCH_MAX_HZ, PITCH_MIN_CORRELATION,
+                    DEGRADED_PITCH_STD_SEMITONES, DEGRADED_PITCH_SCORE, SHOUT_PITCH_HZ, DEGRADED_SHOUT_SCORE, logger)
+
+class StreamingProsodyExtractor:
+    """Per-frame acoustic features for one speaker, updated in constant time per frame
+
+    Tracks loudness peaks, syllable-like energy onsets (for speaking rate) and
+    voiced intervals (for overlap with other speakers). Feed frames in order
+    with update() and read the summary with features().
+    """
+    def __init__(self, sample_rate, frame_ms=PROSODY_FRAME_MS, noise_floor=None, track_pitch=False):
+        self.sample_rate = sample_rate
+        self.track_pitch = track_pitch
+        self.frame_seconds = frame_ms / 1000
+        self.frame_index = 0
+
+        # Adaptive noise floor so quiet mics and loud mics both work
+        self.noise_floor = noise_floor if noise_floor is not None else PROSODY_MIN_ENERGY / VOICE_ACTIVITY_RATIO
+
+        # Syllable nucleus detection on a smoothed energy envelope
+        self.envelope = 0.0
+        self.rising = False
+        self.last_peak = 0.0
+        self.last_valley = 0.0
+        self.syllables = 0
+
+        # Loudness
+        self.max_peak = 0.0
+        self.loud_frames = 0
+
+        # Pitch statistics in semitones (Welford running mean/variance)
+        self.min_lag = int(sample_rate / PITCH_MAX_HZ)
+        self.max_lag = int(sample_rate / PITCH_MIN_HZ)
+        self.pitch_count = 0
+        self.pitch_mean = 0.0
+        self.pitch_m2 = 0.0
+
+        # Voiced intervals with a short hangover so pauses between words don't split them
+        self.voiced_frames = 0
+        self.current_start = None
+        self.last_voiced = None
+        self.intervals = []
+
+    def update(self, frame):
+        """Process one frame of float samples in [-1, 1]"""
+        t = self.frame_index * self.frame_seconds
+        self.frame_index += 1
+
+        rms = float(np.sqrt(np.dot(frame, frame) / len(frame))) if len(frame) else 0.0
+        peak = float(np.max(np.abs(frame))) if len(frame) else 0.0
+
+        # Noise floor follows quiet frames quickly and loud frames very slowly
+        if rms < self.noise_floor:
+            self.noise_floor = 0.9 * self.noise_floor + 0.1 * rms
+        else:
+            self.noise_floor = 0.999 * self.noise_floor + 0.001 * rms
+
+        voiced = rms > max(self.noise_floor * VOICE_ACTIVITY_RATIO, PROSODY_MIN_ENERGY)
+        if voiced:
+            self.voiced_frames += 1
+            self.max_peak = max(self.max_peak, peak)
+            if peak >= VOICE_TILT_INDICATORS['amplitude']['threshold']:
+                self.loud_frames += 1
+            if self.track_pitch:
+                self._update_pitch(frame)
+            if self.current_start is None:
+                self.current_start = t
+            self.last_voiced = t + self.frame_seconds
+        elif self.current_start is not None and t - self.last_voiced > SPEECH_HANGOVER_SECONDS:
+            self._close_interval()
+
+        # Count an energy peak as a syllable once the envelope falls back well below it
+        self.envelope = 0.6 * self.envelope + 0.4 * rms
+        if self.rising:
+            if self.envelope > self.last_peak:
+                self.last_peak = self.envelope
+            elif self.envelope < 0.75 * self.last_peak:
+                if self.last_peak > max(self.noise_floor * VOICE_ACTIVITY_RATIO, PROSODY_MIN_ENERGY):
+                    self.syllables += 1
+                self.rising = False
+                self.last_valley = self.envelope
+        elif self.envelope < self.last_valley:
+            self.last_valley = self.envelope
+        elif self.envelope > 1.3 * self.last_valley + 1e-4:
+            self.rising = True
+            self.last_peak = self.envelope
+
+    def _update_pitch(self, frame):
+        """Autocorrelation pitch estimate for one voiced frame"""
+        if len(frame) <= self.max_lag:
+            return
+        frame = frame - frame.mean()
+        corr = np.correlate(frame, frame, mode='full')[len(frame) - 1:]
+        if corr[0] <= 0:
+            return
+        lags = corr[self.min_lag:self.max_lag]
+        best = int(np.argmax(lags))
+        # Weakly periodic frames (noise, fricatives) don't give a usable pitch
+        if lags[best] < PITCH_MIN_CORRELATION * corr[0]:
+            return
+
+        semitones = 12 * np.log2(self.sample_rate / (best + self.min_lag) / 440.0)
+        self.pitch_count += 1
+        delta = semitones - self.pitch_mean
+        self.pitch_mean += delta / self.pitch_count
+        self.pitch_m2 += delta * (semitones - self.pitch_mean)
+
+    def _close_interval(self):
+        if self.last_voiced - self.current_start >= MIN_SPEECH_SECONDS:
+            self.intervals.append((self.current_start, self.last_voiced))
+        self.current_start = None
+
+    def features(self):
+        """Summary of the frames seen so far"""
+        if self.current_start is not None:
+            self._close_interval()
+        speech_seconds = self.voiced_frames * self.frame_seconds
+        # Rate is over whole speech intervals - energy dips between syllables aren't voiced frames
+        talking_seconds = sum(end - start for start, end in self.intervals)
+        return {
+            "duration": self.frame_index * self.frame_seconds,
+            "speech_seconds": speech_seconds,
+            "peak_amplitude": self.max_peak,
+            "loud_seconds": self.loud_frames * self.frame_seconds,
+            "syllables": self.syllables,
+            "speech_rate": self.syllables / talking_seconds if talking_seconds >= 1 else 0.0,
+            "intervals": list(self.intervals),
+            "noise_floor": self.noise_floor,
+            "pitch_mean_hz": 440.0 * 2 ** (self.pitch_mean / 12) if self.pitch_count else 0.0,
+            "pitch_std_semitones": (self.pitch_m2 / (self.pitch_count - 1)) ** 0.5 if self.pitch_count > 1 else 0.0,
+        }
+
+def extract_clip_features(samples, sample_rate, noise_floor=None, track_pitch=False):
+    """Stream a whole clip through an extractor frame by frame"""
+    extractor = StreamingProsodyExtractor(sample_rate, noise_floor=noise_floor, track_pitch=track_pitch)
+    frame_length = int(sample_rate * PROSODY_FRAME_MS / 1000)
+    for start in range(0, len(samples) - frame_length + 1, frame_length):
+        extractor.update(samples[start:start + frame_length])
+    return extractor.features()
+
+def score_clip_features(features):
+    """Tilt points from loudness and speaking rate, using VOICE_TILT_INDICATORS"""
+    score = 0
+    reasons = []
+
+    if features["loud_seconds"] >= LOUD_MIN_SECONDS:
+        score += VOICE_TILT_INDICATORS['amplitude']['score']
+        reasons.append("loud")
+
+    if features["speech_rate"] > VOICE_TILT_INDICATORS['speaking_rate']['threshold']:
+        score += VOICE_TILT_INDICATORS['speaking_rate']['score']
+        reasons.append("fast")
+
+    return score, reasons
+
+def score_acoustic_only(features):
+    """Rough tilt estimate standing in for the transcript score when ASR is skipped
+
+    Loudness, rate and interruptions are already scored by apply_prosody_tilt, so
+    this only adds what we'd otherwise get from the words: agitated pitch
+    movement and shouting.
+    """
+    score = 0
+    reasons = []
+
+    if features["speech_seconds"] < MIN_SPEECH_SECONDS:
+        return score, reasons
+
+    if features["pitch_std_semitones"] > DEGRADED_PITCH_STD_SEMITONES:
+        score += DEGRADED_PITCH_SCORE
+        reasons.append("agitated pitch")
+
+    if features["loud_seconds"] >= LOUD_MIN_SECONDS and features["pitch_mean_hz"] > SHOUT_PITCH_HZ:
+        score += DEGRADED_SHOUT_SCORE
+        reasons.append("shouting")
+
+    return score, reasons
+
+class OverlapTracker:
+    """Detects speakers in a guild talking over each other
+
+    Keeps recent voiced intervals per user on an absolute timeline. Whoever starts
+    speaking while someone else is already talking is counted as interrupting.
+    """
+    def __init__(self, window_seconds=INTERRUPTION_WINDOW_SECONDS):
+        self.window_seconds = window_seconds
+        self.intervals = {}  # user_id -> deque of (start, end)
+        self.interruptions = {}  # user_id -> deque of interruption times
+        self.lock = threading.Lock()
+
+    def _prune(self, now):
+        cutoff = now - self.window_seconds
+        for history in self.intervals.values():
+            while history and history[0][1] < cutoff:
+                history.popleft()
+        for times in self.interruptions.values():
+            while times and times[0] < cutoff:
+                times.popleft()
+
+    def add_intervals(self, user_id, intervals, now=None):
+        """Record a user's voiced intervals and return {user_id: interruption count} for users over the threshold"""
+        now = time.time() if now is None else now
+        with self.lock:
+            self._prune(now)
+            for start, end in intervals:
+                for other_id, other_intervals in self.intervals.items():
+                    if other_id == user_id:
+                        continue
+                    for other_start, other_end in other_intervals:
+                        if start < other_end and other_start < end:
+                            # Later starter is the one interrupting
+                            interrupter = user_id if start > other_start else other_id
+                            when = max(start, other_start)
+                            self.interruptions.setdefault(interrupter, deque()).append(when)
+                self.intervals.setdefault(user_id, deque()).append((start, end))
+
+            threshold = VOICE_TILT_INDICATORS['interruptions']['threshold']
+            flagged = {}
+            for interrupter, times in self.interruptions.items():
+                if len(times) >= threshold:
+                    flagged[interrupter] = len(times)
+                    times.clear()
+            return flagged
+
+# Per-guild overlap trackers and per-user noise floors carried between clips
+overlap_trackers = {}
+noise_floors = {}
+
+def apply_prosody_tilt(guild_id, user_id, features, start_time):
+    """Feed acoustic features into the tilt score alongside the text analysis"""
+    from utils.tilt import update_tilt_score
+
+    score, reasons = score_clip_features(features)
+    noise_floors[(guild_id, user_id)] = features["noise_floor"]
+    if score:
+        update_tilt_score(guild_id, user_id, score, trigger=f"[voice: {', '.join(reasons)}]")
+
+    tracker = overlap_trackers.setdefault(guild_id, OverlapTracker())
+    absolute = [(start_time + start, start_time + end) for start, end in features["intervals"]]
+    for interrupter, count in tracker.add_intervals(user_id, absolute, start_time + features["duration"]).items():
+        logger.info(f"User {interrupter} interrupted others {count} times")
+        update_tilt_score(guild_id, interrupter, VOICE_TILT_INDICATORS['interruptions']['score'],
+                          trigger="[voice: interrupting]")
+    return score
+
+def analyze_clip_prosody(guild_id, user_id, audio_path, recorded_at=None, track_pitch=False):
+    """Extract acoustic features from a clip, apply them to the tilt score and return them"""
+    from utils.audio_processing import extract_audio_features
+
+    features = extract_audio_features(audio_path, noise_floors.get((guild_id, user_id)), track_pitch)
+    recorded_at = time.time() if recorded_at is None else recorded_at
+    apply_prosody_tilt(guild_id, user_id, features, recorded_at - features["duration"])
+    return features
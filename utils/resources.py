@@ -0,0 +1,172 @@
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from config import CPU_BUDGET_ENABLED, CPU_CORES, CPU_AFFINITY, CPU_BUDGET, logger
+
+def available_cores():
+    """CPU ids this process is allowed to run on"""
+    try:
+        cores = sorted(os.sched_getaffinity(0))
+    except AttributeError:
+        cores = list(range(os.cpu_count() or 1))  # No affinity API outside Linux
+    return cores[:CPU_CORES] if CPU_CORES else cores
+
+def partition_cores(index, count, cores=None):
+    """The slice of cores for process `index` of `count`, e.g. one forked worker in a pool"""
+    cores = cores or available_cores()
+    per_process = max(1, len(cores) // count)
+    start = (index * per_process) % len(cores)
+    return cores[start:start + per_process]
+
+class ThreadBudget:
+    """Splits the CPU between inference engines so concurrent guilds don't oversubscribe it
+
+    Each engine gets a share of the cores, divided into slots of threads_per_call
+    threads. An inference call holds a slot for its duration, so however many
+    guild threads want to transcribe at once, an engine never runs more calls
+    than its slots. torch's thread count is one process-wide setting: while
+    slots are held it is the largest threads_per_call of the engines holding
+    them, and it goes back to what it was once the last slot is released.
+    """
+    def __init__(self, cores=None, budget=CPU_BUDGET, affinity=CPU_AFFINITY, enabled=CPU_BUDGET_ENABLED):
+        self.cores = list(cores) if cores else available_cores()
+        self.affinity = affinity
+        self.enabled = enabled
+        self.lock = threading.Lock()
+        self.engines = {}
+        self.executors = {}
+        self.active = {}  # engine -> slots held right now, for the process-wide torch thread count
+        self.idle_threads = None  # torch's thread count before the first held slot
+
+        total_share = sum(engine["share"] for engine in budget.values())
+        start = 0
+        for name, engine in budget.items():
+            count = max(1, round(len(self.cores) * engine["share"] / total_share))
+            # On small machines the last engines run out of cores and share the final ones
+            engine_cores = self.cores[start:start + count] or self.cores[-count:]
+            start += count
+            # Round to whole slots and spread the cores evenly over them so none sit idle
+            slots = max(1, round(len(engine_cores) / engine["threads_per_call"]))
+            threads = max(1, len(engine_cores) // slots)
+            self.engines[name] = {
+                "cores": engine_cores,
+                "threads": threads,
+                "slots": slots,
+                "semaphore": threading.BoundedSemaphore(slots),
+                "calls": 0,
+                "waits": 0,
+                "wait_seconds": 0.0,
+            }
+            logger.info(f"CPU budget: {name} gets cores {engine_cores} as {slots} x {threads} threads")
+
+    @contextmanager
+    def slot(self, engine):
+        """Hold one of an engine's slots while running inference on the calling thread"""
+        info = self.engines.get(engine)
+        if not self.enabled or info is None:
+            yield
+            return
+
+        start = time.perf_counter()
+        waited = not info["semaphore"].acquire(blocking=False)
+        if waited:
+            info["semaphore"].acquire()
+        bound, cores = False, None
+        try:
+            with self.lock:
+                info["calls"] += 1
+                if waited:
+                    info["waits"] += 1
+                    info["wait_seconds"] += time.perf_counter() - start
+                self._hold_threads(engine)
+                bound = True
+            cores = self._bind_thread(info)
+            yield
+        finally:
+            # The same thread may run another engine next, so don't leave it on this one's cores
+            if cores is not None:
+                self._restore_thread(cores)
+            if bound:
+                with self.lock:
+                    self._release_threads(engine)
+            info["semaphore"].release()
+
+    def _hold_threads(self, engine):
+        """Count a held slot and set torch's thread count for the engines now running (call with the lock held)"""
+        import torch
+
+        if not self.active:
+            self.idle_threads = torch.get_num_threads()
+        self.active[engine] = self.active.get(engine, 0) + 1
+        self._set_threads()
+
+    def _release_threads(self, engine):
+        """Undo _hold_threads, restoring torch's thread count once no slot is held (call with the lock held)"""
+        import torch
+
+        self.active[engine] -= 1
+        if not self.active[engine]:
+            del self.active[engine]
+        if self.active:
+            self._set_threads()
+        else:
+            torch.set_num_threads(self.idle_threads)
+
+    def _set_threads(self):
+        import torch
+
+        threads = max(self.engines[name]["threads"] for name in self.active)
+        if torch.get_num_threads() != threads:
+            torch.set_num_threads(threads)
+
+    def _bind_thread(self, info):
+        """Pin the calling thread to an engine's cores if affinity is on, returning the cores it had before"""
+        cores = None
+        if self.affinity:
+            try:
+                cores = os.sched_getaffinity(0)  # 0 is the calling thread on Linux
+                os.sched_setaffinity(0, info["cores"])
+            except (AttributeError, OSError) as e:
+                logger.error(f"Could not set CPU affinity: {e}")
+                self.affinity = False
+                cores = None
+        return cores
+
+    def _restore_thread(self, cores):
+        try:
+            os.sched_setaffinity(0, cores)
+        except OSError as e:
+            logger.error(f"Could not restore CPU affinity: {e}")
+
+    def executor(self, engine):
+        """A thread pool sized to an engine's slots, for running inference off the event loop"""
+        with self.lock:
+            if engine not in self.executors:
+                slots = self.engines[engine]["slots"] if engine in self.engines else 1
+                self.executors[engine] = ThreadPoolExecutor(max_workers=slots, thread_name_prefix=f"justff-{engine}")
+            return self.executors[engine]
+
+    def stats(self):
+        """Snapshot of each engine's allocation and how often calls had to wait for a slot"""
+        with self.lock:
+            return {
+                name: {key: value for key, value in info.items() if key != "semaphore"}
+                for name, info in self.engines.items()
+            }
+
+cpu_budget = None
+
+def get_cpu_budget():
+    """Get the process-wide CPU budget, creating it on first use"""
+    global cpu_budget
+    if cpu_budget is None:
+        cpu_budget = ThreadBudget()
+    return cpu_budget
+
+def set_cpu_budget(budget):
+    """Replace the CPU budget, e.g. with a slice of the cores in a forked worker"""
+    global cpu_budget
+    cpu_budget = budget
+    return budget
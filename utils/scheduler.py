@@ -0,0 +1,244 @@
+import threading
+import time
+from config import (ASR_TIERS, SENTIMENT_MODES, WHISPER_MODEL_SIZE, ADAPTIVE_TIERING, TARGET_LATENCY_SECONDS,
+                    TIER_LATENCY_SMOOTHING, TIER_UPGRADE_HEADROOM, TIER_MIN_DWELL_SECONDS,
+                    DEGRADED_MODE_ENABLED, DEGRADED_ENTER_LAG_SECONDS, DEGRADED_EXIT_LAG_SECONDS, logger)
+
+class AdaptiveTierScheduler:
+    """Picks an ASR model tier and sentiment mode per segment based on live load
+
+    Tiers are ordered fastest to most accurate. When the expected wait for a new
+    segment (queue depth x recent per-segment latency) goes over the target we
+    step down a tier; once there's plenty of headroom we step back up. At the
+    fastest ASR tier we also drop sentiment to keyword-only.
+    """
+    def __init__(self, asr_tiers=ASR_TIERS, sentiment_modes=SENTIMENT_MODES, default_tier=WHISPER_MODEL_SIZE,
+                 target_latency=TARGET_LATENCY_SECONDS, smoothing=TIER_LATENCY_SMOOTHING,
+                 upgrade_headroom=TIER_UPGRADE_HEADROOM, min_dwell=TIER_MIN_DWELL_SECONDS, enabled=ADAPTIVE_TIERING):
+        self.asr_tiers = list(asr_tiers)
+        self.sentiment_modes = list(sentiment_modes)  # Most accurate first
+        self.target_latency = target_latency
+        self.smoothing = smoothing
+        self.upgrade_headroom = upgrade_headroom
+        self.min_dwell = min_dwell
+        self.enabled = enabled
+        self.lock = threading.Lock()
+
+        self.asr_index = self.asr_tiers.index(default_tier) if default_tier in self.asr_tiers else 0
+        self.sentiment_index = 0
+        self.latency = {}  # (stage, tier) -> smoothed seconds per segment
+        self.last_switch = time.monotonic()
+
+        self.switch_count = 0
+        self.switches = []  # Recent (timestamp, from, to, reason)
+        self.time_in_tier = {}  # "asr_tier/sentiment_mode" -> seconds spent there
+        self.segments_in_tier = {}  # "asr_tier/sentiment_mode" -> segments processed there
+
+    @property
+    def current(self):
+        return self.asr_tiers[self.asr_index], self.sentiment_modes[self.sentiment_index]
+
+    def _tier_key(self):
+        asr_tier, sentiment_mode = self.current
+        return f"{asr_tier}/{sentiment_mode}"
+
+    def record_latency(self, stage, tier, seconds):
+        """Fold a measured per-stage latency into the moving average"""
+        with self.lock:
+            key = (stage, tier)
+            previous = self.latency.get(key)
+            self.latency[key] = seconds if previous is None else (
+                self.smoothing * seconds + (1 - self.smoothing) * previous
+            )
+
+    def expected_segment_latency(self):
+        """Smoothed seconds to process one segment at the current tier"""
+        asr_tier, sentiment_mode = self.current
+        return self.latency.get(("asr", asr_tier), 0) + self.latency.get(("sentiment", sentiment_mode), 0)
+
+    def choose(self, queue_depth):
+        """Pick (asr_tier, sentiment_mode) for the next segment given how many are waiting"""
+        with self.lock:
+            now = time.monotonic()
+            expected_wait = (queue_depth + 1) * self.expected_segment_latency()
+
+            # Don't flap between tiers on every segment
+            if self.enabled and now - self.last_switch >= self.min_dwell:
+                if expected_wait > self.target_latency:
+                    self._step_down(now, expected_wait)
+                elif expected_wait < self.target_latency * self.upgrade_headroom:
+                    self._step_up(now, expected_wait)
+
+            key = self._tier_key()
+            self.segments_in_tier[key] = self.segments_in_tier.get(key, 0) + 1
+            return self.current
+
+    def _step_down(self, now, expected_wait):
+        if self.asr_index > 0:
+            self._switch(now, self.asr_index - 1, self.sentiment_index, expected_wait)
+        elif self.sentiment_index < len(self.sentiment_modes) - 1:
+            self._switch(now, self.asr_index, self.sentiment_index + 1, expected_wait)
+
+    def _step_up(self, now, expected_wait):
+        # Restore sentiment before ASR accuracy, mirroring the order we gave them up
+        if self.sentiment_index > 0:
+            self._switch(now, self.asr_index, self.sentiment_index - 1, expected_wait)
+        elif self.asr_index < len(self.asr_tiers) - 1:
+            # Only upgrade once the slower tier is actually loaded
+            from utils.speech import get_whisper_model, request_whisper_model
+            next_tier = self.asr_tiers[self.asr_index + 1]
+            if get_whisper_model(next_tier) is None:
+                request_whisper_model(next_tier)
+                return
+            self._switch(now, self.asr_index + 1, self.sentiment_index, expected_wait)
+
+    def _switch(self, now, asr_index, sentiment_index, expected_wait):
+        previous = self._tier_key()
+        self.time_in_tier[previous] = self.time_in_tier.get(previous, 0) + now - self.last_switch
+        self.asr_index, self.sentiment_index = asr_index, sentiment_index
+        self.last_switch = now
+
+        reason = f"expected wait {expected_wait:.1f}s vs target {self.target_latency:.1f}s"
+        self.switch_count += 1
+        self.switches.append((time.time(), previous, self._tier_key(), reason))
+        self.switches = self.switches[-100:]
+        logger.info(f"Model tier switch: {previous} -> {self._tier_key()} ({reason})")
+
+    def stats(self):
+        """Snapshot of tier switches and time spent in each tier"""
+        with self.lock:
+            time_in_tier = dict(self.time_in_tier)
+            key = self._tier_key()
+            time_in_tier[key] = time_in_tier.get(key, 0) + time.monotonic() - self.last_switch
+            return {
+                "current": key,
+                "switch_count": self.switch_count,
+                "recent_switches": list(self.switches[-10:]),
+                "time_in_tier": time_in_tier,
+                "segments_in_tier": dict(self.segments_in_tier),
+                "latency": {f"{stage}:{tier}": seconds for (stage, tier), seconds in self.latency.items()},
+            }
+
+class DegradedModeSwitch:
+    """Decides when to skip ASR and score voice from acoustic features alone
+
+    Turns on when segments have been waiting longer than the enter threshold or
+    the Whisper model isn't loaded yet, and turns off once the queue has drained.
+    """
+    def __init__(self, enter_lag=DEGRADED_ENTER_LAG_SECONDS, exit_lag=DEGRADED_EXIT_LAG_SECONDS,
+                 enabled=DEGRADED_MODE_ENABLED):
+        self.enter_lag = enter_lag
+        self.exit_lag = exit_lag
+        self.enabled = enabled
+        self.active = False
+        self.lock = threading.Lock()
+        self.activations = 0
+        self.segments_degraded = 0
+        self.degraded_seconds = 0.0
+        self.activated_at = None
+
+    def update(self, lag, queue_depth=0):
+        """Update the mode from the current lag and return True if this segment should skip ASR"""
+        from utils.speech import models_loaded
+
+        with self.lock:
+            if not self.enabled:
+                return not models_loaded()
+
+            now = time.monotonic()
+            if not self.active and (lag > self.enter_lag or not models_loaded()):
+                self.active = True
+                self.activated_at = now
+                self.activations += 1
+                reason = "model still loading" if not models_loaded() else f"lag {lag:.1f}s"
+                logger.info(f"Entering degraded acoustic-only mode ({reason})")
+            elif self.active and models_loaded() and queue_depth == 0 and lag < self.exit_lag:
+                self.active = False
+                self.degraded_seconds += now - self.activated_at
+                logger.info(f"Leaving degraded mode after {now - self.activated_at:.1f}s")
+
+            if self.active:
+                self.segments_degraded += 1
+            return self.active
+
+    def stats(self):
+        """Snapshot of how often and how long we've run degraded"""
+        with self.lock:
+            degraded_seconds = self.degraded_seconds
+            if self.active:
+                degraded_seconds += time.monotonic() - self.activated_at
+            return {
+                "active": self.active,
+                "activations": self.activations,
+                "segments_degraded": self.segments_degraded,
+                "degraded_seconds": degraded_seconds,
+            }
+
+tier_scheduler = AdaptiveTierScheduler()
+degraded_mode = DegradedModeSwitch()
+
+def tier_model(asr_tier):
+    """The loaded model for a tier, or the default model (and tier) while it loads"""
+    from utils.speech import get_whisper_model, request_whisper_model, whisper_model
+
+    model = get_whisper_model(asr_tier)
+    if model is None:
+        # Tier isn't loaded yet - start loading it and use the default model meanwhile
+        request_whisper_model(asr_tier)
+        return whisper_model, WHISPER_MODEL_SIZE
+    return model, asr_tier
+
+def score_audio_segment(audio_path, guild=None, queue_depth=0, scheduler=tier_scheduler, packs=None, user_id=None,
+                        stream_key=None, languages=None):
+    """Transcribe and score a segment using the tier the scheduler picks for the current load
+
+    The speaker's language (see utils.language) picks the decoding language
+    and the sentiment model (languages replaces this process's language cache,
+    as on inference workers). With a stream_key the segment continues that
+    speaker's incremental transcription and only its new words are scored.
+    """
+    from utils.language import get_language_cache
+    from utils.speech import transcribe_audio, transcribe_incremental, analyze_text_for_tilt
+
+    asr_tier, sentiment_mode = scheduler.choose(queue_depth)
+    model, asr_tier = tier_model(asr_tier)
+    languages = languages or get_language_cache()
+
+    start = time.perf_counter()
+    if stream_key is not None:
+        _, corrected_text = transcribe_incremental(audio_path, stream_key, guild, model, user_id)
+    else:
+        _, corrected_text = transcribe_audio(audio_path, guild, model, user_id, languages)
+    scheduler.record_latency("asr", asr_tier, time.perf_counter() - start)
+
+    if not corrected_text:
+        return corrected_text, 0
+
+    start = time.perf_counter()
+    score = analyze_text_for_tilt(corrected_text.lower(), sentiment_mode, packs, languages.language(user_id))
+    scheduler.record_latency("sentiment", sentiment_mode, time.perf_counter() - start)
+    return corrected_text, score
+
+def score_quiet_streams(guild_id, guild=None, scheduler=tier_scheduler, packs=None, idle_seconds=None):
+    """Flush and score the held-back words of a guild's speakers who went quiet; returns [(user_id, text, score)]
+
+    idle_seconds=0 flushes every speaker, e.g. when leaving the channel.
+    """
+    from utils.language import get_language_cache
+    from utils.speech import flush_stream, analyze_text_for_tilt
+    from utils.streaming import get_audio_streams
+
+    results = []
+    for stream_key in get_audio_streams().idle_keys(idle_seconds):
+        if stream_key[0] != guild_id:
+            continue
+        user_id = stream_key[1]
+        # Not a new segment, so it doesn't count towards tier decisions
+        asr_tier, sentiment_mode = scheduler.current
+        model, _ = tier_model(asr_tier)
+        _, corrected_text = flush_stream(stream_key, guild, model, user_id)
+        if corrected_text:
+            language = get_language_cache().language(user_id)
+            results.append((user_id, corrected_text,
+                            analyze_text_for_tilt(corrected_text.lower(), sentiment_mode, packs, language)))
+    return results
@@ -1,26 +1,72 @@
+import os
+import threading
+import time
+import numpy as np
 import whisper
 import torch
+import torch.nn.functional as F
 from transformers import pipeline
-from config import WHISPER_MODEL_SIZE, SENTIMENT_MODEL, logger
+from utils.resources import get_cpu_budget
+from utils.weights import load_whisper
+from config import (WHISPER_MODEL_SIZE, WHISPER_MMAP_WEIGHTS, WHISPER_PROFILE, WHISPER_PROFILES, SENTIMENT_MODEL,
+                    SENTIMENT_MODELS, MULTILINGUAL_SENTIMENT_MODEL, LANGUAGE_DETECTION, DEFAULT_LANGUAGE,
+                    ADAPTIVE_TIERING, ASR_PRELOAD_TIERS, SHORT_UTTERANCE_FAST_PATH,
+                    SHORT_UTTERANCE_MAX_SECONDS, SHORT_UTTERANCE_PAD_SECONDS, MODEL_WARMUP, MODEL_WARMUP_PASSES,
+                    MODEL_OPTIMIZATION, TORCH_INTRA_OP_THREADS, TORCH_INTER_OP_THREADS, logger)
+
+whisper_model = None
+tilt_pipeline = None
+whisper_models = {}  # Loaded Whisper models by size, for adaptive tiering
+whisper_models_loading = set()
+whisper_models_lock = threading.Lock()
+sentiment_pipelines = {}  # Loaded sentiment pipelines for other languages, by model name
+sentiment_pipelines_loading = set()
+sentiment_pipelines_failed = set()  # Not retried - the language falls back to keywords
+sentiment_pipelines_lock = threading.Lock()
+
+# Chat-like lines of different lengths so the tokenizer and padding paths all get exercised
+WARMUP_TEXTS = [
+    "gg",
+    "nice shot, that was clean",
+    "why does nobody ever rotate when I ping, this is the third time this game and we keep losing fights",
+]
 
 # Initialize models
-def load_models():
-    """Load and initialize speech-to-text and sentiment analysis models"""
+def load_models(preload_in_background=True, warmup=MODEL_WARMUP):
+    """Load and initialize speech-to-text and sentiment analysis models
+
+    With warmup the models are only published (and models_loaded() turns True)
+    once synthetic inputs have been through them, so the first real clip and
+    message don't pay for allocator growth, tokenizer setup and kernel selection.
+    """
     global whisper_model, tilt_pipeline
     
+    configure_torch_threads()
+    
     # Load Whisper model
     logger.info(f"Loading Whisper {WHISPER_MODEL_SIZE} model...")
-    whisper_model = whisper.load_model(WHISPER_MODEL_SIZE)
+    model = load_whisper(WHISPER_MODEL_SIZE, WHISPER_MMAP_WEIGHTS)
+    if MODEL_OPTIMIZATION:
+        optimize_whisper_model(model, MODEL_OPTIMIZATION)
+    if warmup:
+        warmup_whisper_model(model)
+    whisper_models[WHISPER_MODEL_SIZE] = model
+    whisper_model = model
     logger.info(f"Whisper model loaded successfully")
     
+    # Keep faster tiers ready for when the adaptive scheduler needs them
+    # (a worker pool loads them up front so the forked workers share them too)
+    if ADAPTIVE_TIERING:
+        for size in ASR_PRELOAD_TIERS:
+            if preload_in_background:
+                request_whisper_model(size)
+            else:
+                load_whisper_model(size, warmup)
+    
     # Load sentiment analysis model
     logger.info("Loading sentiment analysis model for tilt detection...")
     try:
-        tilt_pipeline = pipeline(
-            "sentiment-analysis",
-            model=SENTIMENT_MODEL,
-            device=-1  # Use CPU
-        )
+        tilt_pipeline = create_sentiment_pipeline(SENTIMENT_MODEL, warmup)
         logger.info("Sentiment analysis model loaded successfully")
     except Exception as e:
         logger.error(f"Failed to load sentiment model: {e}")
@@ -29,32 +75,510 @@ def load_models():
         
     return whisper_model, tilt_pipeline
 
-# Load models
-whisper_model, tilt_pipeline = load_models()
+def configure_torch_threads(intra_op=TORCH_INTRA_OP_THREADS, inter_op=TORCH_INTER_OP_THREADS):
+    """Set torch's thread pools explicitly rather than inheriting whatever the environment gives us"""
+    if intra_op:
+        torch.set_num_threads(intra_op)
+    try:
+        torch.set_num_interop_threads(inter_op)
+    except RuntimeError:
+        pass  # Only settable once, before any inter-op work has run
+    logger.info(f"Torch using {torch.get_num_threads()} intra-op and {torch.get_num_interop_threads()} inter-op threads")
+
+def optimize_whisper_model(model, method):
+    """Compile or trace the encoder blocks, where nearly all of the audio time goes
+
+    The decoder is left alone: its KV cache works through forward hooks that
+    neither tracing nor compiled graphs keep. Falls back to eager on failure.
+    """
+    blocks = model.encoder.blocks
+    try:
+        if method == "compile":
+            import torch._dynamo
+            # Fall back to eager per graph rather than failing a request if a kernel won't compile
+            torch._dynamo.config.suppress_errors = True
+            # dynamic=True because the short-utterance path encodes a different length every clip
+            optimized = [torch.compile(block, dynamic=True) for block in blocks]
+        elif method == "torchscript":
+            # Attention reads sequence lengths from the tensors, so one example length generalizes
+            example = torch.zeros(1, 100, model.dims.n_audio_state, device=model.device)
+            with torch.no_grad():
+                optimized = [torch.jit.freeze(torch.jit.trace(block.eval(), example, check_trace=False))
+                             for block in blocks]
+        else:
+            raise ValueError(f"Unknown model optimization '{method}'")
+    except Exception as e:
+        logger.error(f"Could not apply {method} to the Whisper encoder, running eager: {e}")
+        return model
+    
+    for index, block in enumerate(optimized):
+        blocks[index] = block
+    logger.info(f"Applied {method} to the Whisper encoder")
+    return model
+
+def synthetic_speech(seconds, sample_rate=whisper.audio.SAMPLE_RATE):
+    """A voiced, syllable-modulated tone with a little noise - enough to run every kernel Whisper uses"""
+    t = np.arange(int(seconds * sample_rate)) / sample_rate
+    pitch = 140 + 30 * np.sin(2 * np.pi * 0.5 * t)
+    phase = 2 * np.pi * np.cumsum(pitch) / sample_rate
+    voiced = sum(np.sin(harmonic * phase) / harmonic for harmonic in range(1, 6))
+    envelope = 0.5 + 0.5 * np.sin(2 * np.pi * 4 * t)
+    noise = np.random.default_rng(0).standard_normal(len(t))
+    return (0.1 * voiced * envelope + 0.005 * noise).astype(np.float32)
+
+@torch.no_grad()
+def warmup_whisper_model(model, passes=MODEL_WARMUP_PASSES):
+    """Run the short-utterance and padded paths on synthetic audio"""
+    from utils.text_analysis import build_vocabulary_prompt
+    
+    start = time.perf_counter()
+    prompt = build_vocabulary_prompt()
+    short = synthetic_speech(2.0)
+    padded = synthetic_speech(SHORT_UTTERANCE_MAX_SECONDS + 2.0)
+    for _ in range(passes):
+        if SHORT_UTTERANCE_FAST_PATH:
+            transcribe_short(short, model=model, initial_prompt=prompt)
+        run_whisper(padded, model=model, initial_prompt=prompt)
+    logger.info(f"Whisper warmup took {time.perf_counter() - start:.1f}s")
+
+def create_sentiment_pipeline(name, warmup=MODEL_WARMUP):
+    """Build a CPU sentiment pipeline, warmed before it's returned if requested"""
+    sentiment = pipeline(
+        "sentiment-analysis",
+        model=name,
+        device=-1  # Use CPU
+    )
+    if warmup:
+        warmup_sentiment_pipeline(sentiment)
+    return sentiment
+
+def warmup_sentiment_pipeline(sentiment, passes=MODEL_WARMUP_PASSES):
+    """Run chat-like text of a few lengths through the sentiment pipeline"""
+    start = time.perf_counter()
+    for _ in range(passes):
+        for text in WARMUP_TEXTS:
+            sentiment(text)
+    logger.info(f"Sentiment warmup took {time.perf_counter() - start:.1f}s")
+
+def warmup_models():
+    """Warm every loaded model, e.g. in a worker forked from a parent that skipped warmup"""
+    for model in list(whisper_models.values()):
+        warmup_whisper_model(model)
+    for sentiment in [tilt_pipeline] + list(sentiment_pipelines.values()):
+        if sentiment is not None:
+            warmup_sentiment_pipeline(sentiment)
+
+def load_models_in_background():
+    """Load models on a background thread so the bot can come up immediately
+
+    Voice is scored from acoustics alone (degraded mode) until Whisper is ready,
+    and text uses keyword analysis until the sentiment model is ready.
+    """
+    thread = threading.Thread(target=load_models, daemon=True)
+    thread.start()
+    return thread
+
+def models_loaded():
+    """Check whether the speech-to-text model is ready for use"""
+    return whisper_model is not None
+
+def get_whisper_model(size):
+    """Get a loaded Whisper model by size, or None if it isn't loaded yet"""
+    return whisper_models.get(size)
+
+def load_whisper_model(size, warmup=MODEL_WARMUP):
+    """Load a Whisper model tier (blocking) and keep it for reuse"""
+    with whisper_models_lock:
+        if size in whisper_models:
+            return whisper_models[size]
+    
+    logger.info(f"Loading Whisper {size} model tier...")
+    model = load_whisper(size, WHISPER_MMAP_WEIGHTS)
+    if MODEL_OPTIMIZATION:
+        optimize_whisper_model(model, MODEL_OPTIMIZATION)
+    # Warm before publishing so the scheduler never switches onto a cold tier
+    if warmup:
+        warmup_whisper_model(model)
+    
+    with whisper_models_lock:
+        whisper_models.setdefault(size, model)
+        whisper_models_loading.discard(size)
+    logger.info(f"Whisper {size} model tier loaded")
+    return whisper_models[size]
+
+def request_whisper_model(size):
+    """Start loading a Whisper model tier in the background if it isn't loaded or loading"""
+    with whisper_models_lock:
+        if size in whisper_models or size in whisper_models_loading:
+            return
+        whisper_models_loading.add(size)
+    
+    def load():
+        try:
+            load_whisper_model(size)
+        except Exception as e:
+            logger.error(f"Failed to load Whisper {size} model tier: {e}")
+            with whisper_models_lock:
+                whisper_models_loading.discard(size)
+    
+    threading.Thread(target=load, daemon=True).start()
+
+def get_sentiment_pipeline(language=DEFAULT_LANGUAGE):
+    """The sentiment pipeline for a language, or None if it isn't loaded (its load is started in the background)"""
+    name = SENTIMENT_MODELS.get(language, MULTILINGUAL_SENTIMENT_MODEL)
+    if name == SENTIMENT_MODEL:
+        return tilt_pipeline
+    
+    with sentiment_pipelines_lock:
+        if name in sentiment_pipelines:
+            return sentiment_pipelines[name]
+        if name in sentiment_pipelines_loading or name in sentiment_pipelines_failed:
+            return None
+        sentiment_pipelines_loading.add(name)
+    
+    def load():
+        logger.info(f"Loading sentiment model {name} for {language} speakers...")
+        try:
+            sentiment = create_sentiment_pipeline(name)
+        except Exception as e:
+            logger.error(f"Failed to load sentiment model {name}, using keywords for {language}: {e}")
+            sentiment = None
+        with sentiment_pipelines_lock:
+            if sentiment is None:
+                sentiment_pipelines_failed.add(name)
+            else:
+                sentiment_pipelines[name] = sentiment
+            sentiment_pipelines_loading.discard(name)
+    
+    threading.Thread(target=load, daemon=True).start()
+    return None
+
+def fits_fast_path(audio, fast_path=SHORT_UTTERANCE_FAST_PATH, profile=WHISPER_PROFILE):
+    """Whether a clip (16kHz float samples) goes through the short-utterance encoder"""
+    return (fast_path and WHISPER_PROFILES[profile]["fast_path"]
+            and len(audio) <= SHORT_UTTERANCE_MAX_SECONDS * whisper.audio.SAMPLE_RATE)
+
+def run_whisper(audio_path, language="en", fast_path=SHORT_UTTERANCE_FAST_PATH, model=None,
+                profile=WHISPER_PROFILE, initial_prompt=None):
+    """Run Whisper on a clip (a path or 16kHz float samples), using the short-utterance fast path when it applies"""
+    model = model or whisper_model
+    options = WHISPER_PROFILES[profile]
+    if not options["initial_prompt"]:
+        initial_prompt = None
+    audio = whisper.load_audio(audio_path) if isinstance(audio_path, str) else audio_path
+    
+    if fits_fast_path(audio, fast_path, profile):
+        return transcribe_short(audio, language, model, initial_prompt)
+    
+    result = model.transcribe(
+        audio, 
+        language=language,
+        temperature=options["temperature"],
+        condition_on_previous_text=options["condition_on_previous_text"],
+        initial_prompt=initial_prompt,
+        word_timestamps=options["word_timestamps"],
+        fp16=False,  # Explicitly disable FP16
+        **beam_options(options)
+    )
+    return result["text"]
+
+def beam_options(options):
+    """A profile's beam search settings as transcribe() keyword arguments"""
+    decode_options = {}
+    if options["beam_size"]:
+        decode_options["beam_size"] = options["beam_size"]
+    if options["best_of"]:
+        decode_options["best_of"] = options["best_of"]
+    return decode_options
+
+def transcribe_words(audio, language="en", model=None, profile=WHISPER_PROFILE, initial_prompt=None):
+    """Transcribe 16kHz float samples with word timestamps; returns [(word, start, end)] in seconds into the audio
+
+    Always the padded transcribe - the short-utterance path has no timestamps.
+    """
+    model = model or whisper_model
+    options = WHISPER_PROFILES[profile]
+    result = model.transcribe(
+        audio,
+        language=language,
+        temperature=options["temperature"],
+        condition_on_previous_text=False,  # One window per call; earlier text comes in through the prompt
+        initial_prompt=initial_prompt if options["initial_prompt"] else None,
+        word_timestamps=True,
+        fp16=False,
+        **beam_options(options)
+    )
+    return [(word["word"], word["start"], word["end"])
+            for segment in result["segments"] for word in segment.get("words", [])]
 
-def analyze_text_for_tilt(text):
-    """Analyze text for signs of tilt or positive statements"""
+def encode_frames(model, mel):
+    """Run the Whisper encoder on a mel spectrogram shorter than the 30 second window
+
+    Mirrors AudioEncoder.forward but only uses the positional embeddings for the
+    frames we have, so a 2 second clip costs ~1/15th of a padded 30 second pass.
+    """
+    encoder = model.encoder
+    x = F.gelu(encoder.conv1(mel))
+    x = F.gelu(encoder.conv2(x))
+    x = x.permute(0, 2, 1)
+    x = (x + encoder.positional_embedding[:x.shape[1]]).to(x.dtype)
+    for block in encoder.blocks:
+        x = block(x)
+    return encoder.ln_post(x)
+
+def encode_short(audio, model):
+    """Encode a short clip without padding it to Whisper's 30 second window; returns (audio features, mel frames)"""
+    # Pad with a little silence - the encoder was trained on padded windows and
+    # hallucinates less with some trailing quiet after the speech
+    pad_samples = int(SHORT_UTTERANCE_PAD_SECONDS * whisper.audio.SAMPLE_RATE)
+    audio = torch.from_numpy(audio) if not isinstance(audio, torch.Tensor) else audio
+    audio = F.pad(audio, (0, pad_samples))
+    mel = whisper.log_mel_spectrogram(audio, model.dims.n_mels)
+    
+    # conv2 has stride 2, so keep an even number of frames within the model's window
+    n_frames = min(mel.shape[-1] - mel.shape[-1] % 2, whisper.audio.N_FRAMES)
+    mel = mel[:, :n_frames].unsqueeze(0).to(model.device)
+    return encode_frames(model, mel), n_frames
+
+@torch.no_grad()
+def transcribe_short(audio, language="en", model=None, initial_prompt=None):
+    """Greedy-decode a short clip without padding it to Whisper's 30 second window"""
+    model = model or whisper_model
+    return decode_short(model, *encode_short(audio, model), language, initial_prompt)
+
+def decode_short(model, audio_features, n_frames, language="en", initial_prompt=None):
+    """Greedy-decode encoder output from encode_short"""
+    tokenizer = whisper.tokenizer.get_tokenizer(
+        model.is_multilingual,
+        num_languages=model.num_languages,
+        language=language,
+        task="transcribe"
+    )
+    initial = list(tokenizer.sot_sequence_including_notimestamps)
+    if initial_prompt:
+        # Same layout whisper.transcribe uses: <|startofprev|> prompt tokens, then the SOT sequence
+        prompt_tokens = tokenizer.encode(" " + initial_prompt.strip())
+        initial = [tokenizer.sot_prev] + prompt_tokens[-(model.dims.n_text_ctx // 2 - 1):] + initial
+    tokens = torch.tensor([initial], device=model.device)
+    
+    # Short clips never need many tokens; cap generously relative to audio length
+    max_tokens = min(model.dims.n_text_ctx // 2, 16 + n_frames // 10)
+    
+    kv_cache, hooks = model.install_kv_cache_hooks()
+    try:
+        for _ in range(max_tokens):
+            step_tokens = tokens if not kv_cache else tokens[:, -1:]
+            logits = model.decoder(step_tokens, audio_features, kv_cache=kv_cache)[:, -1]
+            
+            # No timestamps in this mode, and never emit another start-of-transcript token
+            logits[:, tokenizer.timestamp_begin:] = -float("inf")
+            logits[:, tokenizer.sot] = -float("inf")
+            
+            next_token = logits.argmax(dim=-1, keepdim=True)
+            tokens = torch.cat([tokens, next_token], dim=-1)
+            if next_token.item() == tokenizer.eot:
+                break
+    finally:
+        for hook in hooks:
+            hook.remove()
+    
+    text_tokens = [token for token in tokens[0, len(initial):].tolist() if token < tokenizer.eot]
+    return tokenizer.decode(text_tokens)
+
+def language_probabilities(model, audio_features):
+    """Whisper's language distribution for encoded audio - one decoder step from the start-of-transcript token"""
+    tokenizer = whisper.tokenizer.get_tokenizer(model.is_multilingual, num_languages=model.num_languages)
+    tokens = torch.tensor([[tokenizer.sot]], device=model.device)
+    logits = model.decoder(tokens, audio_features)[0, -1]
+    probabilities = logits[list(tokenizer.all_language_tokens)].softmax(dim=-1).tolist()
+    return dict(zip(tokenizer.all_language_codes, probabilities))
+
+@torch.no_grad()
+def detect_language(audio, model=None):
+    """Language probabilities for 16kHz float samples, from the unpadded encoder (first 30 seconds at most)"""
+    model = model or whisper_model
+    audio_features, _ = encode_short(audio, model)
+    return language_probabilities(model, audio_features)
+
+@torch.no_grad()
+def transcribe_detecting_language(audio_path, pick_language=None, model=None, profile=WHISPER_PROFILE,
+                                  initial_prompt=None, fast_path=SHORT_UTTERANCE_FAST_PATH):
+    """Detect a clip's language, then transcribe it; returns (text, language probabilities)
+
+    pick_language(probabilities) chooses the decoding language (the clip's most
+    likely one by default), e.g. from a speaker's running average. Short clips
+    share one encoder pass between detection and decoding, so detecting costs a
+    single decoder step; longer ones encode their first 30 seconds once more.
+    """
+    model = model or whisper_model
+    audio = whisper.load_audio(audio_path) if isinstance(audio_path, str) else audio_path
+    
+    if fits_fast_path(audio, fast_path, profile):
+        audio_features, n_frames = encode_short(audio, model)
+    else:
+        mel = whisper.log_mel_spectrogram(whisper.pad_or_trim(audio), model.dims.n_mels)
+        audio_features = model.embed_audio(mel.unsqueeze(0).to(model.device))
+    probabilities = language_probabilities(model, audio_features)
+    language = pick_language(probabilities) if pick_language else max(probabilities, key=probabilities.get)
+    
+    if fits_fast_path(audio, fast_path, profile):
+        if not WHISPER_PROFILES[profile]["initial_prompt"]:
+            initial_prompt = None
+        return decode_short(model, audio_features, n_frames, language, initial_prompt), probabilities
+    return run_whisper(audio, language, fast_path, model, profile, initial_prompt), probabilities
+
+def transcribe_audio(audio_path, guild=None, model=None, user_id=None, languages=None):
+    """Transcribe an audio file and apply gaming term and username corrections
+
+    With a user_id the clip is decoded in that speaker's cached language,
+    detecting it first while the speaker is new or due a recheck. languages
+    replaces the process's LanguageCache, e.g. with a RoutedLanguage on workers.
+    """
+    from utils.audio_processing import preprocess_audio
+    from utils.language import get_language_cache
+    from utils.text_analysis import correct_transcript, build_vocabulary_prompt
+    
+    # Preprocess the audio
+    processed_path = f"{audio_path}_processed.wav"
+    processed_path = preprocess_audio(audio_path, processed_path)
+    
+    try:
+        # Use Whisper to transcribe the audio, within Whisper's share of the CPU
+        prompt = build_vocabulary_prompt(guild)
+        model = model or whisper_model
+        languages = languages or get_language_cache()
+        language, detect = DEFAULT_LANGUAGE, False
+        if LANGUAGE_DETECTION and model.is_multilingual:
+            language, detect = languages.route(user_id)
+        with get_cpu_budget().slot("whisper"):
+            if detect:
+                transcription, _ = transcribe_detecting_language(
+                    processed_path, lambda probabilities: languages.observe(user_id, probabilities),
+                    model=model, initial_prompt=prompt)
+                language = languages.language(user_id)
+            else:
+                transcription = run_whisper(processed_path, language, model=model, initial_prompt=prompt)
+            transcription = transcription.strip()
+        if not transcription:
+            return "", ""
+        
+        # Correct gaming terms and member names
+        corrected_text = correct_transcript(transcription, guild, language)
+        
+        logger.info(f"Transcribed: {transcription}")
+        logger.info(f"Corrected: {corrected_text}")
+        return transcription, corrected_text
+    finally:
+        # Clean up the preprocessed file, the caller owns the original
+        if processed_path != audio_path:
+            try:
+                os.unlink(processed_path)
+            except Exception as e:
+                logger.error(f"Error cleaning up temp files: {e}")
+
+def window_transcriber(guild=None, model=None, user_id=None):
+    """transcribe_words for a speaker's stream windows: their language, and the vocabulary prompt plus recent text"""
+    from utils.language import get_language_cache
+    from utils.text_analysis import build_vocabulary_prompt
+    
+    prompt = build_vocabulary_prompt(guild)
+    model = model or whisper_model
+    
+    def transcribe(window, context):
+        language = DEFAULT_LANGUAGE
+        if LANGUAGE_DETECTION and model.is_multilingual:
+            language, detect = get_language_cache().route(user_id)
+            if detect:
+                language = get_language_cache().observe(user_id, detect_language(window, model))
+        # Recent text goes last - Whisper keeps the end of an over-long prompt
+        return transcribe_words(window, language, model, initial_prompt=f"{prompt} {context}".strip())
+    return transcribe
+
+def stream_language(model=None, user_id=None):
+    """The language window_transcriber decodes a speaker's stream in"""
+    from utils.language import get_language_cache
+
+    model = model or whisper_model
+    if LANGUAGE_DETECTION and model.is_multilingual:
+        return get_language_cache().language(user_id)
+    return DEFAULT_LANGUAGE
+
+def transcribe_incremental(audio_path, stream_key, guild=None, model=None, user_id=None):
+    """Transcribe a clip as the next window of a speaker's stream; returns (new text, corrected new text)
+
+    Only words that weren't already sent from the speaker's earlier windows
+    come back, and words at the very end may wait for the next clip (see
+    utils.streaming).
+    """
+    from utils.audio_processing import preprocess_audio
+    from utils.streaming import get_audio_streams
+    from utils.text_analysis import correct_transcript
+    
+    processed_path = f"{audio_path}_processed.wav"
+    processed_path = preprocess_audio(audio_path, processed_path)
+    
+    try:
+        audio = whisper.load_audio(processed_path)
+        with get_cpu_budget().slot("whisper"):
+            transcription = get_audio_streams().feed(stream_key, audio, window_transcriber(guild, model, user_id))
+        if not transcription:
+            return "", ""
+        
+        corrected_text = correct_transcript(transcription, guild, stream_language(model, user_id))
+        logger.info(f"Transcribed (incremental): {transcription}")
+        logger.info(f"Corrected: {corrected_text}")
+        return transcription, corrected_text
+    finally:
+        if processed_path != audio_path:
+            try:
+                os.unlink(processed_path)
+            except Exception as e:
+                logger.error(f"Error cleaning up temp files: {e}")
+
+def flush_stream(stream_key, guild=None, model=None, user_id=None):
+    """Transcribe the words a speaker's stream still holds back and end it; returns (text, corrected text)"""
+    from utils.streaming import get_audio_streams
+    from utils.text_analysis import correct_transcript
+    
+    with get_cpu_budget().slot("whisper"):
+        transcription = get_audio_streams().flush(stream_key, window_transcriber(guild, model, user_id))
+    if not transcription:
+        return "", ""
+    return transcription, correct_transcript(transcription, guild, stream_language(model, user_id))
+
+def analyze_text_for_tilt(text, mode="transformer", packs=None, language=DEFAULT_LANGUAGE):
+    """Analyze text for signs of tilt or positive statements, with the sentiment model for its language"""
     from utils.text_analysis import fallback_analyze_text_for_tilt
     
+    # Keyword-only mode is picked by the tier scheduler when we're falling behind
+    if mode == "keyword":
+        return fallback_analyze_text_for_tilt(text, packs, language)
+    
     # Fall back to keyword method if text is too short or LLM not available
-    if tilt_pipeline is None or len(text) < 5:
-        logger.info(f"Using keyword fallback for: '{text}' (LLM available: {tilt_pipeline is not None}, text length: {len(text)})")
-        return fallback_analyze_text_for_tilt(text)
+    sentiment = get_sentiment_pipeline(language)
+    if sentiment is None or len(text) < 5:
+        logger.info(f"Using keyword fallback for: '{text}' (LLM available: {sentiment is not None}, text length: {len(text)})")
+        return fallback_analyze_text_for_tilt(text, packs, language)
     
     try:
         # Use sentiment analysis to determine tilt or positivity
         logger.info(f"Sending to sentiment analyzer: '{text}'")
-        result = tilt_pipeline(text)[0]
+        with get_cpu_budget().slot("sentiment"):
+            result = sentiment(text)[0]
         logger.info(f"Sentiment analysis result: {result}")
         
         # Convert sentiment to tilt score (-20 to 20)
         # Negative sentiment = positive tilt score (increasing tilt)
         # Positive sentiment = negative tilt score (decreasing tilt)
-        if result['label'] == 'NEGATIVE':
+        # Multilingual models label in lowercase and add a neutral class
+        label = result['label'].upper()
+        if label == 'NEGATIVE':
             # Convert confidence score (0-1) to tilt score (0-20)
             tilt_score = int(result['score'] * 20)
             logger.info(f"Sentiment tilt analysis (negative): '{text}' -> Score: {tilt_score}")
             return tilt_score
+        elif label == 'NEUTRAL':
+            return 0
         else:
             # If positive sentiment, reduce tilt (negative score)
             tilt_reduction = -int(result['score'] * 15)  # Max 15 point reduction
@@ -63,4 +587,4 @@ def analyze_text_for_tilt(text):
             
     except Exception as e:
         logger.error(f"Error in sentiment analysis: {e}")
-        return fallback_analyze_text_for_tilt(text)
\ No newline at end of file
+        return fallback_analyze_text_for_tilt(text, packs, language)
\ No newline at end of file
@@ -0,0 +1,121 @@
+import threading
+import time
+import numpy as np
+from config import (STREAM_OVERLAP_SECONDS, STREAM_HOLDBACK_SECONDS, STREAM_MAX_TAIL_SECONDS, STREAM_CONTEXT_CHARS,
+                    STREAM_IDLE_SECONDS)
+
+SAMPLE_RATE = 16000  # Whisper's input rate
+TIMING_SLACK = 0.15  # Seconds Whisper's word timestamps can be out by
+
+class SpeakerStream:
+    """One speaker's audio tail and what has already been sent on from it
+
+    Times are seconds of this speaker's audio fed so far ("stream time"), so
+    windows line up however long the gaps between their clips were.
+    """
+    def __init__(self):
+        self.tail = np.zeros(0, dtype=np.float32)
+        self.position = 0.0  # Stream time at the end of the audio fed so far
+        self.committed_until = 0.0  # End of the last word sent on
+        self.last_word = None
+        self.context = ""  # Recent text, carried into the next window's prompt
+        self.last_fed = time.monotonic()
+
+class IncrementalTranscriber:
+    """Transcribes each speaker's clips as overlapping windows and emits only new words
+
+    Every window is the speaker's carried tail plus the new clip. Words are
+    placed in stream time from their timestamps: anything ending before the
+    last sent word is overlap already emitted, and words ending within the
+    hold-back at the window's end may be cut off, so they wait to be decoded
+    again with the next clip. The tail keeps the audio from the first held
+    word (and at least the overlap) for that. Streams that go quiet are found
+    with idle_keys and their held words decoded by flush.
+    """
+    def __init__(self, overlap=STREAM_OVERLAP_SECONDS, holdback=STREAM_HOLDBACK_SECONDS,
+                 max_tail=STREAM_MAX_TAIL_SECONDS, context_chars=STREAM_CONTEXT_CHARS,
+                 idle_seconds=STREAM_IDLE_SECONDS, sample_rate=SAMPLE_RATE):
+        self.overlap = overlap
+        self.holdback = holdback
+        self.max_tail = max_tail
+        self.context_chars = context_chars
+        self.idle_seconds = idle_seconds
+        self.sample_rate = sample_rate
+        self.streams = {}  # (guild_id, user_id) -> SpeakerStream
+        self.lock = threading.Lock()  # Guards the dict; each speaker's clips arrive on one guild thread
+
+    def feed(self, key, audio, transcribe_words):
+        """Add a clip of 16kHz float samples to a speaker's stream and return the newly settled text
+
+        transcribe_words(window, context) returns [(word, start, end)] with times
+        in seconds from the start of window; context is the speaker's recent text.
+        """
+        with self.lock:
+            stream = self.streams.get(key)
+            if stream is None:
+                stream = self.streams[key] = SpeakerStream()
+        stream.last_fed = time.monotonic()
+        window = np.concatenate([stream.tail, np.asarray(audio, dtype=np.float32)])
+        stream.position += len(audio) / self.sample_rate
+        return self._decode(stream, window, transcribe_words, final=False)
+
+    def flush(self, key, transcribe_words):
+        """Decode whatever a speaker still has held back, end their stream and return the text"""
+        with self.lock:
+            stream = self.streams.pop(key, None)
+        if stream is None or not len(stream.tail):
+            return ""
+        return self._decode(stream, stream.tail, transcribe_words, final=True)
+
+    def idle_keys(self, idle_seconds=None, now=None):
+        """Streams that haven't been fed for idle_seconds (0 for every stream)"""
+        idle_seconds = self.idle_seconds if idle_seconds is None else idle_seconds
+        now = time.monotonic() if now is None else now
+        with self.lock:
+            return [key for key, stream in self.streams.items() if now - stream.last_fed >= idle_seconds]
+
+    def _decode(self, stream, window, transcribe_words, final):
+        window_start = stream.position - len(window) / self.sample_rate
+        window_end = stream.position
+        words = transcribe_words(window, stream.context)
+
+        emitted, held_from = [], None
+        for word, start, end in words:
+            start, end = window_start + start, window_start + end
+            # Already sent from the previous window, or a sliver of a sent word where the tail cut into it
+            if (start + end) / 2 <= stream.committed_until:
+                continue
+            if start <= window_start + TIMING_SLACK and end <= stream.committed_until + TIMING_SLACK:
+                continue
+            if not emitted and normalize(word) == stream.last_word and start < stream.committed_until + TIMING_SLACK:
+                continue  # The last sent word again, re-timed just past the old boundary
+            if not final and end > window_end - self.holdback:
+                held_from = start
+                break
+            emitted.append(word)
+            stream.committed_until = end
+            stream.last_word = normalize(word)
+
+        # Carry the held words (and at least the overlap) into the next window
+        keep_from = window_end - self.overlap
+        if held_from is not None:
+            keep_from = min(keep_from, held_from - TIMING_SLACK)
+        keep_from = max(keep_from, window_end - self.max_tail, window_start)
+        stream.tail = window[int(round((keep_from - window_start) * self.sample_rate)):]
+
+        text = "".join(emitted).strip()
+        if text:
+            stream.context = (stream.context + " " + text)[-self.context_chars:].lstrip()
+        return text
+
+def normalize(word):
+    return word.strip().strip(".,!?;:\"'").lower()
+
+audio_streams = None
+
+def get_audio_streams():
+    """Get the process-wide incremental transcriber, creating it on first use"""
+    global audio_streams
+    if audio_streams is None:
+        audio_streams = IncrementalTranscriber()
+    return audio_streams
@@ -1,19 +1,16 @@
 import re
-from config import TILT_KEYWORDS, POSITIVE_KEYWORDS, logger
+import threading
+from collections import OrderedDict
+from config import (PROMPT_MAX_NAMES, PROMPT_MAX_CHARS, CORRECTION_NAME_MAX_ERROR, CORRECTION_NAME_CACHE_SIZE,
+                    DEFAULT_LANGUAGE, KEYWORD_LANGUAGES, logger)
+from utils.keywords import get_keyword_registry
+from utils.phonetic import CorrectionIndex, correct_with_indexes
 
-def fallback_analyze_text_for_tilt(text):
+def fallback_analyze_text_for_tilt(text, packs=None, language=DEFAULT_LANGUAGE):
     """Analyze text for signs of tilt or positivity using keywords"""
-    score_change = 0
-    
-    # Check for tilt keywords (increase tilt)
-    for pattern, value in TILT_KEYWORDS.items():
-        matches = re.findall(pattern, text, re.IGNORECASE)
-        score_change += len(matches) * value
-    
-    # Check for positive keywords (decrease tilt)
-    for pattern, value in POSITIVE_KEYWORDS.items():
-        matches = re.findall(pattern, text, re.IGNORECASE)
-        score_change -= len(matches) * value
+    # Tilt keywords increase the score and positive keywords reduce it, from the built-in
+    # keywords plus the guild's keyword packs - English words, so other languages only get the cues below
+    score_change = get_keyword_registry().matcher(packs).score(text) if language in KEYWORD_LANGUAGES else 0
     
     # Check for all caps (shouting) - only if the overall message isn't positive
     if score_change >= 0 and len(text) > 5 and text.isupper():
@@ -26,296 +23,309 @@ def fallback_analyze_text_for_tilt(text):
     # Cap the score change (both positive and negative)
     return max(-15, min(score_change, 20))
 
-def correct_gaming_terms(text):
-    """Apply corrections for commonly misrecognized gaming terms"""
-    # General Gaming Terms
-    GENERAL_GAMING_TERMS = {
-        "gank": "gank",
-        "inting": "inting",
-        "camping": "camping",
-        "smurf": "smurf",
-        "toxic": "toxic",
-        "lag": "lag",
-        "rage quit": "rage quit",
-        "afk": "afk", 
-        "gg": "gg",
-        "gg ez": "gg ez",
-        "clutch": "clutch",
-        "nerf": "nerf",
-        "buff": "buff",
-        "op": "op",
-        "meta": "meta",
-        "respawn": "respawn",
-        "cooldown": "cooldown",
-        "spawn kill": "spawn kill"
-    }
-    
-    # MOBA Terms (League of Legends, Dota 2)
-    MOBA_TERMS = {
-        "cs": "cs",
-        "last hit": "last hit",
-        "adc": "adc",
-        "jungle": "jungle",
-        "gank": "gank",
-        "leashing": "leashing",
-        "mid": "mid",
-        "top": "top",
-        "bot": "bot",
-        "support": "support",
-        "inting": "inting",
-        "feeding": "feeding",
-        "jungler": "jungler",
-        "ward": "ward",
-        "baron": "baron",
-        "drake": "drake",
-        "dragon": "dragon",
-        "herald": "herald",
-        "elder": "elder",
-        "inhibitor": "inhibitor",
-        "nexus": "nexus",
-        "turret": "turret",
-        "tower": "tower",
-        "minions": "minions",
-        "creeps": "creeps",
-        "lane phase": "lane phase",
-        "mid game": "mid game",
-        "late game": "late game",
-        "ult": "ult",
-        "ultimate": "ultimate",
-        "first blood": "first blood",
-        "penta": "penta",
-        "penta kill": "penta kill"
-    }
-    
-    # FPS Terms (CS:GO, Valorant, Call of Duty)
-    FPS_TERMS = {
-        "ace": "ace",
-        "headshot": "headshot",
-        "wallbang": "wallbang",
-        "camp": "camp",
-        "camping": "camping",
-        "flank": "flank",
-        "push": "push",
-        "rotate": "rotate",
-        "defuse": "defuse",
-        "plant": "plant",
-        "clutch": "clutch",
-        "scope": "scope",
-        "crosshair": "crosshair",
-        "spray": "spray",
-        "awp": "awp",
-        "awping": "awping",
-        "peek": "peek",
-        "strafe": "strafe",
-        "boost": "boost",
-        "drop": "drop",
-        "eco": "eco",
-        "frag": "frag",
-        "hold": "hold",
-        "lurk": "lurk",
-        "op": "op",
-        "operator": "operator",
-        "trade": "trade",
-        "spawn": "spawn",
-        "spawn kill": "spawn kill",
-        "wall hack": "wall hack"
-    }
-    
-    # Battle Royale Terms
-    BR_TERMS = {
-        "drop": "drop",
-        "hot drop": "hot drop",
-        "zone": "zone",
-        "circle": "circle",
-        "loot": "loot",
-        "third party": "third party",
-        "thirded": "thirded",
-        "shield": "shield",
-        "cracked": "cracked",
-        "one shot": "one shot",
-        "rotate": "rotate",
-        "push": "push",
-        "box": "box",
-        "death box": "death box",
-        "res": "res",
-        "revive": "revive",
-        "pick up": "pick up",
-        "ping": "ping",
-        "marked": "marked",
-        "knocked": "knocked"
-    }
-    
-    # Difference/Comparison Terms
-    DIFF_TERMS = {
-        "diff": "diff",
-        "gap": "gap",
-        "mid diff": "mid diff",
-        "top diff": "top diff",
-        "bot diff": "bot diff",
-        "jungle diff": "jungle diff",
-        "support diff": "support diff",
-        "skill issue": "skill issue",
-        "better player": "better player",
-        "outplayed": "outplayed"
-    }
-    
-    # Common Phrases/Expressions
-    EXPRESSIONS = {
-        "just ff": "just ff",
-        "surrender": "surrender",
-        "ff fifteen": "ff fifteen",
-        "ff at 15": "ff at 15",
-        "open mid": "open mid",
-        "trash talk": "trash talk",
-        "grief": "grief",
-        "griefing": "griefing",
-        "throwing": "throwing",
-        "winnable": "winnable",
-        "not winnable": "not winnable",
-        "report": "report",
-        "report for": "report for",
-        "broken champ": "broken champ",
-        "broken character": "broken character",
-        "lobby diff": "lobby diff",
-        "team diff": "team diff"
-    }
-    
-    # Common speech recognition mistakes
-    COMMON_MISTAKES = {
-        "see us": "cs",
-        "a dc": "adc",
-        "is he": "ez",
-        "easy": "ez",
-        "just have": "just ff",
-        "just have have": "just ff",
-        "medium": "mid lane",
-        "top playing": "top lane",
-        "bottom": "bot lane",
-        "supporting": "support",
-        "supporting role": "support",
-        "in the jungle": "jungle",
-        "middle": "mid",
-        "middle lane": "mid lane",
-        "bottom lane": "bot lane",
-        "report him": "report",
-        "reporter": "report her",
-        "gank me": "gank",
-        "ganking": "ganking",
-        "farming": "farming",
-        "feed": "feed",
-        "feeding": "feeding",
-        "he's feeding": "feeding",
-        "she's feeding": "feeding",
-        "they're feeding": "feeding",
-        "i'm feeding": "feeding",
-        "int": "int",
-        "inting": "inting",
-        "in ting": "inting",
-        "jungler": "jungler",
-        "dragons": "dragons",
-        "baron": "baron"
-    }
-    
-    # Combine all term dictionaries
-    ALL_TERMS = {}
-    ALL_TERMS.update(GENERAL_GAMING_TERMS)
-    ALL_TERMS.update(MOBA_TERMS)
-    ALL_TERMS.update(FPS_TERMS)
-    ALL_TERMS.update(BR_TERMS)
-    ALL_TERMS.update(DIFF_TERMS)
-    ALL_TERMS.update(EXPRESSIONS)
+# General Gaming Terms
+GENERAL_GAMING_TERMS = {
+    "gank": "gank",
+    "inting": "inting",
+    "camping": "camping",
+    "smurf": "smurf",
+    "toxic": "toxic",
+    "lag": "lag",
+    "rage quit": "rage quit",
+    "afk": "afk", 
+    "gg": "gg",
+    "gg ez": "gg ez",
+    "clutch": "clutch",
+    "nerf": "nerf",
+    "buff": "buff",
+    "op": "op",
+    "meta": "meta",
+    "respawn": "respawn",
+    "cooldown": "cooldown",
+    "spawn kill": "spawn kill"
+}
+
+# MOBA Terms (League of Legends, Dota 2)
+MOBA_TERMS = {
+    "cs": "cs",
+    "last hit": "last hit",
+    "adc": "adc",
+    "jungle": "jungle",
+    "gank": "gank",
+    "leashing": "leashing",
+    "mid": "mid",
+    "top": "top",
+    "bot": "bot",
+    "support": "support",
+    "inting": "inting",
+    "feeding": "feeding",
+    "jungler": "jungler",
+    "ward": "ward",
+    "baron": "baron",
+    "drake": "drake",
+    "dragon": "dragon",
+    "herald": "herald",
+    "elder": "elder",
+    "inhibitor": "inhibitor",
+    "nexus": "nexus",
+    "turret": "turret",
+    "tower": "tower",
+    "minions": "minions",
+    "creeps": "creeps",
+    "lane phase": "lane phase",
+    "mid game": "mid game",
+    "late game": "late game",
+    "ult": "ult",
+    "ultimate": "ultimate",
+    "first blood": "first blood",
+    "penta": "penta",
+    "penta kill": "penta kill"
+}
+
+# FPS Terms (CS:GO, Valorant, Call of Duty)
+FPS_TERMS = {
+    "ace": "ace",
+    "headshot": "headshot",
+    "wallbang": "wallbang",
+    "camp": "camp",
+    "camping": "camping",
+    "flank": "flank",
+    "push": "push",
+    "rotate": "rotate",
+    "defuse": "defuse",
+    "plant": "plant",
+    "clutch": "clutch",
+    "scope": "scope",
+    "crosshair": "crosshair",
+    "spray": "spray",
+    "awp": "awp",
+    "awping": "awping",
+    "peek": "peek",
+    "strafe": "strafe",
+    "boost": "boost",
+    "drop": "drop",
+    "eco": "eco",
+    "frag": "frag",
+    "hold": "hold",
+    "lurk": "lurk",
+    "op": "op",
+    "operator": "operator",
+    "trade": "trade",
+    "spawn": "spawn",
+    "spawn kill": "spawn kill",
+    "wall hack": "wall hack"
+}
+
+# Battle Royale Terms
+BR_TERMS = {
+    "drop": "drop",
+    "hot drop": "hot drop",
+    "zone": "zone",
+    "circle": "circle",
+    "loot": "loot",
+    "third party": "third party",
+    "thirded": "thirded",
+    "shield": "shield",
+    "cracked": "cracked",
+    "one shot": "one shot",
+    "rotate": "rotate",
+    "push": "push",
+    "box": "box",
+    "death box": "death box",
+    "res": "res",
+    "revive": "revive",
+    "pick up": "pick up",
+    "ping": "ping",
+    "marked": "marked",
+    "knocked": "knocked"
+}
+
+# Difference/Comparison Terms
+DIFF_TERMS = {
+    "diff": "diff",
+    "gap": "gap",
+    "mid diff": "mid diff",
+    "top diff": "top diff",
+    "bot diff": "bot diff",
+    "jungle diff": "jungle diff",
+    "support diff": "support diff",
+    "skill issue": "skill issue",
+    "better player": "better player",
+    "outplayed": "outplayed"
+}
+
+# Common Phrases/Expressions
+EXPRESSIONS = {
+    "just ff": "just ff",
+    "surrender": "surrender",
+    "ff fifteen": "ff fifteen",
+    "ff at 15": "ff at 15",
+    "open mid": "open mid",
+    "trash talk": "trash talk",
+    "grief": "grief",
+    "griefing": "griefing",
+    "throwing": "throwing",
+    "winnable": "winnable",
+    "not winnable": "not winnable",
+    "report": "report",
+    "report for": "report for",
+    "broken champ": "broken champ",
+    "broken character": "broken character",
+    "lobby diff": "lobby diff",
+    "team diff": "team diff"
+}
+
+# Common speech recognition mistakes
+COMMON_MISTAKES = {
+    "see us": "cs",
+    "a dc": "adc",
+    "is he": "ez",
+    "easy": "ez",
+    "just have": "just ff",
+    "just have have": "just ff",
+    "medium": "mid lane",
+    "top playing": "top lane",
+    "bottom": "bot lane",
+    "supporting": "support",
+    "supporting role": "support",
+    "in the jungle": "jungle",
+    "middle": "mid",
+    "middle lane": "mid lane",
+    "bottom lane": "bot lane",
+    "report him": "report",
+    "reporter": "report her",
+    "gank me": "gank",
+    "ganking": "ganking",
+    "farming": "farming",
+    "feed": "feed",
+    "feeding": "feeding",
+    "he's feeding": "feeding",
+    "she's feeding": "feeding",
+    "they're feeding": "feeding",
+    "i'm feeding": "feeding",
+    "int": "int",
+    "inting": "inting",
+    "in ting": "inting",
+    "jungler": "jungler",
+    "dragons": "dragons",
+    "baron": "baron"
+}
+
+# Combine all term dictionaries
+ALL_TERMS = {}
+ALL_TERMS.update(GENERAL_GAMING_TERMS)
+ALL_TERMS.update(MOBA_TERMS)
+ALL_TERMS.update(FPS_TERMS)
+ALL_TERMS.update(BR_TERMS)
+ALL_TERMS.update(DIFF_TERMS)
+ALL_TERMS.update(EXPRESSIONS)
+
+# Terms in the tables that Whisper already gets right, so they're left out of prompts
+COMMON_WORDS = {"top", "mid", "push", "hold", "drop", "box", "zone", "circle", "support", "tower", "report",
+                "rotate", "plant", "trade", "spawn", "peek", "camp", "camping", "ping", "shield", "marked"}
+
+def prompt_member_names(guild, limit=PROMPT_MAX_NAMES):
+    """Names worth priming Whisper with - the voice channel if we're in one, otherwise the guild"""
+    if not guild:
+        return []
     
-    corrected = text.lower()
+    voice_client = getattr(guild, "voice_client", None)
+    channel = getattr(voice_client, "channel", None)
+    members = channel.members if channel is not None else guild.members
     
-    # First apply regex for exact terms with word boundaries
-    for term, correction in ALL_TERMS.items():
-        # Use regex with word boundaries to replace whole words only
-        corrected = re.sub(r'\b' + re.escape(term) + r'\b', correction, corrected, flags=re.IGNORECASE)
+    names = []
+    for member in members:
+        if member.bot or member.display_name in names:
+            continue
+        names.append(member.display_name)
+        if len(names) >= limit:
+            break
+    return names
+
+def build_vocabulary_prompt(guild=None, max_chars=PROMPT_MAX_CHARS):
+    """Build a Whisper initial_prompt from the gaming term tables and channel member names"""
+    names = prompt_member_names(guild)
+    prompt = "Gaming voice chat"
+    if names:
+        prompt += " with " + ", ".join(names)
+    prompt += ". "
     
-    # Then handle common speech recognition mistakes (which may need more complex replacements)
+    # Fill the rest of the budget with jargon, skipping terms that are just common words
+    terms = []
+    for term in ALL_TERMS:
+        if term in terms or term in COMMON_WORDS:
+            continue
+        if len(prompt) + len(", ".join(terms + [term])) > max_chars:
+            break
+        terms.append(term)
+    return prompt + ", ".join(terms) + "."
+
+def build_term_index():
+    """Correction index over the gaming term tables and known Whisper mistakes"""
+    index = CorrectionIndex(same_initial=True)
     for wrong, right in COMMON_MISTAKES.items():
-        corrected = corrected.replace(wrong, right)
-    
-    return corrected
+        index.add(wrong, right, fuzzy=False)  # Letter names and mishearings don't sound like their spelling
+    for term, correction in ALL_TERMS.items():
+        index.add(term, correction, fuzzy=term not in COMMON_WORDS)
+    return index
+
+TERM_INDEX = build_term_index()
+name_indexes = OrderedDict()  # Member names -> CorrectionIndex, least recently used first
+name_indexes_lock = threading.Lock()
+
+def member_name_index(guild):
+    """Correction index over a guild's member names, cached by the names themselves
+
+    Keyed by names rather than guild ID so renames and joins rebuild it, and
+    worker snapshots of the same guild share one.
+    """
+    names = tuple(sorted(
+        (name, member.display_name)
+        for member in guild.members if not member.bot
+        for name in {member.name, member.display_name, member.nick} if name
+    ))
+    with name_indexes_lock:
+        index = name_indexes.get(names)
+        if index is not None:
+            name_indexes.move_to_end(names)
+            return index
+
+    index = CorrectionIndex(max_error=CORRECTION_NAME_MAX_ERROR, near_keys=True)
+    for name, display_name in names:
+        index.add(name, display_name)
+    with name_indexes_lock:
+        name_indexes[names] = index
+        while len(name_indexes) > CORRECTION_NAME_CACHE_SIZE:
+            name_indexes.popitem(last=False)
+    return index
+
+def correct_transcript(text, guild=None, language=DEFAULT_LANGUAGE):
+    """Correct gaming terms and member names in one pass over the transcript
+
+    Each word (or run of up to a few words) is looked up exactly, then by
+    phonetic key, in the member names first and then the gaming terms. The
+    gaming terms are English, so transcripts in other languages only get
+    their member names corrected - "fixing" their words into English terms
+    would make false keyword hits.
+    """
+    indexes = [TERM_INDEX] if language in KEYWORD_LANGUAGES else []
+    if guild:
+        try:
+            indexes.insert(0, member_name_index(guild))
+        except Exception as e:
+            logger.error(f"Error indexing member names: {e}")
+    return correct_with_indexes(text, indexes)
+
+def correct_gaming_terms(text):
+    """Apply corrections for commonly misrecognized gaming terms"""
+    return correct_with_indexes(text, [TERM_INDEX])
 
 def correct_usernames(text, guild):
     """Correct usernames/gamer tags in transcribed text"""
     if not guild:
         return text
-        
-    corrected = text
-    
     try:
-        # Build a dictionary of possible name variations for each member
-        username_variations = {}
-        
-        for member in guild.members:
-            # Skip bots
-            if member.bot:
-                continue
-                
-            # Add display name, username, and nickname
-            variations = [
-                member.name.lower(),
-                member.display_name.lower()
-            ]
-            
-            # Add nickname if it exists and is different
-            if member.nick and member.nick.lower() not in variations:
-                variations.append(member.nick.lower())
-                
-            # Add common speech recognition errors for each name
-            for name in list(variations):  # Create a copy of the list to modify
-                # Add versions without spaces
-                if ' ' in name:
-                    variations.append(name.replace(' ', ''))
-                
-                # Add phonetic variations (common speech-to-text errors)
-                variations.extend(generate_name_variations(name))
-            
-            # Map all variations to the correct display name
-            for variation in variations:
-                username_variations[variation] = member.display_name
-        
-        # Replace variations with correct names using word boundary regex
-        for variation, correct_name in username_variations.items():
-            if len(variation) > 2:  # Ignore very short names to avoid false positives
-                corrected = re.sub(
-                    r'\b' + re.escape(variation) + r'\b', 
-                    correct_name, 
-                    corrected, 
-                    flags=re.IGNORECASE
-                )
-                
-        return corrected
-        
+        return correct_with_indexes(text, [member_name_index(guild)])
     except Exception as e:
         logger.error(f"Error correcting usernames: {e}")
         return text
-
-def generate_name_variations(name):
-    """Generate common speech recognition variations of a name"""
-    variations = []
-    
-    # Common speech recognition substitutions
-    substitutions = {
-        'c': ['see', 'sea'],
-        'k': ['kay'],
-        'x': ['ex'],
-        'z': ['zee'],
-        'ph': ['f'],
-        'y': ['why'],
-        '2': ['two', 'to', 'too'],
-        '4': ['four', 'for'],
-        '8': ['eight', 'ate'],
-        '0': ['zero', 'oh'],
-        # Add more common substitutions
-    }
-    
-    # Generate variations by replacing characters/patterns
-    for char, replacements in substitutions.items():
-        if char in name:
-            for replacement in replacements:
-                variations.append(name.replace(char, replacement))
-    
-    return variations
\ No newline at end of file
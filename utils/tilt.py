@@ -1,21 +1,63 @@
 import time
 import discord
-from config import user_tilt_scores, TILT_DECAY_RATE, logger
+import numpy as np
+from config import TILT_DECAY_RATE, logger
+from utils.history import record_tilt_history, record_tilt_history_many
+from utils.tilt_state import create_tilt_state
 
-def update_tilt_score(user_id, score_change, trigger=None):
-    """Update a user's tilt score - positive values increase tilt, negative values reduce it"""
-    update_tilt_decay(user_id)
-    
-    # Initialize if new user
-    if user_id not in user_tilt_scores:
-        user_tilt_scores[user_id] = {
-            "score": 50, 
-            "last_updated": time.time(), 
-            "samples": [],
-            "triggers": []
-        }
-    
-    current_score = user_tilt_scores[user_id]["score"]
+# Tilt state backend shared by everything in this process (and by other shards when remote)
+# Created on first use so importing this module never connects to the state service
+tilt_state = None
+
+def get_tilt_state():
+    """Get the tilt state backend, creating the configured one on first use"""
+    global tilt_state
+    if tilt_state is None:
+        tilt_state = create_tilt_state()
+    return tilt_state
+
+def set_tilt_state(backend):
+    """Swap the tilt state backend, e.g. for one shared by several shards"""
+    global tilt_state
+    tilt_state = backend
+
+def get_guild_tilts(guild_id):
+    """Get a snapshot of the tilt records for every tracked user in a guild"""
+    return get_tilt_state().get_guild(guild_id)
+
+def get_user_tilt(guild_id, user_id, create=True):
+    """Get a snapshot of a user's tilt record in a guild, creating a neutral one if they aren't tracked yet
+
+    With create=False an untracked user gets None and nothing is stored, for read-only lookups.
+    """
+    return get_tilt_state().get_user(guild_id, user_id, create)
+
+def get_guild_leaderboard(guild_id, limit=None):
+    """Get (user_id, score) pairs for a guild, highest tilt first, with decay applied up to now"""
+    return get_tilt_state().leaderboard(guild_id, limit)
+
+def get_guild_version(guild_id):
+    """Get a number that changes whenever a tilt score in the guild changes other than by decay"""
+    return get_tilt_state().guild_version(guild_id)
+
+def reset_tilt(guild_id, user_id=None, score=0):
+    """Reset tilt for one user, or for every tracked user in the guild if no user is given"""
+    return get_tilt_state().reset(guild_id, user_id, score)
+
+def update_tilt_score(guild_id, user_id, score_change, trigger=None):
+    """Update a user's tilt score and return the new score - positive values increase tilt, negative values reduce it"""
+    # Decay and change are applied in one atomic step so concurrent shards can't interleave
+    return get_tilt_state().modify(guild_id, user_id, apply_tilt_update, score_change, trigger, time.time())
+
+def apply_tilt_update(entry, score_change, trigger, now):
+    """Decay then apply a score change to a tilt record in place"""
+    apply_tilt_decay(entry, now)
+    apply_tilt_change(entry, score_change, trigger, now)
+    record_tilt_history(entry, now)
+
+def apply_tilt_change(entry, score_change, trigger=None, now=None):
+    """Apply a score change to a tilt record in place"""
+    current_score = entry["score"]
     
     # Handle positive score_change (increasing tilt)
     if score_change > 0:
@@ -46,7 +88,7 @@ def update_tilt_score(user_id, score_change, trigger=None):
                   f"with multiplier={final_change:.1f} (current={current_score})")
         
         # Update score with safeguard against exceeding 100
-        user_tilt_scores[user_id]["score"] = min(100, current_score + final_change)
+        entry["score"] = min(100, current_score + final_change)
         
     # Handle negative score_change (decreasing tilt)
     elif score_change < 0:
@@ -68,40 +110,132 @@ def update_tilt_score(user_id, score_change, trigger=None):
         logger.info(f"Tilt reduction: raw={score_change}, with multiplier={final_reduction:.1f} (current={current_score})")
         
         # Update score with safeguard against going below 0
-        user_tilt_scores[user_id]["score"] = max(0, current_score - final_reduction)
+        entry["score"] = max(0, current_score - final_reduction)
     
-    user_tilt_scores[user_id]["last_updated"] = time.time()
+    entry["last_updated"] = time.time() if now is None else now
     
     # Store the trigger if provided
     if trigger and score_change != 0:
-        if "triggers" not in user_tilt_scores[user_id]:
-            user_tilt_scores[user_id]["triggers"] = []
+        if "triggers" not in entry:
+            entry["triggers"] = []
         
         # Prefix positive triggers with a "+" sign
         trigger_text = ("+" if score_change < 0 else "") + trigger[:50]
         
         # Limit to last 10 triggers
-        user_tilt_scores[user_id]["triggers"].append(trigger_text)
-        if len(user_tilt_scores[user_id]["triggers"]) > 10:
-            user_tilt_scores[user_id]["triggers"] = user_tilt_scores[user_id]["triggers"][-10:]
+        entry["triggers"].append(trigger_text)
+        if len(entry["triggers"]) > 10:
+            entry["triggers"] = entry["triggers"][-10:]
+
+def update_tilt_scores(guild_id, events):
+    """Apply many (user_id, score_change, trigger, timestamp) events to a guild in one atomic step
+
+    Gives the same records as calling update_tilt_score for each event in
+    timestamp order (ties keep their order in `events`), but with the decay
+    and scaling done as array math. Returns {user_id: final score}.
+    """
+    events = list(events)
+    if not events:
+        return {}
+    user_ids = list(dict.fromkeys(event[0] for event in events))
+    scores = get_tilt_state().modify_users(guild_id, user_ids, apply_tilt_updates, events)
+    logger.info(f"Applied {len(events)} tilt events to {len(user_ids)} users in guild {guild_id}")
+    return scores
 
-def update_tilt_decay(user_id):
+def apply_tilt_updates(entries, events):
+    """Apply a batch of events to tilt records in place, matching apply_tilt_update per event in time order
+
+    Events are sorted by user and time, then applied in rounds: round k takes
+    every user's k-th event, so each round is one set of array operations over
+    distinct users. A batch with many users and few events each needs only a
+    few rounds; one user with many events needs one round per event.
+    """
+    user_ids = list(entries)
+    user_index = {user_id: index for index, user_id in enumerate(user_ids)}
+    users = np.fromiter((user_index[event[0]] for event in events), dtype=np.int64, count=len(events))
+    changes = np.fromiter((event[1] for event in events), dtype=np.float64, count=len(events))
+    times = np.fromiter((event[3] for event in events), dtype=np.float64, count=len(events))
+
+    # Stable sorts: same-time events for a user stay in the order they were given
+    order = np.lexsort((times, users))
+    sorted_users = users[order]
+    starts = np.flatnonzero(np.r_[True, sorted_users[1:] != sorted_users[:-1]])
+    counts = np.diff(np.r_[starts, len(order)])
+    rank = np.arange(len(order)) - np.repeat(starts, counts)
+    rounds = order[np.argsort(rank, kind="stable")]
+    round_sizes = np.bincount(rank)
+
+    score = np.array([entries[user_id]["score"] for user_id in user_ids], dtype=np.float64)
+    last_updated = np.array([entries[user_id]["last_updated"] for user_id in user_ids], dtype=np.float64)
+    peaks = np.empty(len(events))  # Highest score each event leaves in the history: decayed or updated
+    finals = np.empty(len(events))  # Score each event ends on, which later empty buckets decay from
+
+    position = 0
+    for size in round_sizes:
+        index = rounds[position:position + size]
+        position += size
+        u, change, now = users[index], changes[index], times[index]
+
+        # apply_tilt_decay
+        current = score[u]
+        decay = np.minimum((now - last_updated[u]) / 60 * TILT_DECAY_RATE, current - 50)
+        current = np.where(current > 50, np.maximum(50, current - decay), current)
+
+        # apply_tilt_change
+        scaled = change * np.select([change <= 5, change <= 10, change <= 15], [0.7, 1.2, 1.8], 2.5)
+        increase = scaled * np.select([current >= 80, current >= 70, current >= 60], [1.5, 1.3, 1.15], 1.0)
+        reduction = np.abs(change) * np.select([current >= 80, current >= 70, current >= 60], [1.8, 1.5, 1.2], 1.0)
+        updated = np.where(change > 0, np.minimum(100, current + increase),
+                           np.where(change < 0, np.maximum(0, current - reduction), current))
+
+        score[u] = updated
+        last_updated[u] = now
+        peaks[index] = np.maximum(current, updated)
+        finals[index] = updated
+
+    # Triggers and history per user, in the same time order
+    new_triggers = {}
+    for event_index in order.tolist():
+        user_id, score_change, trigger, _ = events[event_index]
+        if trigger and score_change != 0:
+            new_triggers.setdefault(user_id, []).append(("+" if score_change < 0 else "") + trigger[:50])
+
+    for user_id, index in user_index.items():
+        entry = entries[user_id]
+        entry["score"] = float(score[index])
+        entry["last_updated"] = float(last_updated[index])
+        if user_id in new_triggers:
+            entry["triggers"] = (entry.get("triggers", []) + new_triggers[user_id])[-10:]  # Last 10, as apply_tilt_change keeps
+
+    for start, count in zip(starts.tolist(), counts.tolist()):
+        user_events = order[start:start + count]
+        entry = entries[user_ids[sorted_users[start]]]
+        record_tilt_history_many(entry, times[user_events], peaks[user_events], finals[user_events])
+
+    return {user_id: entries[user_id]["score"] for user_id in user_ids}
+
+def update_tilt_decay(guild_id, user_id):
     """Apply time-based decay to tilt scores"""
-    if user_id not in user_tilt_scores:
-        return
-    
-    current_time = time.time()
-    last_updated = user_tilt_scores[user_id]["last_updated"]
+    get_tilt_state().modify(guild_id, user_id, apply_tilt_decay, time.time(), create=False)
+
+def apply_tilt_decay(entry, current_time):
+    """Apply time-based decay to a tilt record in place"""
+    last_updated = entry["last_updated"]
     elapsed_minutes = (current_time - last_updated) / 60
     
     # Calculate decay
-    decay = min(elapsed_minutes * TILT_DECAY_RATE, user_tilt_scores[user_id]["score"] - 50)
+    decay = min(elapsed_minutes * TILT_DECAY_RATE, entry["score"] - 50)
     
     # Don't go below 50 (neutral)
-    if user_tilt_scores[user_id]["score"] > 50:
-        user_tilt_scores[user_id]["score"] = max(50, user_tilt_scores[user_id]["score"] - decay)
+    if entry["score"] > 50:
+        entry["score"] = max(50, entry["score"] - decay)
     
-    user_tilt_scores[user_id]["last_updated"] = current_time
+    entry["last_updated"] = current_time
+    record_tilt_history(entry, current_time)
+
+def update_guild_tilt_decay(guild_id):
+    """Apply time-based decay to every tracked user in a single guild"""
+    get_tilt_state().modify_guild(guild_id, apply_tilt_decay, time.time())
 
 def get_tilt_message(score):
     """Get a message describing the tilt level"""
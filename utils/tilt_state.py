@@ -0,0 +1,153 @@
+import copy
+import threading
+import time
+from collections import defaultdict
+from multiprocessing.managers import BaseManager
+from config import new_tilt_entry, STATE_BACKEND, STATE_SERVICE_ADDRESS, STATE_SERVICE_AUTHKEY, logger
+from utils.leaderboard import GuildLeaderboard
+
+class InMemoryTiltState:
+    """Guild-partitioned tilt state held in this process
+
+    Every operation runs under one lock, so a single instance can be shared by
+    threads here or served to other processes by the state service. Each
+    guild's leaderboard is kept up to date under the same lock, so it sees
+    every change whichever process made it.
+    """
+    def __init__(self):
+        # guild_id -> {user_id: tilt entry}
+        # The inner dict doubles as the per-guild member index so guild commands never scan other guilds
+        self.guilds = defaultdict(dict)
+        self.leaderboards = defaultdict(GuildLeaderboard)
+        self.lock = threading.RLock()
+
+    def _ranked(self, guild_id, user_id, entry):
+        self.leaderboards[guild_id].update(user_id, entry["score"], entry["last_updated"])
+
+    def get_user(self, guild_id, user_id, create=True):
+        """Get a copy of a user's tilt record, creating a neutral one if requested"""
+        with self.lock:
+            guild_scores = self.guilds[guild_id] if create else self.guilds.get(guild_id, {})
+            if user_id not in guild_scores:
+                if not create:
+                    return None
+                guild_scores[user_id] = new_tilt_entry()
+                self._ranked(guild_id, user_id, guild_scores[user_id])
+            return copy.deepcopy(guild_scores[user_id])
+
+    def get_guild(self, guild_id):
+        """Get a copy of every tracked user's tilt record in a guild"""
+        with self.lock:
+            return copy.deepcopy(self.guilds.get(guild_id, {}))
+
+    def guild_ids(self):
+        """Every guild with tilt records"""
+        with self.lock:
+            return [guild_id for guild_id, guild_scores in self.guilds.items() if guild_scores]
+
+    def user_ids(self, guild_id):
+        """Every tracked user in a guild"""
+        with self.lock:
+            return list(self.guilds.get(guild_id, {}))
+
+    def get_users(self, guild_id, user_ids):
+        """Get copies of some users' tilt records, skipping any that aren't tracked - lets exports go a chunk at a time"""
+        with self.lock:
+            guild_scores = self.guilds.get(guild_id, {})
+            return {user_id: copy.deepcopy(guild_scores[user_id]) for user_id in user_ids if user_id in guild_scores}
+
+    def modify(self, guild_id, user_id, fn, *args, create=True):
+        """Atomically apply fn(entry, *args) to a user's tilt record and return its new score
+
+        Only the score comes back, so updates don't copy (or send over the wire)
+        the record's history; use get_user for a full snapshot.
+        """
+        with self.lock:
+            guild_scores = self.guilds[guild_id]
+            if user_id not in guild_scores:
+                if not create:
+                    return None
+                guild_scores[user_id] = new_tilt_entry()
+            fn(guild_scores[user_id], *args)
+            self._ranked(guild_id, user_id, guild_scores[user_id])
+            return guild_scores[user_id]["score"]
+
+    def modify_users(self, guild_id, user_ids, fn, *args):
+        """Atomically apply fn({user_id: entry}, *args) to several users' records, creating missing ones
+
+        Returns whatever fn returns, so callers decide how much comes back over the wire.
+        """
+        with self.lock:
+            guild_scores = self.guilds[guild_id]
+            entries = {}
+            for user_id in user_ids:
+                if user_id not in guild_scores:
+                    guild_scores[user_id] = new_tilt_entry()
+                entries[user_id] = guild_scores[user_id]
+            result = fn(entries, *args)
+            for user_id, entry in entries.items():
+                self._ranked(guild_id, user_id, entry)
+            return result
+
+    def modify_guild(self, guild_id, fn, *args):
+        """Atomically apply fn(entry, *args) to every tracked user in a guild"""
+        with self.lock:
+            for user_id, entry in self.guilds.get(guild_id, {}).items():
+                fn(entry, *args)
+                self._ranked(guild_id, user_id, entry)
+
+    def reset(self, guild_id, user_id=None, score=0):
+        """Reset one user, or every tracked user in the guild, and return how many were reset"""
+        with self.lock:
+            guild_scores = self.guilds[guild_id]
+            user_ids = [user_id] if user_id is not None else list(guild_scores.keys())
+            for uid in user_ids:
+                guild_scores[uid] = new_tilt_entry(score)
+                self._ranked(guild_id, uid, guild_scores[uid])
+            return len(user_ids)
+
+    def leaderboard(self, guild_id, limit=None, now=None):
+        """The guild's (user_id, score) pairs, highest first, with decay applied up to now"""
+        with self.lock:
+            if guild_id not in self.leaderboards:
+                return []
+            return self.leaderboards[guild_id].top(time.time() if now is None else now, limit)
+
+    def guild_version(self, guild_id):
+        """A number that changes whenever a score in the guild changes other than by decay"""
+        with self.lock:
+            leaderboard = self.leaderboards.get(guild_id)
+            return leaderboard.version if leaderboard is not None else 0
+
+# The state service hands every shard a proxy to the same InMemoryTiltState
+_served_state = None
+
+def _get_served_state():
+    global _served_state
+    if _served_state is None:
+        _served_state = InMemoryTiltState()
+    return _served_state
+
+class TiltStateManager(BaseManager):
+    """Local service exposing one shared tilt state to several bot processes"""
+
+TiltStateManager.register("get_tilt_state", callable=_get_served_state)
+
+def start_tilt_state_service(address=STATE_SERVICE_ADDRESS, authkey=STATE_SERVICE_AUTHKEY):
+    """Start the shared tilt state service in a background process"""
+    manager = TiltStateManager(address=address, authkey=authkey)
+    manager.start()
+    logger.info(f"Tilt state service listening on {manager.address}")
+    return manager
+
+def connect_tilt_state(address=STATE_SERVICE_ADDRESS, authkey=STATE_SERVICE_AUTHKEY):
+    """Connect to a running tilt state service and return a proxy with the InMemoryTiltState interface"""
+    manager = TiltStateManager(address=address, authkey=authkey)
+    manager.connect()
+    return manager.get_tilt_state()
+
+def create_tilt_state(backend=STATE_BACKEND):
+    """Create the tilt state backend for this process"""
+    if backend == "service":
+        return connect_tilt_state()
+    return InMemoryTiltState()
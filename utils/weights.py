@@ -0,0 +1,87 @@
+import json
+import os
+import struct
+import torch
+import whisper
+from config import MODEL_CACHE_DIR, logger
+
+# safetensors dtype names -> torch dtypes
+SAFETENSORS_DTYPES = {
+    "F64": torch.float64,
+    "F32": torch.float32,
+    "F16": torch.float16,
+    "BF16": torch.bfloat16,
+    "I64": torch.int64,
+    "I32": torch.int32,
+    "I16": torch.int16,
+    "I8": torch.int8,
+    "U8": torch.uint8,
+    "BOOL": torch.bool,
+}
+
+def mmap_safetensors(path):
+    """Open a .safetensors file as tensors backed by a private memory map
+
+    Nothing is copied into process memory: the tensors view the page cache, so
+    every process mapping the same file shares one physical copy of the weights.
+    Pages are only duplicated if a process writes to them, which inference never does.
+    """
+    with open(path, "rb") as f:
+        header_size = struct.unpack("<Q", f.read(8))[0]
+        header = json.loads(f.read(header_size))
+    data_start = 8 + header_size
+
+    storage = torch.UntypedStorage.from_file(path, shared=False, nbytes=os.path.getsize(path))
+    tensors = {}
+    for name, info in header.items():
+        if name == "__metadata__":
+            continue
+        dtype = SAFETENSORS_DTYPES[info["dtype"]]
+        begin, _ = info["data_offsets"]
+        itemsize = torch.empty((), dtype=dtype).element_size()
+        tensor = torch.empty(0, dtype=dtype)
+        tensor.set_(storage, (data_start + begin) // itemsize, info["shape"])
+        tensors[name] = tensor
+    return tensors
+
+def whisper_safetensors_path(size):
+    return os.path.join(MODEL_CACHE_DIR, f"whisper-{size}.safetensors")
+
+def convert_whisper_to_safetensors(size, path):
+    """Save a Whisper checkpoint as safetensors, with the model dimensions in the metadata"""
+    from safetensors.torch import save_file
+
+    logger.info(f"Converting Whisper {size} weights to safetensors at {path}...")
+    model = whisper.load_model(size, device="cpu")
+    state_dict = {name: tensor.contiguous() for name, tensor in model.state_dict().items()}
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    temp_path = path + ".tmp"
+    save_file(state_dict, temp_path, metadata={"dims": json.dumps(model.dims.__dict__), "size": size})
+    os.replace(temp_path, path)  # Atomic, so concurrent workers never see a partial file
+
+def load_whisper_mmap(size):
+    """Load a Whisper model whose weights are memory-mapped from a shared safetensors file"""
+    path = whisper_safetensors_path(size)
+    if not os.path.exists(path):
+        convert_whisper_to_safetensors(size, path)
+
+    with open(path, "rb") as f:
+        header_size = struct.unpack("<Q", f.read(8))[0]
+        metadata = json.loads(f.read(header_size)).get("__metadata__", {})
+    dims = whisper.model.ModelDimensions(**json.loads(metadata["dims"]))
+
+    # Build the module, then swap its freshly allocated parameters for the mapped ones
+    model = whisper.model.Whisper(dims)
+    model.load_state_dict(mmap_safetensors(path), assign=True)
+    if size in whisper._ALIGNMENT_HEADS:
+        model.set_alignment_heads(whisper._ALIGNMENT_HEADS[size])
+    return model.eval()
+
+def load_whisper(size, mmap_weights=False):
+    """Load a Whisper model, memory-mapping the weights if requested"""
+    if mmap_weights:
+        try:
+            return load_whisper_mmap(size)
+        except Exception as e:
+            logger.error(f"Memory-mapped load of Whisper {size} failed, loading normally: {e}")
+    return whisper.load_model(size)
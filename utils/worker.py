@@ -0,0 +1,162 @@
+import os
+import tempfile
+import time
+from types import SimpleNamespace
+from config import DEFAULT_LANGUAGE, JOBS_TOPIC, RESULTS_TOPIC, PROSODY_ENABLED, WORKER_MEMORY_REPORT_SECONDS, logger
+from utils.audio_processing import extract_audio_features
+from utils.language import RoutedLanguage
+from utils.speech import analyze_text_for_tilt
+from utils.scheduler import score_audio_segment, degraded_mode
+from utils.prosody import score_acoustic_only
+
+def member_snapshot(guild):
+    """Capture the member names a worker needs for username correction"""
+    if not guild:
+        return []
+    return [
+        {"name": member.name, "display_name": member.display_name, "nick": member.nick, "bot": member.bot}
+        for member in guild.members
+    ]
+
+def guild_from_snapshot(members):
+    """Rebuild a guild-like object from a member snapshot for correct_usernames"""
+    if not members:
+        return None
+    return SimpleNamespace(members=[SimpleNamespace(**member) for member in members])
+
+def handle_job(job, queue_depth=0):
+    """Run inference for a single job and build its result"""
+    features = None
+    # The gateway's language cache routes the speaker; this worker keeps none of its own
+    languages = RoutedLanguage(job.get("language", DEFAULT_LANGUAGE), job.get("detect_language", False))
+    if job["kind"] == "text":
+        trigger = job["text"]
+        score_change = analyze_text_for_tilt(trigger.lower(), packs=job.get("keyword_packs"),
+                                             language=languages.language(job["user_id"]))
+    else:
+        # Workers are stateless, so audio arrives as bytes rather than a path on the gateway host
+        with tempfile.NamedTemporaryFile(suffix='.mp3', delete=False) as temp_file:
+            temp_file.write(job["audio"])
+            temp_path = temp_file.name
+        try:
+            lag = time.time() - job["recorded_at"] if job.get("recorded_at") else 0
+            degraded = degraded_mode.update(lag, queue_depth)
+            features = extract_audio_features(temp_path, track_pitch=degraded) if PROSODY_ENABLED or degraded else None
+            
+            if degraded:
+                # Skip ASR - estimate from acoustics until the job queue drains
+                score_change, reasons = score_acoustic_only(features)
+                trigger = f"[voice estimate: {', '.join(reasons)}]" if reasons else ""
+            else:
+                trigger, score_change = score_audio_segment(temp_path, guild_from_snapshot(job.get("members")), queue_depth,
+                                                            packs=job.get("keyword_packs"), user_id=job["user_id"],
+                                                            languages=languages)
+        finally:
+            os.unlink(temp_path)
+
+    return {
+        "kind": job["kind"],
+        "guild_id": job["guild_id"],
+        "channel_id": job["channel_id"],
+        "user_id": job["user_id"],
+        "score_change": score_change,
+        "trigger": trigger,
+        "features": features,
+        "recorded_at": job.get("recorded_at"),
+        "language_probabilities": languages.top_probabilities(),
+    }
+
+def run_inference_worker(bus, worker_id=0, stop_event=None):
+    """Consume jobs from the bus and publish tilt results until stopped"""
+    logger.info(f"Inference worker {worker_id} started")
+
+    while stop_event is None or not stop_event.is_set():
+        job = bus.consume(JOBS_TOPIC, timeout=1)
+        if job is None:
+            continue
+
+        try:
+            bus.publish(job.get("reply_to", RESULTS_TOPIC), handle_job(job, bus.depth(JOBS_TOPIC)))
+        except Exception as e:
+            logger.error(f"Error in inference worker {worker_id}: {e}")
+
+    logger.info(f"Inference worker {worker_id} exited")
+
+def process_memory(pid="self"):
+    """Memory use of a process in MB from /proc: RSS, PSS and the shared/private split
+
+    PSS divides shared pages between the processes mapping them, so summing PSS
+    across workers gives the real total while summing RSS double counts the weights.
+    """
+    fields = {"Rss": "rss", "Pss": "pss", "Shared_Clean": "shared", "Shared_Dirty": "shared",
+              "Private_Clean": "private", "Private_Dirty": "private"}
+    memory = {"rss": 0.0, "pss": 0.0, "shared": 0.0, "private": 0.0}
+    try:
+        with open(f"/proc/{pid}/smaps_rollup") as f:
+            for line in f:
+                key, _, value = line.partition(":")
+                if key in fields:
+                    memory[fields[key]] += int(value.split()[0]) / 1024
+    except OSError:
+        # No smaps_rollup (not Linux) - RSS of this process is the best we can do
+        import resource
+        if pid == "self":
+            memory["rss"] = memory["pss"] = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    return memory
+
+def log_memory_report(processes):
+    """Log per-worker memory and the pool total"""
+    total = {"rss": 0.0, "pss": 0.0}
+    for name, pid in processes:
+        memory = process_memory(pid)
+        total["rss"] += memory["rss"]
+        total["pss"] += memory["pss"]
+        logger.info(f"{name} (pid {pid}): RSS {memory['rss']:.0f} MB, PSS {memory['pss']:.0f} MB, "
+                    f"shared {memory['shared']:.0f} MB, private {memory['private']:.0f} MB")
+    logger.info(f"Worker pool: summed RSS {total['rss']:.0f} MB, actual (PSS) {total['pss']:.0f} MB")
+    return total
+
+def _pool_worker(bus_backend, worker_id, workers):
+    from utils.bus import create_bus
+    from utils.resources import ThreadBudget, partition_cores, set_cpu_budget
+    from utils.speech import warmup_models
+    # Each worker budgets its own slice of the cores rather than all of them
+    set_cpu_budget(ThreadBudget(partition_cores(worker_id, workers)))
+    # The parent loads without running inference, so each worker warms up after the fork
+    warmup_models()
+    # Each process needs its own bus connection - sockets don't survive a fork
+    run_inference_worker(create_bus(bus_backend), worker_id)
+
+def run_worker_pool(bus_backend, workers):
+    """Fork inference workers from a parent that already loaded the models
+
+    Call load_models(warmup=False) first and don't run inference in the parent: torch's
+    thread pools aren't fork-safe once they've been used. The weights are then
+    shared copy-on-write (and through the page cache when memory-mapped).
+    """
+    import gc
+    import multiprocessing
+
+    # Move everything allocated so far out of the GC's reach so collections in
+    # the children don't touch (and copy) the parent's pages
+    gc.collect()
+    gc.freeze()
+
+    context = multiprocessing.get_context("fork")
+    processes = []
+    for worker_id in range(workers):
+        process = context.Process(target=_pool_worker, args=(bus_backend, worker_id, workers),
+                                  name=f"justff-worker-{worker_id}", daemon=True)
+        process.start()
+        processes.append(process)
+    logger.info(f"Started {workers} inference worker processes")
+
+    try:
+        while any(process.is_alive() for process in processes):
+            log_memory_report([("parent", os.getpid())] + [(p.name, p.pid) for p in processes if p.is_alive()])
+            for process in processes:
+                process.join(timeout=WORKER_MEMORY_REPORT_SECONDS / max(1, len(processes)))
+    finally:
+        for process in processes:
+            if process.is_alive():
+                process.terminate()